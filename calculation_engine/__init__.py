@@ -10,6 +10,14 @@ Structure:
 - renewable_engine.py: Renewable energy formulas and calculations
 - verbrauch_engine.py: Verbrauch (consumption) calculations
 - formula_evaluator.py: Generic formula evaluation engine
+- duration_curve.py: Vectorized segmentiert (duration curve) analysis
+- smard_profiles.py: Cached SMARD generation profiles
+- load_profiles.py: Hourly sector load-profile synthesis
+- storage_dispatch.py: Multi-technology hourly storage dispatch (battery + H2)
+- storage_sweep.py: Parametric storage-sizing sweep (process pool, Pareto table)
+- sector_allocation.py: LP allocation of renewable supply to demand sectors
+- result_cache.py: Fingerprint-keyed result caching for the array engines
+- code_values.py: Bulk code__in lookups with typed status/target accessors
 """
 
 from .landuse_engine import LandUseCalculator
@@ -0,0 +1,180 @@
+"""
+Annual Electricity Flow Calculation Engine
+==========================================
+
+Computes the annual electricity flow diagram (Jahresstrom):
+- Generation sources K/J/L/S (PV, Wind, Hydro, Bio) from RenewableData
+- M node (PV + Wind + Hydro) and the Elektrolyse branch "nach Angebot"
+- N node branches (Abregelung, Elektrolyse Stromspeicher) and gas storage
+- Rückverstromung and the final Stromnetz zum Endverbrauch
+
+Target (Ziel) values are preferred; status is the fallback when a target is
+missing or zero. Balanced values from WS row 366 override the N branches.
+Formerly inlined in annual_electricity_view; extracted so CalculationRun
+snapshots can materialize the flows once per run. All RenewableData codes are
+read with one bulk query (ANNUAL_ELECTRICITY_CODES).
+"""
+
+from django.apps import apps
+
+from .code_values import CodeValues
+
+ETA_STROM_GAS = 0.65    # Elektrolyse efficiency
+ETA_GAS_STROM = 0.585   # Reconversion efficiency
+GAS_STORAGE_OFFSET = 160  # GWh storage offset
+
+ANNUAL_ELECTRICITY_CODES = (
+    '1.1.2.1.2', '1.2.1.2',    # PV
+    '2.1.1.2.2', '2.2.1.2',    # Wind
+    '4.4.1',                   # Biomass
+    '3.1.1.2',                 # Hydro + Geothermal
+    '9.2.1.5.2',               # Elektrolyse nach Angebot
+    '9.3.4', '9.3.1',          # Abregelung, Elektrolyse Stromspeicher
+)
+
+
+def calculate_annual_electricity():
+    """
+    Calculate all annual electricity flow values.
+
+    Returns:
+        dict: Rounded flow values keyed like the annual_electricity template context
+    """
+    WSData = apps.get_model('simulator', 'WSData')
+
+    # Prefer TARGET (Ziel) values for the diagram; fall back to status when target is missing/zero
+    renewables = CodeValues.for_renewables(ANNUAL_ELECTRICITY_CODES)
+    get_renewable_status_or_target = renewables.target_or_status
+
+    # Backward compatibility helper: target fallback
+    get_renewable_target = renewables.target_or_status
+
+    # ==================================================================================
+    # STEP 1: Calculate base renewable values (K, J, L, S, M)
+    # ==================================================================================
+    # Calculate PV (K) = 1.1.2.1.2 + 1.2.1.2
+    pv_value = get_renewable_target('1.1.2.1.2') + get_renewable_target('1.2.1.2')
+
+    # Calculate Wind (J) = 2.1.1.2.2 + 2.2.1.2
+    wind_value = get_renewable_target('2.1.1.2.2') + get_renewable_target('2.2.1.2')
+
+    # Biomass (S) = 4.4.1
+    bio_value = get_renewable_target('4.4.1')
+
+    # Hydro + Geothermal (L) = 3.1.1.2
+    hydro_value = get_renewable_target('3.1.1.2')
+
+    # Calculate M total (PV + Wind + Hydro ONLY, Bio is separate)
+    m_total = pv_value + wind_value + hydro_value
+
+    # ==================================================================================
+    # STEP 2: Calculate flows from M
+    # ==================================================================================
+    # Elektrolyse "nach Angebot" (branch from M) = 9.2.1.5.2
+    ely_branch_value = get_renewable_target('9.2.1.5.2')
+
+    # Gasspeicher Direktverbr = 9.2.1.5.2 * 65% (hydrogen production efficiency)
+    gasspeicher_direkt = ely_branch_value * ETA_STROM_GAS
+
+    # N value = M - Elektrolyse Power to Gas
+    n_value = m_total - ely_branch_value
+
+    # ==================================================================================
+    # STEP 3: Calculate flows from N (using renewable data as base)
+    # ==================================================================================
+    # Q (Abregelung) = 9.3.4
+    n_input_branch = get_renewable_status_or_target('9.3.4')
+    q_abregelung = n_input_branch
+
+    # Elektrolyse Stromspeicher (Überschuss) = 9.3.1
+    n_output_branch = get_renewable_status_or_target('9.3.1')
+
+    # U (Gasspeicher Strom) = Elektrolyse Stromspeicher * 65%
+    gas_storage = n_output_branch * ETA_STROM_GAS
+
+    # T value = U - 160 (storage offset)
+    t_value = gas_storage - GAS_STORAGE_OFFSET
+
+    # T output (Rückverstromung) = T * 58.5% (reconversion efficiency)
+    t_output = t_value * ETA_GAS_STROM
+
+    # O value = N - Q - Elektrolyse Stromspeicher
+    n_to_right = n_value - q_abregelung - n_output_branch
+
+    # ==================================================================================
+    # STEP 4: Override with WS row 366 balanced values if available
+    # ==================================================================================
+    try:
+        ws_row_366 = WSData.objects.get(tag_im_jahr=366)
+
+        # If WS row 366 has balanced values, use them
+        if ws_row_366.abregelung_z is not None and ws_row_366.abregelung_z > 0:
+            q_abregelung = ws_row_366.abregelung_z
+            n_input_branch = q_abregelung
+
+        if ws_row_366.einspeich is not None and ws_row_366.einspeich > 0:
+            # ElektrolyseStromspeicher (Überschuss) = Einspeich / 65%
+            n_output_branch = ws_row_366.einspeich / ETA_STROM_GAS
+            # U (Gasspeicher Strom) = Einspeich (already at 65%)
+            gas_storage = ws_row_366.einspeich
+            # T value = U - 160
+            t_value = gas_storage - GAS_STORAGE_OFFSET
+
+        if ws_row_366.ausspeich_rueckverstr is not None and ws_row_366.ausspeich_rueckverstr > 0:
+            # T output comes from WS daily balance (Ausspeich. Rückverstr. * 58.5%)
+            t_output = ws_row_366.ausspeich_rueckverstr * ETA_GAS_STROM
+
+        # Recalculate O with updated values
+        n_to_right = n_value - q_abregelung - n_output_branch
+
+    except WSData.DoesNotExist:
+        pass
+
+    # ==================================================================================
+    # STEP 5: Calculate final output
+    # ==================================================================================
+    # Final Stromnetz zum Endverbrauch = T_output + O + S(Bio)
+    final_stromnetz = t_output + n_to_right + bio_value
+
+    # Calculate H2 values
+    h2_offer = ely_branch_value * ETA_STROM_GAS  # H2 from "nach Angebot"
+    h2_surplus = n_output_branch * ETA_STROM_GAS  # H2 from "Überschuss"
+
+    return {
+        # Generation sources
+        'bio': round(bio_value, 2),
+        'pv': round(pv_value, 2),
+        'wind': round(wind_value, 2),
+        'hydro': round(hydro_value, 2),
+        # M node
+        'm_total': round(m_total, 2),
+        # Elektrolyse branch from M (9.2.1.5.2)
+        'ely_branch_value': round(ely_branch_value, 2),
+        'ely_offer': round(ely_branch_value, 2),  # Same as ely_branch_value
+        # Gasspeicher Direktverbr
+        'gasspeicher_direkt': round(gasspeicher_direkt, 2),
+        # N node value
+        'n_value': round(n_value, 2),
+        # N node branches
+        'q_abregelung': round(q_abregelung, 2),
+        'n_input_branch': round(n_input_branch, 2),
+        'n_output_branch': round(n_output_branch, 2),
+        'ely_surplus': round(n_output_branch, 2),  # Elektrolyse Stromspeicher
+        # O value (flow to right)
+        'n_to_right': round(n_to_right, 2),
+        # H2 values
+        'h2_offer': round(h2_offer, 2),  # H2 from nach Angebot
+        'h2_surplus': round(h2_surplus, 2),  # H2 from Überschuss
+        # Storage values
+        'gas_storage': round(gas_storage, 2),  # U (Gasspeicher Strom)
+        't_value': round(t_value, 2),  # T (before reconversion)
+        't_output': round(t_output, 2),  # T output (after 58.5% reconversion)
+        # Final output
+        'final_stromnetz': round(final_stromnetz, 2),  # Stromnetz zum Endverbrauch
+        # Legacy/compatibility values
+        'n_input': round(n_input_branch, 2),
+        'n_output': round(n_output_branch, 2),
+        'h2_to_reconv': round(t_value, 2),
+        'reconversion': round(t_output, 2),
+        'final_consumption': round(final_stromnetz, 2),
+    }
@@ -7,9 +7,63 @@ This module handles all calculations for the Bilanz diagram, which compares:
 
 All data comes dynamically from RenewableData and VerbrauchData models.
 No hardcoded values.
+
+Result cache:
+calculate_bilanz_data() is cached in the configured Django cache backend
+(settings.CACHES). The key is a fingerprint of the inputs the calculation
+reads (``bilanz_dependencies()``):
+- the VerbrauchData and RenewableData codes read directly, plus every code
+  their formulas reference, transitively (the Verbrauch totals are rollups
+  refreshed before reading; a refresh can propagate to renewables)
+- the LandUse codes those formulas reference
+- an aggregate of the Formula table (count, versions, last update), which
+  also keys the dependency sets, so they are only re-derived after a formula
+  edit
+Any change to one of these inputs produces a new key; changes elsewhere
+(other codes, WS, Gebäudewärme, runs) keep the cached result.
+
+The default cache backend (LocMemCache) is per process: every worker keeps
+its own results and computes each version once. Set DJANGO_CACHE_BACKEND to
+a shared backend (e.g. FileBasedCache, Redis) to share them across workers.
 """
 
+import re
+
 from django.apps import apps
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from simulator.metrics import count_cache
+
+from .code_values import CodeValues
+from .result_cache import ResultCache, fingerprint
+
+BILANZ_CACHE_PREFIX = 'bilanz_'
+BILANZ_CACHE_TIMEOUT = 3600
+# Bump when the calculation itself changes so stale results are ignored
+BILANZ_CACHE_VERSION = 1
+
+_dependency_cache = ResultCache(maxsize=4)
+
+# Code references in formula expressions: table prefix + code, or a bare
+# dotted code (as in FormulaEvaluator; plain numbers are constants)
+_REFERENCE = re.compile(
+    r'\b(?:(VerbrauchData|Verbrauch|RenewableData|Renewable|LandUse)_(?:LU_)?(\d+(?:\.\d+)*)|(\d+(?:\.\d+)+))'
+)
+_REFERENCE_TABLES = {
+    'VerbrauchData': 'verbrauch',
+    'Verbrauch': 'verbrauch',
+    'RenewableData': 'renewable',
+    'Renewable': 'renewable',
+    'LandUse': 'landuse',
+}
+
+BILANZ_RENEWABLE_CODES = ('10.3', '10.4', '10.4.2', '10.5', '10.5.2', '10.6', '10.7')
+BILANZ_VERBRAUCH_CODES = (
+    '1', '1.4', '2.10', '3.7', '4.3.1',
+    '2.7.0', '3.4.0', '4.3.2', '4.3.4',
+    '2.8.0', '3.5.0',
+)
 
 
 def get_renewable_value(code, use_target=True):
@@ -78,36 +132,183 @@ def get_verbrauch_value(code, use_ziel=True):
         return 0
 
 
-def calculate_bilanz_data():
+def _formula_state():
+    """Count, summed versions and last update of the Formula table (one aggregate query)."""
+    Formula = apps.get_model('simulator', 'Formula')
+    state = Formula.objects.aggregate(count=Count('id'), versions=Sum('version'), updated=Max('updated_at'))
+    return (state['count'], state['versions'], state['updated'].isoformat() if state['updated'] else None)
+
+
+def _formula_expression(formulas, code, table):
+    """Expression of a non-fixed formula for code (None when fixed or missing)."""
+    if table == 'verbrauch':
+        definition = formulas.get(f'V_{code}')
+    else:
+        definition = formulas.get(code)
+        if definition is None:
+            from .renewable_engine import RENEWABLE_FORMULAS
+
+            legacy = RENEWABLE_FORMULAS.get(code)
+            definition = {'expression': legacy['formula'], 'is_fixed': legacy['is_fixed']} if legacy else None
+    if not definition or definition.get('is_fixed'):
+        return None
+    return definition.get('expression')
+
+
+def bilanz_dependencies(formula_state=None):
+    """
+    Codes calculate_bilanz_data() can read, per table.
+
+    Starts from the bilanz codes and follows every formula reference
+    transitively. Bare codes count as renewable references, in Verbrauch
+    formulas also as Verbrauch references (a superset is safe here).
+
+    Returns:
+        {'verbrauch': frozenset, 'renewable': frozenset, 'landuse': frozenset}
+    """
+    formula_state = formula_state if formula_state is not None else _formula_state()
+
+    def compute():
+        from simulator.formula_service import get_formula_service
+
+        formulas = get_formula_service().get_formula_map()
+        codes = {
+            'verbrauch': set(BILANZ_VERBRAUCH_CODES),
+            'renewable': set(BILANZ_RENEWABLE_CODES),
+            'landuse': set(),
+        }
+        pending = [('verbrauch', code) for code in BILANZ_VERBRAUCH_CODES]
+        pending += [('renewable', code) for code in BILANZ_RENEWABLE_CODES]
+        while pending:
+            table, code = pending.pop()
+            expression = _formula_expression(formulas, code, table)
+            for prefix, prefixed, bare in _REFERENCE.findall(expression or ''):
+                ref = prefixed or bare
+                if prefix:
+                    targets = (_REFERENCE_TABLES[prefix],)
+                else:
+                    targets = ('renewable', 'verbrauch') if table == 'verbrauch' else ('renewable',)
+                for target in targets:
+                    if ref not in codes[target]:
+                        codes[target].add(ref)
+                        if target != 'landuse':
+                            pending.append((target, ref))
+        return {table: frozenset(values) for table, values in codes.items()}
+
+    return _dependency_cache.get_or_compute(fingerprint('bilanz_dependencies', formula_state), compute)
+
+
+def bilanz_input_fingerprint():
+    """
+    Fingerprint of the inputs calculate_bilanz_data() reads: the rows of
+    bilanz_dependencies() and the Formula table state (three or four queries).
+    """
+    LandUse = apps.get_model('simulator', 'LandUse')
+    RenewableData = apps.get_model('simulator', 'RenewableData')
+    VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+
+    formula_state = _formula_state()
+    codes = bilanz_dependencies(formula_state)
+    parts = [
+        BILANZ_CACHE_VERSION,
+        formula_state,
+        list(
+            VerbrauchData.objects.filter(code__in=codes['verbrauch']).order_by('code')
+            .values_list('code', 'status', 'ziel', 'user_percent', 'is_calculated', 'status_calculated', 'ziel_calculated')
+        ),
+        list(
+            RenewableData.objects.filter(code__in=codes['renewable']).order_by('code')
+            .values_list('code', 'status_value', 'target_value', 'user_input', 'is_fixed', 'formula')
+        ),
+    ]
+    if codes['landuse']:
+        # Formulas reference LandUse codes with and without the LU_ prefix
+        landuse_codes = codes['landuse'] | {f'LU_{code}' for code in codes['landuse']}
+        parts.append(list(
+            LandUse.objects.filter(code__in=landuse_codes).order_by('code')
+            .values_list('code', 'status_ha', 'target_ha', 'user_percent')
+        ))
+    return fingerprint('bilanz', *parts)
+
+
+def calculate_bilanz_data(use_cache=True, refresh=True):
     """
     Calculate all bilanz (balance sheet) data dynamically from RenewableData and VerbrauchData.
     
+    Args:
+        use_cache: Serve/store the result in the Django cache keyed by
+                   bilanz_input_fingerprint()
+        refresh: Refresh the Verbrauch rollups first (writes). With False
+                 nothing is written: a cache miss computes from the stored
+                 rows and is not cached, so read-only transactions can call it.
+    
     Returns:
         dict: Complete bilanz data structure with all categories
     """
-    # Ensure Verbrauch rollups are current before reading
+    if not use_cache:
+        return _compute_bilanz_data(refresh=refresh)
+
+    key = f'{BILANZ_CACHE_PREFIX}{bilanz_input_fingerprint()}'
+    cached = cache.get(key)
+    count_cache("bilanz", cached is not None)
+    if cached is not None:
+        return cached
+    if not refresh:
+        # Not stored: refreshing callers expect refreshed results under this key
+        return _compute_bilanz_data(refresh=False)
+
+    refreshed = _refresh_verbrauch()
+    data = _compute_bilanz_data(refresh=False)
+    cache.set(key, data, BILANZ_CACHE_TIMEOUT)
+    # The Verbrauch rollup refresh changed inputs; store under the
+    # post-refresh key too so the next call hits.
+    if refreshed:
+        post_key = f'{BILANZ_CACHE_PREFIX}{bilanz_input_fingerprint()}'
+        if post_key != key:
+            cache.set(post_key, data, BILANZ_CACHE_TIMEOUT)
+    return data
+
+
+def _refresh_verbrauch():
+    """Bring the Verbrauch rollups up to date before reading; returns the updated codes."""
     try:
         from simulator.verbrauch_recalculator import recalc_all_verbrauch
-        recalc_all_verbrauch(trigger_code="bilanz_view")
+        return recalc_all_verbrauch(trigger_code="bilanz_view")
     except Exception as exc:  # pragma: no cover - defensive guard
         print(f"Warning: Verbrauch recalculation before bilanz failed: {exc}")
+        return []
+
+
+def _compute_bilanz_data(refresh=True):
+    """Uncached bilanz calculation (see calculate_bilanz_data)."""
+    if refresh:
+        _refresh_verbrauch()
+
+    # All codes are fetched up front: one query per table (+3 when a renewable
+    # code is formula-backed) instead of one query per code.
+    verbrauch = CodeValues.for_verbrauch(BILANZ_VERBRAUCH_CODES)
+    renewable_raw = CodeValues.for_renewables(BILANZ_RENEWABLE_CODES)
+    renewable = renewable_raw.with_calculated()
+    missing = verbrauch.missing() + renewable_raw.missing()
+    if missing:
+        print(f"Warning: Bilanz codes not found (using 0): {', '.join(missing)}")
     
     # ============================================================================
     # SECTION 1: VERBRAUCH STROM (Electricity Consumption)
     # ============================================================================
     
     # Get electricity consumption by sector (targets from VerbrauchData)
-    klik_strom_s = get_verbrauch_value('1.4', use_ziel=False)  # Endverbrauch Strom KLIK gesamt (status)
-    klik_strom_t = get_verbrauch_value('1.4', use_ziel=True)   # Endverbrauch Strom KLIK gesamt (target)
+    klik_strom_s = verbrauch.status('1.4')  # Endverbrauch Strom KLIK gesamt (status)
+    klik_strom_t = verbrauch.target('1.4')   # Endverbrauch Strom KLIK gesamt (target)
     
-    gw_strom_s = get_verbrauch_value('2.10', use_ziel=False)   # Endenergieverbrauch GW gesamt (status)
-    gw_strom_t = get_verbrauch_value('2.10', use_ziel=True)    # Endenergieverbrauch GW gesamt (target)
+    gw_strom_s = verbrauch.status('2.10')   # Endenergieverbrauch GW gesamt (status)
+    gw_strom_t = verbrauch.target('2.10')    # Endenergieverbrauch GW gesamt (target)
     
-    pw_strom_s = get_verbrauch_value('3.7', use_ziel=False)    # Endenergieverbrauch PW gesamt (status)
-    pw_strom_t = get_verbrauch_value('3.7', use_ziel=True)     # Endenergieverbrauch PW gesamt (target)
+    pw_strom_s = verbrauch.status('3.7')    # Endenergieverbrauch PW gesamt (status)
+    pw_strom_t = verbrauch.target('3.7')     # Endenergieverbrauch PW gesamt (target)
     
-    mobile_strom_s = get_verbrauch_value('4.3.1', use_ziel=False)  # Mobile Anwendungen gesamt (status)
-    mobile_strom_t = get_verbrauch_value('4.3.1', use_ziel=True)   # Mobile Anwendungen gesamt (target)
+    mobile_strom_s = verbrauch.status('4.3.1')  # Mobile Anwendungen gesamt (status)
+    mobile_strom_t = verbrauch.target('4.3.1')   # Mobile Anwendungen gesamt (target)
     
     # Total electricity demand
     total_strom_s = klik_strom_s + gw_strom_s + pw_strom_s + mobile_strom_s
@@ -115,14 +316,14 @@ def calculate_bilanz_data():
     
     # Get renewable electricity by sector from RenewableData targets
     # Use raw stored values to mirror Renewable Energy page targets/status
-    klik_ren_s = get_renewable_raw('10.3', field="status")
-    klik_ren_t = get_renewable_raw('10.3', field="target")
-    gw_ren_s = get_renewable_raw('10.4', field="status")
-    gw_ren_t = get_renewable_raw('10.4', field="target")
-    pw_ren_s = get_renewable_raw('10.5', field="status")
-    pw_ren_t = get_renewable_raw('10.5', field="target")
-    mobile_ren_s = get_renewable_raw('10.6', field="status")
-    mobile_ren_t = get_renewable_raw('10.6', field="target")
+    klik_ren_s = renewable_raw.status('10.3')
+    klik_ren_t = renewable_raw.target('10.3')
+    gw_ren_s = renewable_raw.status('10.4')
+    gw_ren_t = renewable_raw.target('10.4')
+    pw_ren_s = renewable_raw.status('10.5')
+    pw_ren_t = renewable_raw.target('10.5')
+    mobile_ren_s = renewable_raw.status('10.6')
+    mobile_ren_t = renewable_raw.target('10.6')
 
     strom_ren_s = klik_ren_s + gw_ren_s + pw_ren_s + mobile_ren_s
     strom_ren_t = klik_ren_t + gw_ren_t + pw_ren_t + mobile_ren_t
@@ -199,26 +400,26 @@ def calculate_bilanz_data():
     # ============================================================================
     
     # Get fuel consumption by sector from VerbrauchData
-    gw_fuels_s = get_verbrauch_value('2.7.0', use_ziel=False)  # Gebäudewärme fuels status
-    gw_fuels_t = get_verbrauch_value('2.7.0', use_ziel=True)   # Gebäudewärme fuels target
+    gw_fuels_s = verbrauch.status('2.7.0')  # Gebäudewärme fuels status
+    gw_fuels_t = verbrauch.target('2.7.0')   # Gebäudewärme fuels target
     
-    pw_fuels_s = get_verbrauch_value('3.4.0', use_ziel=False)  # Prozesswärme fuels status
-    pw_fuels_t = get_verbrauch_value('3.4.0', use_ziel=True)   # Prozesswärme fuels target
+    pw_fuels_s = verbrauch.status('3.4.0')  # Prozesswärme fuels status
+    pw_fuels_t = verbrauch.target('3.4.0')   # Prozesswärme fuels target
     
-    mobile_fuels_s = get_verbrauch_value('4.3.2', use_ziel=False)  # Mobile fuels status
-    mobile_fuels_t = get_verbrauch_value('4.3.2', use_ziel=True)   # Mobile fuels target
+    mobile_fuels_s = verbrauch.status('4.3.2')  # Mobile fuels status
+    mobile_fuels_t = verbrauch.target('4.3.2')   # Mobile fuels target
     
     # Get mobile fuel breakdown (for distribution analysis)
-    mobile_gas_s = get_verbrauch_value('4.3.4', use_ziel=False)  # Mobile gaseous
-    mobile_gas_t = get_verbrauch_value('4.3.4', use_ziel=True)
+    mobile_gas_s = verbrauch.status('4.3.4')  # Mobile gaseous
+    mobile_gas_t = verbrauch.target('4.3.4')
     
     # Total fuel consumption
     total_fuels_s = gw_fuels_s + pw_fuels_s + mobile_fuels_s
     total_fuels_t = gw_fuels_t + pw_fuels_t + mobile_fuels_t
     
     # Get renewable fuels from RenewableData (Section 10.7)
-    fuels_ren_s = get_renewable_value('10.7', use_target=False)  # Renewable fuels
-    fuels_ren_t = get_renewable_value('10.7', use_target=True)
+    fuels_ren_s = renewable.status('10.7')  # Renewable fuels
+    fuels_ren_t = renewable.target('10.7')
     
     # Calculate fossil fuels
     fuels_fossil_s = max(0, total_fuels_s - fuels_ren_s)
@@ -299,22 +500,22 @@ def calculate_bilanz_data():
     # ============================================================================
     
     # Get heat consumption by sector from VerbrauchData
-    gw_heat_s = get_verbrauch_value('2.8.0', use_ziel=False)  # Gebäudewärme heat status
-    gw_heat_t = get_verbrauch_value('2.8.0', use_ziel=True)   # Gebäudewärme heat target
+    gw_heat_s = verbrauch.status('2.8.0')  # Gebäudewärme heat status
+    gw_heat_t = verbrauch.target('2.8.0')   # Gebäudewärme heat target
     
-    pw_heat_s = get_verbrauch_value('3.5.0', use_ziel=False)  # Prozesswärme heat status
-    pw_heat_t = get_verbrauch_value('3.5.0', use_ziel=True)   # Prozesswärme heat target
+    pw_heat_s = verbrauch.status('3.5.0')  # Prozesswärme heat status
+    pw_heat_t = verbrauch.target('3.5.0')   # Prozesswärme heat target
     
     # Total heat consumption
     total_heat_s = gw_heat_s + pw_heat_s
     total_heat_t = gw_heat_t + pw_heat_t
     
     # Get renewable heat from RenewableData
-    heat_ren_gw_s = get_renewable_value('10.4.2', use_target=False)  # Gebäudewärme renewable heat
-    heat_ren_gw_t = get_renewable_value('10.4.2', use_target=True)
+    heat_ren_gw_s = renewable.status('10.4.2')  # Gebäudewärme renewable heat
+    heat_ren_gw_t = renewable.target('10.4.2')
     
-    heat_ren_pw_s = get_renewable_value('10.5.2', use_target=False)  # Prozesswärme renewable heat
-    heat_ren_pw_t = get_renewable_value('10.5.2', use_target=True)
+    heat_ren_pw_s = renewable.status('10.5.2')  # Prozesswärme renewable heat
+    heat_ren_pw_t = renewable.target('10.5.2')
     
     total_heat_ren_s = heat_ren_gw_s + heat_ren_pw_s
     total_heat_ren_t = heat_ren_gw_t + heat_ren_pw_t
@@ -405,20 +606,20 @@ def calculate_bilanz_data():
     # The code is the same, but we pull from different columns (status vs ziel)
     
     # KLIK: Code 1 - status column for Status, ziel column for Ziel
-    klik_total_s = get_verbrauch_value('1', use_ziel=False)      # Status column: 329,214
-    klik_total_t = get_verbrauch_value('1', use_ziel=True)       # Ziel column
+    klik_total_s = verbrauch.status('1')      # Status column: 329,214
+    klik_total_t = verbrauch.target('1')       # Ziel column
     
     # Gebäudewärme: Code 2.10 - status column for Status, ziel column for Ziel
-    gw_total_s = get_verbrauch_value('2.10', use_ziel=False)     # Status column: 798,867
-    gw_total_t = get_verbrauch_value('2.10', use_ziel=True)      # Ziel column: 663,397
+    gw_total_s = verbrauch.status('2.10')     # Status column: 798,867
+    gw_total_t = verbrauch.target('2.10')      # Ziel column: 663,397
     
     # Prozesswärme: Code 3.3 - status column for Status, ziel column for Ziel
-    pw_total_s = get_verbrauch_value('3.7', use_ziel=False)      # Prozesswärme gesamt status
-    pw_total_t = get_verbrauch_value('3.7', use_ziel=True)       # Prozesswärme gesamt ziel
+    pw_total_s = verbrauch.status('3.7')      # Prozesswärme gesamt status
+    pw_total_t = verbrauch.target('3.7')       # Prozesswärme gesamt ziel
     
     # Mobile: Code 4.3.1 - status column for Status, ziel column for Ziel
-    mobile_total_s = get_verbrauch_value('4.3.1', use_ziel=False)  # Status column: 753,713
-    mobile_total_t = get_verbrauch_value('4.3.1', use_ziel=True)   # Ziel column: 388,761
+    mobile_total_s = verbrauch.status('4.3.1')  # Status column: 753,713
+    mobile_total_t = verbrauch.target('4.3.1')   # Ziel column: 388,761
     
     # Total consumption by sector (using direct codes from same row, different columns)
     verbrauch_gesamt = {
@@ -442,10 +643,7 @@ def calculate_bilanz_data():
     # SECTION 5: RENEWABLE BY SECTOR (direct RenewableData codes 10.3–10.6)
     # ============================================================================
     def safe_get_renewable(code: str, use_target: bool):
-        try:
-            return get_renewable_value(code, use_target=use_target)
-        except Exception:
-            return 0
+        return renewable.get(code, use_target=use_target)
 
     renewable_by_sector = {
         'status': {
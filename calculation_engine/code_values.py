@@ -0,0 +1,150 @@
+"""
+Bulk Code Value Lookups
+=======================
+
+Calculations like the Bilanz and the annual electricity flows read a fixed
+list of codes. Fetching them one ``.objects.get(code=...)`` at a time costs a
+round-trip per code; CodeValues gathers the whole list in a single
+``filter(code__in=...)`` query and serves typed lookups:
+
+    values = CodeValues.for_verbrauch(['1.4', '2.10'])
+    values.status('1.4')          # float, 0.0 when missing/None
+    values.target('2.10')         # VerbrauchData ziel / RenewableData target_value
+    values.target_or_status('X')  # target unless missing or zero
+
+Renewable codes backed by a formula can be evaluated with
+``with_calculated()``: the calculator data sources (LandUse, VerbrauchData,
+RenewableData) are loaded once for all formula codes instead of once per code
+as in ``RenewableData.get_calculated_values()``.
+"""
+
+from django.apps import apps
+
+
+class CodeValues:
+    """Status/target values for a set of codes, loaded in one query."""
+
+    def __init__(self, values, requested=(), formula_codes=(), default=0.0):
+        """
+        Args:
+            values: {code: (status, target)} with raw (possibly None) values
+            requested: Codes that were asked for (used by missing())
+            formula_codes: Renewable codes whose values come from a formula
+            default: Value for missing codes and None values
+        """
+        self._values = values
+        self._requested = tuple(requested)
+        self._formula_codes = tuple(formula_codes)
+        self.default = default
+
+    @classmethod
+    def for_verbrauch(cls, codes, default=0.0):
+        """VerbrauchData status/ziel for codes."""
+        VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+        codes = tuple(dict.fromkeys(codes))
+        values = {
+            code: (status, ziel)
+            for code, status, ziel in VerbrauchData.objects.filter(code__in=codes).values_list(
+                'code', 'status', 'ziel'
+            )
+        }
+        return cls(values, requested=codes, default=default)
+
+    @classmethod
+    def for_renewables(cls, codes, default=0.0):
+        """Raw RenewableData status_value/target_value for codes."""
+        RenewableData = apps.get_model('simulator', 'RenewableData')
+        codes = tuple(dict.fromkeys(codes))
+        values = {}
+        formula_codes = []
+        for code, status, target, is_fixed, formula in RenewableData.objects.filter(code__in=codes).values_list(
+            'code', 'status_value', 'target_value', 'is_fixed', 'formula'
+        ):
+            values[code] = (status, target)
+            if not is_fixed and formula:
+                formula_codes.append(code)
+        return cls(values, requested=codes, formula_codes=formula_codes, default=default)
+
+    def with_calculated(self):
+        """
+        Copy with formula-backed renewable codes replaced by their calculated
+        values (same fallback as RenewableData.get_calculated_values()).
+        """
+        values = dict(self._values)
+        if self._formula_codes:
+            calculator = load_renewable_calculator()
+            for code in self._formula_codes:
+                try:
+                    calc_status, calc_target = calculator.calculate(code)
+                except Exception as exc:
+                    print(f"Warning: Could not calculate renewable value for code {code}: {exc}")
+                    continue
+                if calc_status is not None and calc_target is not None:
+                    values[code] = (calc_status, calc_target)
+        return CodeValues(values, requested=self._requested, default=self.default)
+
+    def _pick(self, code, index, default):
+        default = self.default if default is None else default
+        pair = self._values.get(code)
+        if pair is None or pair[index] is None:
+            return default
+        return float(pair[index]) or default
+
+    def status(self, code, default=None):
+        """Status value of code as float (default when missing, None or zero)."""
+        return self._pick(code, 0, default)
+
+    def target(self, code, default=None):
+        """Target/ziel value of code as float (default when missing, None or zero)."""
+        return self._pick(code, 1, default)
+
+    def get(self, code, use_target=True, default=None):
+        return self.target(code, default) if use_target else self.status(code, default)
+
+    def target_or_status(self, code, default=None):
+        """Target value unless it is missing or zero, then the status value."""
+        pair = self._values.get(code)
+        if pair is not None and pair[1] not in (None, 0, 0.0):
+            return float(pair[1])
+        return self.status(code, default)
+
+    def missing(self):
+        """Requested codes that do not exist in the table."""
+        return [code for code in self._requested if code not in self._values]
+
+    def __contains__(self, code):
+        return code in self._values
+
+
+def load_renewable_calculator():
+    """
+    RenewableCalculator with all data sources loaded (three queries), or the
+    request's shared calculator when a data context is active.
+    """
+    from simulator.data_context import current_data_context
+    from .renewable_engine import RenewableCalculator
+
+    context = current_data_context()
+    if context is not None:
+        return context.renewable_calculator()
+
+    LandUse = apps.get_model('simulator', 'LandUse')
+    RenewableData = apps.get_model('simulator', 'RenewableData')
+    VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+
+    calculator = RenewableCalculator()
+    calculator.set_data_sources(
+        {
+            code: {'status_ha': status or 0, 'target_ha': target or 0}
+            for code, status, target in LandUse.objects.values_list('code', 'status_ha', 'target_ha')
+        },
+        {
+            code: {'status': status or 0, 'ziel': ziel or 0}
+            for code, status, ziel in VerbrauchData.objects.values_list('code', 'status', 'ziel')
+        },
+        {
+            code: {'status_value': status or 0, 'target_value': target or 0}
+            for code, status, target in RenewableData.objects.values_list('code', 'status_value', 'target_value')
+        },
+    )
+    return calculator
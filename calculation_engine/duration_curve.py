@@ -0,0 +1,141 @@
+"""
+Duration Curve ("segmentiert") Engine
+=====================================
+
+Vectorized implementation of the Excel WS.2a "segmentiert" logic:
+- Renewable generation and demand are sorted independently (highest first)
+- Surplus = sorted generation - sorted demand, per rank
+- Stromaufnahme = integral of the positive surplus
+- Deficit energy / deficit steps = integral / count of the negative surplus
+
+Every function works on batches: generation and demand may be 1-D (one
+scenario) or 2-D arrays of shape (scenarios, steps), so status, ziel and any
+number of what-if scenarios are evaluated in a single NumPy call.
+Results are cached by an input fingerprint and shared between the SMARD page,
+the cockpit and reports.
+"""
+
+import numpy as np
+
+from .result_cache import ResultCache, fingerprint
+
+_curve_cache = ResultCache(maxsize=32)
+
+
+def _as_batch(values):
+    arr = np.asarray(values, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr[np.newaxis, :]
+    if arr.ndim != 2:
+        raise ValueError("Duration curve inputs must be 1-D or 2-D arrays")
+    return arr
+
+
+def build_scenario_batch(shapes, totals):
+    """
+    Scale per-unit shapes to annual totals for a batch of scenarios.
+
+    Args:
+        shapes: Dict {source: per-unit array (sums to 1)}, all the same length
+        totals: List of dicts {source: annual energy}, one per scenario;
+                sources missing in a scenario count as 0
+
+    Returns:
+        np.ndarray of shape (scenarios, steps) with the summed generation
+    """
+    sources = list(shapes)
+    shape_matrix = np.vstack([np.asarray(shapes[s], dtype=np.float64) for s in sources])
+    total_matrix = np.array(
+        [[float(t.get(s, 0) or 0) for s in sources] for t in totals],
+        dtype=np.float64,
+    )
+    return total_matrix @ shape_matrix
+
+
+def _compute(generation, demand, hours_per_step):
+    gen = _as_batch(generation)
+    dmd = _as_batch(demand)
+    gen, dmd = np.broadcast_arrays(gen, dmd)
+
+    # Sort each scenario row descending (np.sort is ascending, so flip)
+    gen_sorted = np.sort(gen, axis=1)[:, ::-1]
+    dmd_sorted = np.sort(dmd, axis=1)[:, ::-1]
+    surplus_sorted = gen_sorted - dmd_sorted
+
+    positive = np.clip(surplus_sorted, 0, None)
+    negative = np.clip(-surplus_sorted, 0, None)
+    steps = surplus_sorted.shape[1]
+    surplus_steps = np.count_nonzero(surplus_sorted > 0, axis=1)
+    deficit_steps = np.count_nonzero(surplus_sorted < 0, axis=1)
+
+    result = {
+        'gen_sorted': np.ascontiguousarray(gen_sorted),
+        'dmd_sorted': np.ascontiguousarray(dmd_sorted),
+        'surplus_sorted': np.ascontiguousarray(surplus_sorted),
+        'surplus_energy': positive.sum(axis=1),
+        'deficit_energy': negative.sum(axis=1),
+        'surplus_steps': surplus_steps,
+        'deficit_steps': deficit_steps,
+        'deficit_hours': deficit_steps * hours_per_step,
+        'surplus_share': surplus_steps / steps if steps else np.zeros(len(surplus_steps)),
+        'generation_total': gen.sum(axis=1),
+        'demand_total': dmd.sum(axis=1),
+    }
+    for values in result.values():
+        values.setflags(write=False)
+    return result
+
+
+def compute_duration_curves(generation, demand, hours_per_step=24.0, use_cache=True):
+    """
+    Compute segmentiert duration curves for one or many scenarios.
+
+    Args:
+        generation: Array (steps,) or (scenarios, steps) of generation per step
+        demand: Array (steps,) or (scenarios, steps) of demand per step;
+                broadcast against generation
+        hours_per_step: Hours represented by one step (24 for daily data,
+                        1 for hourly data) used for deficit_hours
+        use_cache: Reuse a previous result for identical inputs
+
+    Returns:
+        Dict of read-only arrays, first axis = scenario:
+        gen_sorted, dmd_sorted, surplus_sorted (scenarios, steps) and
+        surplus_energy (Stromaufnahme), deficit_energy, surplus_steps,
+        deficit_steps, deficit_hours, surplus_share, generation_total,
+        demand_total (scenarios,)
+    """
+    if not use_cache:
+        return _compute(generation, demand, hours_per_step)
+    gen = np.asarray(generation, dtype=np.float64)
+    dmd = np.asarray(demand, dtype=np.float64)
+    key = fingerprint('segmentiert', gen, dmd, float(hours_per_step))
+    return _curve_cache.get_or_compute(key, lambda: _compute(gen, dmd, hours_per_step))
+
+
+def summarize(result, labels):
+    """
+    Turn a batch result into {label: {scalar metrics}} for templates and JSON.
+
+    Args:
+        result: Output of compute_duration_curves
+        labels: One label per scenario row (e.g. ['status', 'ziel'])
+    """
+    summary = {}
+    for i, label in enumerate(labels):
+        summary[label] = {
+            'surplus_energy': float(result['surplus_energy'][i]),
+            'deficit_energy': float(result['deficit_energy'][i]),
+            'surplus_steps': int(result['surplus_steps'][i]),
+            'deficit_steps': int(result['deficit_steps'][i]),
+            'deficit_hours': float(result['deficit_hours'][i]),
+            'surplus_share': float(result['surplus_share'][i]),
+            'generation_total': float(result['generation_total'][i]),
+            'demand_total': float(result['demand_total'][i]),
+        }
+    return summary
+
+
+def clear_cache():
+    """Drop all cached duration curves."""
+    _curve_cache.clear()
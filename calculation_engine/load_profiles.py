@@ -0,0 +1,218 @@
+"""
+Load Profile Synthesis - Hourly Sector Demand
+=============================================
+
+Builds hourly (8760 h) demand arrays per consumption sector from the annual
+sector totals in VerbrauchData and bundled standard profile templates:
+- KLIK (1.4): Kraft, Licht, Information, Kommunikation, Kälte
+- Gebäudewärme (2.10): space heating / hot water, strongly seasonal
+- Prozesswärme (3.7): industrial process heat, flat with weekday pattern
+- Mobile Anwendungen (4.3.1): transport, commuting peaks
+
+Each template is the product of an hour-of-day shape, a month factor and a
+weekend factor. Shapes are built with NumPy broadcasting (no Python loop over
+hours), normalized to 1 and scaled to the annual totals, so status and ziel
+are one matrix product. Results are cached by a fingerprint of the totals,
+year and templates; regeneration after a Verbrauch change only costs a few
+milliseconds.
+
+Units: VerbrauchData totals are GWh/a, hourly output is MWh/h.
+
+Consumers use the daily shape of the total sector load
+(``daily_demand_shapes()``): the SMARD duration curves scale the annual
+electricity demand with it, and the storage sweep redistributes the WS annual
+demand over the days with it.
+"""
+
+import datetime
+
+import numpy as np
+
+from .result_cache import ResultCache, fingerprint
+
+# Sector -> VerbrauchData code holding its annual total
+SECTOR_CODES = {
+    'klik': '1.4',
+    'gebaeudewaerme': '2.10',
+    'prozesswaerme': '3.7',
+    'mobile': '4.3.1',
+}
+
+# Standard profile templates (relative factors, normalized during synthesis)
+PROFILE_TEMPLATES = {
+    'klik': {
+        'hourly': [0.62, 0.58, 0.56, 0.55, 0.56, 0.62, 0.78, 0.95, 1.08, 1.14, 1.17, 1.18,
+                   1.16, 1.14, 1.12, 1.10, 1.11, 1.16, 1.22, 1.20, 1.10, 0.96, 0.82, 0.70],
+        'monthly': [1.10, 1.07, 1.02, 0.97, 0.94, 0.92, 0.92, 0.93, 0.96, 1.01, 1.07, 1.11],
+        'weekend': 0.82,
+    },
+    'gebaeudewaerme': {
+        'hourly': [0.70, 0.66, 0.64, 0.64, 0.68, 0.85, 1.20, 1.38, 1.30, 1.15, 1.05, 1.00,
+                   0.96, 0.94, 0.94, 0.98, 1.06, 1.18, 1.24, 1.20, 1.10, 0.98, 0.86, 0.76],
+        'monthly': [1.85, 1.70, 1.40, 0.95, 0.55, 0.30, 0.25, 0.27, 0.48, 0.90, 1.40, 1.75],
+        'weekend': 1.04,
+    },
+    'prozesswaerme': {
+        'hourly': [0.86, 0.85, 0.85, 0.85, 0.87, 0.93, 1.04, 1.10, 1.12, 1.12, 1.12, 1.10,
+                   1.08, 1.10, 1.10, 1.08, 1.04, 1.00, 0.96, 0.94, 0.92, 0.90, 0.88, 0.87],
+        'monthly': [1.04, 1.04, 1.03, 1.00, 0.98, 0.97, 0.94, 0.93, 0.99, 1.02, 1.03, 1.02],
+        'weekend': 0.70,
+    },
+    'mobile': {
+        'hourly': [0.25, 0.18, 0.15, 0.15, 0.25, 0.60, 1.30, 1.85, 1.60, 1.20, 1.10, 1.15,
+                   1.20, 1.20, 1.25, 1.45, 1.75, 1.80, 1.45, 1.05, 0.80, 0.62, 0.48, 0.35],
+        'monthly': [0.95, 0.96, 0.99, 1.00, 1.02, 1.03, 1.05, 1.03, 1.01, 1.00, 0.98, 0.97],
+        'weekend': 0.75,
+    },
+}
+
+DEFAULT_YEAR = 2023
+
+_shape_cache = ResultCache(maxsize=16)
+_profile_cache = ResultCache(maxsize=32)
+
+
+def _calendar(year):
+    """Return (month, is_weekend) arrays per day of the given year."""
+    start = np.datetime64(f'{year}-01-01')
+    days = np.arange(start, np.datetime64(f'{year + 1}-01-01'), dtype='datetime64[D]')
+    months = days.astype('datetime64[M]').astype(int) % 12
+    weekday = (datetime.date(year, 1, 1).weekday() + np.arange(len(days))) % 7
+    return months, weekday >= 5
+
+
+def build_shapes(year=DEFAULT_YEAR, templates=None):
+    """
+    Build normalized hourly shapes (sum = 1) for all sectors.
+
+    Args:
+        year: Calendar year used for month lengths and weekends
+        templates: Optional template dict; defaults to PROFILE_TEMPLATES
+
+    Returns:
+        Dict {sector: read-only np.ndarray of length 8760/8784}
+    """
+    templates = templates or PROFILE_TEMPLATES
+    key = fingerprint('load_shapes', year, templates)
+
+    def compute():
+        months, weekend = _calendar(year)
+        shapes = {}
+        for sector, template in templates.items():
+            hourly = np.asarray(template['hourly'], dtype=np.float64)
+            day_factor = np.asarray(template['monthly'], dtype=np.float64)[months]
+            day_factor = np.where(weekend, day_factor * template.get('weekend', 1.0), day_factor)
+            shape = (day_factor[:, np.newaxis] * hourly[np.newaxis, :]).ravel()
+            shape /= shape.sum()
+            shape.setflags(write=False)
+            shapes[sector] = shape
+        return shapes
+
+    return _shape_cache.get_or_compute(key, compute)
+
+
+def synthesize_profiles(sector_totals, year=DEFAULT_YEAR, templates=None):
+    """
+    Scale the sector shapes to annual totals for a batch of scenarios.
+
+    Args:
+        sector_totals: Dict {scenario: {sector: annual GWh}}, e.g.
+                       {'status': {'klik': 329214, ...}, 'ziel': {...}}
+        year: Calendar year for the hourly axis
+        templates: Optional template override
+
+    Returns:
+        Dict {scenario: {sector: hourly MWh array, 'total': hourly MWh array}}
+    """
+    templates = templates or PROFILE_TEMPLATES
+    key = fingerprint('load_profiles', year, templates, sector_totals)
+
+    def compute():
+        shapes = build_shapes(year, templates)
+        sectors = list(shapes)
+        scenarios = list(sector_totals)
+        totals_mwh = np.array(
+            [[float(sector_totals[s].get(sector, 0) or 0) * 1000 for sector in sectors] for s in scenarios],
+            dtype=np.float64,
+        )
+        # (scenarios, sectors, 1) * (1, sectors, hours) -> (scenarios, sectors, hours)
+        hourly = totals_mwh[:, :, np.newaxis] * np.vstack([shapes[s] for s in sectors])[np.newaxis, :, :]
+        totals = hourly.sum(axis=1)
+        hourly.setflags(write=False)
+        totals.setflags(write=False)
+
+        result = {}
+        for i, scenario in enumerate(scenarios):
+            profiles = {sector: hourly[i, j] for j, sector in enumerate(sectors)}
+            profiles['total'] = totals[i]
+            result[scenario] = profiles
+        return result
+
+    return _profile_cache.get_or_compute(key, compute)
+
+
+def daily_sums(hourly):
+    """Aggregate an hourly array (or batch of arrays) to daily sums."""
+    hourly = np.asarray(hourly, dtype=np.float64)
+    return hourly.reshape(hourly.shape[:-1] + (-1, 24)).sum(axis=-1)
+
+
+def get_sector_totals():
+    """
+    Read the annual sector totals (GWh/a) for status and ziel from VerbrauchData.
+
+    Returns:
+        Dict {'status': {sector: value}, 'ziel': {sector: value}}; missing codes count as 0
+    """
+    from django.apps import apps
+
+    VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+    rows = {
+        row['code']: row
+        for row in VerbrauchData.objects.filter(code__in=SECTOR_CODES.values()).values('code', 'status', 'ziel')
+    }
+    totals = {'status': {}, 'ziel': {}}
+    for sector, code in SECTOR_CODES.items():
+        row = rows.get(code, {})
+        totals['status'][sector] = row.get('status') or 0
+        totals['ziel'][sector] = row.get('ziel') or 0
+    return totals
+
+
+def synthesize_from_verbrauch(year=DEFAULT_YEAR):
+    """
+    Hourly sector demand for status and ziel from the current VerbrauchData.
+
+    One query for the four sector totals; the synthesis itself is cached by the
+    totals, so unchanged Verbrauch data returns the cached arrays.
+    """
+    return synthesize_profiles(get_sector_totals(), year=year)
+
+
+def daily_demand_shapes(year=DEFAULT_YEAR, days=None):
+    """
+    Per-unit daily shapes (sum = 1) of the synthesized total sector load.
+
+    Args:
+        year: Calendar year for the hourly axis
+        days: Optional day-of-year indices (0-based) to restrict the shapes to,
+              e.g. the days covered by the SMARD export; renormalized to 1
+
+    Returns:
+        Dict {'status': np.ndarray or None, 'ziel': ...}; None when the
+        scenario has no sector totals in VerbrauchData
+    """
+    shapes = {}
+    for scenario, profiles in synthesize_from_verbrauch(year=year).items():
+        daily = daily_sums(profiles['total'])
+        if days is not None:
+            daily = daily[np.asarray(days)]
+        total = daily.sum()
+        shapes[scenario] = daily / total if total > 0 else None
+    return shapes
+
+
+def clear_cache():
+    """Drop cached shapes and profiles."""
+    _shape_cache.clear()
+    _profile_cache.clear()
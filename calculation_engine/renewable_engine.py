@@ -13,7 +13,7 @@ This provides:
 """
 
 from .formula_evaluator import FormulaEvaluator
-from simulator.formula_service import FormulaService
+from simulator.formula_service import get_formula_service
 
 
 # ALL RENEWABLE ENERGY FORMULAS
@@ -1109,7 +1109,7 @@ class RenewableCalculator:
     
     def __init__(self):
         self.evaluator = FormulaEvaluator()
-        self.formula_service = FormulaService(use_cache=True)
+        self.formula_service = get_formula_service()
         self.cache = {}
     
     def set_data_sources(self, landuse_data, verbrauch_data, renewable_data):
@@ -0,0 +1,114 @@
+"""
+Result Cache - Fingerprint-Keyed In-Process Memoization
+=======================================================
+
+Small helpers shared by the array-based engines (duration curves, load
+profiles, storage dispatch):
+- fingerprint(): stable SHA1 over scalars, dicts, lists and NumPy arrays
+- ResultCache: bounded LRU cache keyed on such fingerprints
+
+Engines compute a fingerprint of all their inputs and look it up before doing
+any work, so identical requests from the SMARD page, the cockpit or reports
+share one result per process.
+"""
+
+from collections import OrderedDict
+import hashlib
+import sys
+import threading
+
+
+def _feed(h, value):
+    """Feed a value into a hashlib object in a type-stable way."""
+    # numpy is not imported here: a value can only be an array once numpy is loaded
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        h.update(b"nd")
+        h.update(str(arr.dtype).encode())
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    elif isinstance(value, dict):
+        h.update(b"d")
+        for key in sorted(value, key=str):
+            _feed(h, str(key))
+            _feed(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l")
+        h.update(str(len(value)).encode())
+        for item in value:
+            _feed(h, item)
+    elif isinstance(value, float):
+        h.update(b"f")
+        h.update(repr(value).encode())
+    elif value is None:
+        h.update(b"n")
+    else:
+        h.update(type(value).__name__.encode())
+        h.update(str(value).encode())
+
+
+def fingerprint(*parts):
+    """
+    Build a stable fingerprint for arbitrary engine inputs.
+
+    Args:
+        *parts: Scalars, strings, dicts, lists/tuples or NumPy arrays
+
+    Returns:
+        str: Hex SHA1 digest
+    """
+    h = hashlib.sha1()
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe bounded LRU cache for engine results.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
@@ -0,0 +1,266 @@
+"""
+Sector Allocation Optimizer - Renewable Supply to Demand Sectors
+================================================================
+
+Replaces the archived PyPSA scripts (archive/old_test_scripts/pypsa_*.py,
+archive/scripts/pypsa_analysis.py) with an in-process linear program.
+
+Supply pools (RenewableData, GWh/a):
+- strom: renewable electricity (10.2)
+- waerme: renewable heat (10.4.2 + 10.5.2)
+- brennstoffe: renewable fuels (10.7)
+
+Demand (VerbrauchData, GWh/a), split per sector into an electricity part and
+a non-electric (heat/fuel) part:
+- KLIK: 1.4 (electricity only)
+- Gebäudewärme: 2.10 total, electricity 2.9.0
+- Prozesswärme: 3.7 total, electricity 3.6.0
+- Mobile Anwendungen: 4.3.1 total, electricity 4.3.6
+
+LP (all variables >= 0):
+    x[s, d]  supply pool s delivered to demand slot d (only compatible pairs)
+    f[d]     fossil energy covering demand slot d
+    z        lowest renewable share over all sectors
+
+    minimize   sum f  -  EPS_SHARE * z  +  sum cost[s] * x[s, d]
+    s.t.       sum_s x[s, d] + f[d] = demand[d]           (each slot)
+               sum_d x[s, d]       <= supply[s]           (each pool)
+               z * D[k] - sum x[s, d in k] <= 0           (each sector k)
+
+The constraint matrices are assembled as scipy.sparse matrices and solved with
+HiGHS via scipy.optimize.linprog. Status and ziel are independent LPs; both
+are cached by a fingerprint of their inputs. Without scipy, the proportional
+split of the archived scripts is used as a fallback.
+"""
+
+import numpy as np
+
+from .result_cache import ResultCache, fingerprint
+
+SUPPLY_CODES = {
+    'strom': ['10.2'],
+    'waerme': ['10.4.2', '10.5.2'],
+    'brennstoffe': ['10.7'],
+}
+
+# sector -> (total demand code, electricity demand code or None = all electricity)
+SECTOR_DEMAND_CODES = {
+    'klik': ('1.4', None),
+    'gebaeudewaerme': ('2.10', '2.9.0'),
+    'prozesswaerme': ('3.7', '3.6.0'),
+    'mobile': ('4.3.1', '4.3.6'),
+}
+
+# Which supply pool may cover which demand slot ('strom' / 'rest')
+COMPATIBILITY = {
+    'strom': {('klik', 'strom'), ('gebaeudewaerme', 'strom'), ('prozesswaerme', 'strom'), ('mobile', 'strom')},
+    'waerme': {('gebaeudewaerme', 'rest'), ('prozesswaerme', 'rest')},
+    'brennstoffe': {('gebaeudewaerme', 'rest'), ('prozesswaerme', 'rest'), ('mobile', 'rest')},
+}
+
+# Tie-breakers: fuels are the most versatile pool, so use heat first
+SOURCE_COST = {'strom': 0.0, 'waerme': 0.0, 'brennstoffe': 1e-6}
+EPS_SHARE = 1e-3
+
+_allocation_cache = ResultCache(maxsize=32)
+
+
+def _demand_slots(sector_demand):
+    """Split {sector: {'total': x, 'strom': y}} into ordered (sector, slot) demands."""
+    slots = []
+    for sector, values in sector_demand.items():
+        total = max(float(values.get('total') or 0), 0.0)
+        strom = values.get('strom')
+        strom = total if strom is None else min(max(float(strom), 0.0), total)
+        slots.append(((sector, 'strom'), strom))
+        slots.append(((sector, 'rest'), total - strom))
+    return slots
+
+
+def _result(sources, supply, slots, x, pairs, sectors, solver):
+    allocation = {s: {k: 0.0 for k in sectors} for s in sources}
+    covered = np.zeros(len(slots))
+    for value, (i, j) in zip(x, pairs):
+        allocation[sources[i]][slots[j][0][0]] += float(value)
+        covered[j] += value
+    fossil = {k: 0.0 for k in sectors}
+    demand = {k: 0.0 for k in sectors}
+    for j, ((sector, _slot), d) in enumerate(slots):
+        fossil[sector] += max(d - covered[j], 0.0)
+        demand[sector] += d
+    used = {s: sum(allocation[s].values()) for s in sources}
+    return {
+        'solver': solver,
+        'allocation': allocation,
+        'fossil': fossil,
+        'demand': demand,
+        'renewable_share': {
+            k: (1.0 - fossil[k] / demand[k]) if demand[k] > 0 else 1.0 for k in sectors
+        },
+        'unused_supply': {s: max(supply[i] - used[s], 0.0) for i, s in enumerate(sources)},
+        'fossil_total': sum(fossil.values()),
+        'demand_total': sum(demand.values()),
+    }
+
+
+def _solve_lp(sources, supply, slots, pairs, sectors):
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    n_x = len(pairs)
+    n_f = len(slots)
+    n_vars = n_x + n_f + 1  # x..., f..., z
+    z_col = n_x + n_f
+
+    cost = np.zeros(n_vars)
+    cost[:n_x] = [SOURCE_COST.get(sources[i], 0.0) for i, _j in pairs]
+    cost[n_x:z_col] = 1.0
+    cost[z_col] = -EPS_SHARE
+
+    # Equality: sum_s x[s, d] + f[d] = demand[d]
+    rows = [j for _i, j in pairs] + list(range(n_f))
+    cols = list(range(n_x)) + list(range(n_x, z_col))
+    a_eq = coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_f, n_vars)).tocsr()
+    b_eq = np.array([d for _slot, d in slots])
+
+    # Inequalities: supply limits, then z * D[k] - renewable[k] <= 0
+    sector_index = {k: n for n, k in enumerate(sectors)}
+    sector_demand = np.zeros(len(sectors))
+    for (sector, _slot), d in slots:
+        sector_demand[sector_index[sector]] += d
+    ub_rows, ub_cols, ub_vals = [], [], []
+    for col, (i, j) in enumerate(pairs):
+        ub_rows.append(i)
+        ub_cols.append(col)
+        ub_vals.append(1.0)
+        ub_rows.append(len(sources) + sector_index[slots[j][0][0]])
+        ub_cols.append(col)
+        ub_vals.append(-1.0)
+    for n, d in enumerate(sector_demand):
+        ub_rows.append(len(sources) + n)
+        ub_cols.append(z_col)
+        ub_vals.append(d)
+    a_ub = coo_matrix((ub_vals, (ub_rows, ub_cols)), shape=(len(sources) + len(sectors), n_vars)).tocsr()
+    b_ub = np.concatenate([supply, np.zeros(len(sectors))])
+
+    bounds = [(0, None)] * (n_vars - 1) + [(0, 1)]
+    res = linprog(cost, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq, bounds=bounds, method='highs')
+    if not res.success:
+        raise ValueError(f"Sector allocation LP failed: {res.message}")
+    return res.x[:n_x]
+
+
+def _solve_proportional(sources, supply, slots, pairs):
+    """Fallback: split each pool over its compatible slots by demand (archived script logic)."""
+    x = np.zeros(len(pairs))
+    remaining = np.array([d for _slot, d in slots], dtype=np.float64)
+    for i in range(len(sources)):
+        idx = [n for n, (pi, _j) in enumerate(pairs) if pi == i]
+        wanted = np.array([remaining[pairs[n][1]] for n in idx])
+        if not idx or wanted.sum() <= 0:
+            continue
+        give = wanted * min(1.0, supply[i] / wanted.sum())
+        for n, g in zip(idx, give):
+            x[n] = g
+            remaining[pairs[n][1]] -= g
+    return x
+
+
+def optimize_allocation(supply_by_source, sector_demand, use_cache=True):
+    """
+    Allocate renewable supply pools to sector demand.
+
+    Args:
+        supply_by_source: {'strom': GWh, 'waerme': GWh, 'brennstoffe': GWh}
+        sector_demand: {sector: {'total': GWh, 'strom': GWh or None}}
+        use_cache: Reuse the result for identical inputs
+
+    Returns:
+        Dict with allocation {source: {sector: GWh}}, fossil/demand/
+        renewable_share per sector, unused_supply per source, totals and the
+        solver used ('highs' or 'proportional')
+    """
+    key = fingerprint('sector_allocation', supply_by_source, sector_demand, COMPATIBILITY, SOURCE_COST)
+
+    def compute():
+        sources = list(supply_by_source)
+        supply = np.array([max(float(supply_by_source[s] or 0), 0.0) for s in sources])
+        slots = _demand_slots(sector_demand)
+        sectors = list(sector_demand)
+        pairs = [
+            (i, j)
+            for i, s in enumerate(sources)
+            for j, (slot, _d) in enumerate(slots)
+            if slot in COMPATIBILITY.get(s, ())
+        ]
+        try:
+            x = _solve_lp(sources, supply, slots, pairs, sectors)
+            solver = 'highs'
+        except ImportError:
+            x = _solve_proportional(sources, supply, slots, pairs)
+            solver = 'proportional'
+        return _result(sources, supply, slots, x, pairs, sectors, solver)
+
+    if not use_cache:
+        return compute()
+    return _allocation_cache.get_or_compute(key, compute)
+
+
+def build_allocation_inputs(renewable_lookup, verbrauch_lookup):
+    """
+    Build LP inputs from in-memory lookups.
+
+    Args:
+        renewable_lookup: {code: value} for RenewableData (status or target)
+        verbrauch_lookup: {code: value} for VerbrauchData (status or ziel)
+    """
+    supply = {
+        source: sum(float(renewable_lookup.get(code) or 0) for code in codes)
+        for source, codes in SUPPLY_CODES.items()
+    }
+    demand = {}
+    for sector, (total_code, strom_code) in SECTOR_DEMAND_CODES.items():
+        demand[sector] = {
+            'total': verbrauch_lookup.get(total_code) or 0,
+            'strom': None if strom_code is None else (verbrauch_lookup.get(strom_code) or 0),
+        }
+    return supply, demand
+
+
+def allocate_sectors(renewable_status, renewable_target, verbrauch_status, verbrauch_ziel):
+    """Run the status and ziel allocation from in-memory lookups."""
+    return {
+        'status': optimize_allocation(*build_allocation_inputs(renewable_status, verbrauch_status)),
+        'ziel': optimize_allocation(*build_allocation_inputs(renewable_target, verbrauch_ziel)),
+    }
+
+
+def allocate_from_database():
+    """
+    Load only the codes the allocation needs (two queries) and solve status and ziel.
+    """
+    from django.apps import apps
+
+    RenewableData = apps.get_model('simulator', 'RenewableData')
+    VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+    renewable_codes = [code for codes in SUPPLY_CODES.values() for code in codes]
+    verbrauch_codes = [c for pair in SECTOR_DEMAND_CODES.values() for c in pair if c]
+
+    renewable_status, renewable_target = {}, {}
+    for code, status, target in RenewableData.objects.filter(code__in=renewable_codes).values_list(
+        'code', 'status_value', 'target_value'
+    ):
+        renewable_status[code] = status
+        renewable_target[code] = target
+    verbrauch_status, verbrauch_ziel = {}, {}
+    for code, status, ziel in VerbrauchData.objects.filter(code__in=verbrauch_codes).values_list(
+        'code', 'status', 'ziel'
+    ):
+        verbrauch_status[code] = status
+        verbrauch_ziel[code] = ziel
+    return allocate_sectors(renewable_status, renewable_target, verbrauch_status, verbrauch_ziel)
+
+
+def clear_cache():
+    """Drop cached allocation results."""
+    _allocation_cache.clear()
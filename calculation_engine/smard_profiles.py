@@ -0,0 +1,101 @@
+"""
+SMARD Profile Loader
+====================
+
+Loads the bundled SMARD hourly generation export
+(data/Actual_generation_202302010000_202401010000_Hour.csv) once per process
+and exposes it as NumPy arrays:
+- hourly: per-source hourly generation in MWh
+- daily: per-source daily sums in MWh plus the calendar day of each row
+
+The SMARD export uses the English number format ("4,302.50") with ';' as the
+field separator and '-' for missing values. The parsed result is cached per
+(path, mtime) so replacing the CSV is picked up without a restart.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_SMARD_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data',
+    'Actual_generation_202302010000_202401010000_Hour.csv',
+)
+
+SMARD_COLUMNS = {
+    'solar': 'Photovoltaics [MWh] Calculated resolutions',
+    'wind_onshore': 'Wind onshore [MWh] Calculated resolutions',
+    'wind_offshore': 'Wind offshore [MWh] Calculated resolutions',
+    'hydro': 'Hydropower [MWh] Calculated resolutions',
+    'bio': 'Biomass [MWh] Calculated resolutions',
+    'nuclear': 'Nuclear [MWh] Calculated resolutions',
+    'lignite': 'Lignite [MWh] Calculated resolutions',
+    'hard_coal': 'Hard coal [MWh] Calculated resolutions',
+    'fossil_gas': 'Fossil gas [MWh] Calculated resolutions',
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _parse(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, sep=';', thousands=',', decimal='.', na_values=['-'])
+    df.columns = [c.lstrip('﻿') for c in df.columns]
+
+    hourly = {}
+    for key, column in SMARD_COLUMNS.items():
+        hourly[key] = df[column].fillna(0).to_numpy(dtype=np.float64)
+    hourly['wind'] = hourly['wind_onshore'] + hourly['wind_offshore']
+    hourly['total'] = sum(hourly[key] for key in SMARD_COLUMNS)
+
+    start = pd.to_datetime(df['Start date'], format='%b %d, %Y %I:%M %p')
+    days = start.dt.normalize().to_numpy()
+    unique_days, day_index = np.unique(days, return_inverse=True)
+
+    daily = {}
+    for key, values in hourly.items():
+        daily[key] = np.bincount(day_index, weights=values, minlength=len(unique_days))
+
+    for values in list(hourly.values()) + list(daily.values()):
+        values.setflags(write=False)
+
+    return {
+        'hourly': hourly,
+        'daily': daily,
+        'hours': start.to_numpy(),
+        'dates': [str(d)[:10] for d in unique_days],
+    }
+
+
+def load_smard_profiles(path=None):
+    """
+    Load (cached) SMARD generation profiles.
+
+    Args:
+        path: Optional CSV path; defaults to the bundled SMARD export
+
+    Returns:
+        Dict with 'hourly' and 'daily' {source: np.ndarray} maps, the hourly
+        timestamps ('hours') and ISO day strings ('dates').
+        Arrays are read-only because they are shared between callers.
+    """
+    path = os.path.abspath(path or DEFAULT_SMARD_PATH)
+    key = (path, os.path.getmtime(path))
+    with _lock:
+        if key not in _cache:
+            _cache.clear()
+            _cache[key] = _parse(path)
+        return _cache[key]
+
+
+def normalized_shape(values):
+    """Return values / sum(values) (energy-weighted per-unit shape), zeros if empty."""
+    values = np.asarray(values, dtype=np.float64)
+    total = values.sum()
+    if total > 0:
+        return values / total
+    return np.zeros_like(values)
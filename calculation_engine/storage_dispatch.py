@@ -0,0 +1,264 @@
+"""
+Storage Dispatch Simulator - Multi-Technology (Battery + H2)
+============================================================
+
+Hourly dispatch of several storage technologies against a generation and a
+demand profile. Unlike the single gas-storage path in WSCalculator (fixed
+ETA_STROM_GAS / ETA_GAS_STROM), every technology has its own:
+- charge / discharge power limit (MW)
+- energy capacity (MWh, stored energy)
+- charge and discharge efficiency
+- self-discharge (fraction of the stored energy lost per hour)
+
+Dispatch is priority based: surplus charges the technologies in list order,
+deficits discharge them in list order; whatever is left is curtailment
+(Abregelung) or unmet demand (residual fossil, Mangel-Last).
+
+Everything that does not depend on the state of charge (surplus, deficit,
+direct use) is vectorized with NumPy. The state-dependent hour loop runs in a
+small kernel that is compiled with numba when it is installed and falls back
+to a plain Python loop otherwise (same results, just slower).
+Results are cached by a fingerprint of profiles and technology parameters.
+"""
+
+import numpy as np
+
+from .result_cache import ResultCache, fingerprint
+
+try:  # Optional JIT compilation of the hour loop
+    from numba import njit as _njit
+except ImportError:  # pragma: no cover - depends on the environment
+    _njit = None
+
+_dispatch_cache = ResultCache(maxsize=64)
+
+
+class StorageTechnology:
+    """
+    Parameters of one storage technology.
+
+    Args:
+        name: Label used in the results (e.g. 'battery', 'h2')
+        capacity: Usable energy capacity in MWh (stored energy)
+        power_in: Max. electrical charging power in MW
+        power_out: Max. electrical discharging power in MW (defaults to power_in)
+        eta_charge: Electricity -> stored energy efficiency
+        eta_discharge: Stored energy -> electricity efficiency
+        self_discharge: Fraction of the stored energy lost per hour
+        initial_soc: Initial state of charge as fraction of capacity
+    """
+
+    def __init__(self, name, capacity, power_in, power_out=None, eta_charge=1.0,
+                 eta_discharge=1.0, self_discharge=0.0, initial_soc=0.0):
+        if capacity < 0 or power_in < 0 or (power_out is not None and power_out < 0):
+            raise ValueError(f"Storage '{name}': capacity and power must be >= 0")
+        if not (0 < eta_charge <= 1 and 0 < eta_discharge <= 1):
+            raise ValueError(f"Storage '{name}': efficiencies must be in (0, 1]")
+        if not 0 <= self_discharge < 1:
+            raise ValueError(f"Storage '{name}': self_discharge must be in [0, 1)")
+        if not 0 <= initial_soc <= 1:
+            raise ValueError(f"Storage '{name}': initial_soc must be in [0, 1]")
+        self.name = name
+        self.capacity = float(capacity)
+        self.power_in = float(power_in)
+        self.power_out = float(power_in if power_out is None else power_out)
+        self.eta_charge = float(eta_charge)
+        self.eta_discharge = float(eta_discharge)
+        self.self_discharge = float(self_discharge)
+        self.initial_soc = float(initial_soc)
+
+    @property
+    def round_trip_efficiency(self):
+        return self.eta_charge * self.eta_discharge
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'capacity': self.capacity,
+            'power_in': self.power_in,
+            'power_out': self.power_out,
+            'eta_charge': self.eta_charge,
+            'eta_discharge': self.eta_discharge,
+            'self_discharge': self.self_discharge,
+            'initial_soc': self.initial_soc,
+        }
+
+    def __repr__(self):
+        return f"StorageTechnology({self.name!r}, capacity={self.capacity}, power_in={self.power_in})"
+
+
+def battery(capacity, power, eta_charge=0.95, eta_discharge=0.95, self_discharge=0.0001, **kwargs):
+    """Lithium-ion battery preset (round trip ~90 %, low self-discharge)."""
+    return StorageTechnology('battery', capacity, power, eta_charge=eta_charge,
+                             eta_discharge=eta_discharge, self_discharge=self_discharge, **kwargs)
+
+
+def hydrogen(capacity, power_in, power_out=None, ws_calculator=None, **kwargs):
+    """
+    Power-to-gas-to-power preset using the WSCalculator efficiencies
+    (ETA_STROM_GAS for the electrolyser, ETA_GAS_STROM for reconversion).
+    """
+    if ws_calculator is not None:
+        eta_charge = ws_calculator.ETA_STROM_GAS
+        eta_discharge = ws_calculator.ETA_GAS_STROM
+    else:
+        eta_charge, eta_discharge = 0.65, 0.585
+    kwargs.setdefault('eta_charge', eta_charge)
+    kwargs.setdefault('eta_discharge', eta_discharge)
+    return StorageTechnology('h2', capacity, power_in, power_out, **kwargs)
+
+
+def _dispatch_kernel(surplus, deficit, capacity, power_in, power_out, eta_c, eta_d,
+                     keep, soc0, dt, charge, discharge, soc, curtailed, unmet):
+    """
+    Priority dispatch hour loop (state dependent, so not vectorizable).
+
+    Fills charge/discharge/soc (technologies x hours, electrical MWh resp.
+    stored MWh) and curtailed/unmet (hours) in place.
+    """
+    n_tech = len(capacity)
+    n_hours = len(surplus)
+    state = [soc0[k] * capacity[k] for k in range(n_tech)]
+    for h in range(n_hours):
+        rest_surplus = surplus[h]
+        rest_deficit = deficit[h]
+        for k in range(n_tech):
+            level = state[k] * keep[k]
+            if rest_surplus > 0.0:
+                room = (capacity[k] - level) / eta_c[k]
+                e_in = min(rest_surplus, power_in[k] * dt, room)
+                if e_in > 0.0:
+                    level += e_in * eta_c[k]
+                    rest_surplus -= e_in
+                    charge[k, h] = e_in
+            if rest_deficit > 0.0:
+                available = level * eta_d[k]
+                e_out = min(rest_deficit, power_out[k] * dt, available)
+                if e_out > 0.0:
+                    level -= e_out / eta_d[k]
+                    rest_deficit -= e_out
+                    discharge[k, h] = e_out
+            state[k] = level
+            soc[k, h] = level
+        curtailed[h] = rest_surplus
+        unmet[h] = rest_deficit
+
+
+if _njit is not None:  # pragma: no cover - depends on the environment
+    _compiled_kernel = _njit(cache=True)(_dispatch_kernel)
+else:
+    _compiled_kernel = None
+
+
+def _run_kernel(surplus, deficit, params, dt):
+    n_tech = len(params['capacity'])
+    n_hours = len(surplus)
+    charge = np.zeros((n_tech, n_hours))
+    discharge = np.zeros((n_tech, n_hours))
+    soc = np.zeros((n_tech, n_hours))
+    curtailed = np.zeros(n_hours)
+    unmet = np.zeros(n_hours)
+    args = [params[k] for k in ('capacity', 'power_in', 'power_out', 'eta_c', 'eta_d', 'keep', 'soc0')]
+
+    if _compiled_kernel is not None:
+        _compiled_kernel(surplus, deficit, *args, dt, charge, discharge, soc, curtailed, unmet)
+    else:
+        # Plain Python floats are much faster than NumPy scalars in the loop
+        _dispatch_kernel(surplus.tolist(), deficit.tolist(), *[a.tolist() for a in args],
+                         dt, charge, discharge, soc, curtailed, unmet)
+    return charge, discharge, soc, curtailed, unmet
+
+
+def _simulate(generation, demand, technologies, dt):
+    # Vectorized part: direct use, surplus and deficit per hour
+    direct = np.minimum(generation, demand)
+    surplus = generation - direct
+    deficit = demand - direct
+
+    params = {
+        'capacity': np.array([t.capacity for t in technologies], dtype=np.float64),
+        'power_in': np.array([t.power_in for t in technologies], dtype=np.float64),
+        'power_out': np.array([t.power_out for t in technologies], dtype=np.float64),
+        'eta_c': np.array([t.eta_charge for t in technologies], dtype=np.float64),
+        'eta_d': np.array([t.eta_discharge for t in technologies], dtype=np.float64),
+        'keep': np.array([(1.0 - t.self_discharge) ** dt for t in technologies], dtype=np.float64),
+        'soc0': np.array([t.initial_soc for t in technologies], dtype=np.float64),
+    }
+    charge, discharge, soc, curtailed, unmet = _run_kernel(surplus, deficit, params, dt)
+
+    technologies_result = {}
+    for k, tech in enumerate(technologies):
+        charged = charge[k].sum()
+        discharged = discharge[k].sum()
+        start_level = tech.initial_soc * tech.capacity
+        end_level = soc[k, -1] if soc.shape[1] else start_level
+        technologies_result[tech.name] = {
+            'parameters': tech.as_dict(),
+            'charge': charge[k],
+            'discharge': discharge[k],
+            'soc': soc[k],
+            'charged_energy': float(charged),
+            'discharged_energy': float(discharged),
+            'losses': float(charged - discharged - (end_level - start_level)),
+            'full_cycles': float(discharged / tech.eta_discharge / tech.capacity) if tech.capacity else 0.0,
+            'max_soc': float(soc[k].max()) if soc.shape[1] else 0.0,
+            'final_soc': float(end_level),
+        }
+
+    for arr in (charge, discharge, soc, curtailed, unmet, direct, surplus, deficit):
+        arr.setflags(write=False)
+
+    return {
+        'technologies': technologies_result,
+        'direct_use': direct,
+        'surplus': surplus,
+        'deficit': deficit,
+        'curtailed': curtailed,
+        'unmet': unmet,
+        'totals': {
+            'generation': float(generation.sum()),
+            'demand': float(demand.sum()),
+            'direct_use': float(direct.sum()),
+            'surplus': float(surplus.sum()),
+            'deficit': float(deficit.sum()),
+            'curtailed': float(curtailed.sum()),
+            'unmet': float(unmet.sum()),
+            'unmet_hours': int(np.count_nonzero(unmet > 1e-9)),
+            'self_sufficiency': float(1.0 - unmet.sum() / demand.sum()) if demand.sum() > 0 else 1.0,
+        },
+    }
+
+
+def simulate_dispatch(generation, demand, technologies, dt=1.0, use_cache=True):
+    """
+    Simulate priority storage dispatch.
+
+    Args:
+        generation: Generation per step (MWh), e.g. 8760 hourly values
+        demand: Demand per step (MWh), same length as generation
+        technologies: List of StorageTechnology in dispatch priority order
+        dt: Step length in hours (power limits are MW, so energy = power * dt)
+        use_cache: Reuse a previous result for identical inputs
+
+    Returns:
+        Dict with per-technology results ('technologies': {name: {...}}),
+        hourly system arrays (direct_use, surplus, deficit, curtailed, unmet)
+        and scalar 'totals'. Arrays are read-only (shared via the cache).
+    """
+    generation = np.asarray(generation, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    if generation.shape != demand.shape or generation.ndim != 1:
+        raise ValueError("generation and demand must be 1-D arrays of equal length")
+    names = [t.name for t in technologies]
+    if len(set(names)) != len(names):
+        raise ValueError("Storage technology names must be unique")
+
+    if not use_cache:
+        return _simulate(generation, demand, technologies, dt)
+    key = fingerprint('dispatch', generation, demand, [t.as_dict() for t in technologies], float(dt))
+    return _dispatch_cache.get_or_compute(key, lambda: _simulate(generation, demand, technologies, dt))
+
+
+def clear_cache():
+    """Drop cached dispatch results."""
+    _dispatch_cache.clear()
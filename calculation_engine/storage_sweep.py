@@ -0,0 +1,221 @@
+"""
+Storage Sizing Sweep - Parametric Grid over the Dispatch Simulator
+==================================================================
+
+Evaluates the storage dispatch simulator (storage_dispatch.py) over a grid of
+WS parameters instead of editing WSCalculator constants by hand and rerunning
+the balance each time:
+- storage_size: storage capacity (stored energy)
+- ABREGELUNG_THRESHOLD: max. charging energy per step as share of the demand
+  (surplus above it is curtailed, like column R Abregelung.Z)
+- ETA_STROM_GAS / ETA_GAS_STROM: charge / reconversion efficiency
+- GAS_STORAGE_OFFSET: reserve kept in the storage, not available for
+  reconversion (usable capacity = storage_size - offset)
+
+Grid points are fanned out over a process pool in chunks; every point is
+cached by (input fingerprint, parameters), so extending a grid only computes
+the new points. The result is a table sorted by storage size with a Pareto
+flag (non-dominated in size, curtailment and residual fossil demand).
+
+All energies share the unit of the input profiles (WS profiles: GWh/day).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+
+import numpy as np
+
+from .result_cache import ResultCache, fingerprint
+from .storage_dispatch import StorageTechnology, simulate_dispatch
+
+SWEEP_PARAMETERS = (
+    'storage_size',
+    'ABREGELUNG_THRESHOLD',
+    'ETA_STROM_GAS',
+    'ETA_GAS_STROM',
+    'GAS_STORAGE_OFFSET',
+)
+
+# Points per process-pool task; small grids run in-process
+CHUNK_SIZE = 16
+
+_point_cache = ResultCache(maxsize=4096)
+
+
+def default_parameters(ws_calculator=None):
+    """Current WSCalculator constants as sweep defaults."""
+    if ws_calculator is None:
+        from .ws_engine import get_ws_calculator
+        ws_calculator = get_ws_calculator()
+    return {
+        'ABREGELUNG_THRESHOLD': ws_calculator.ABREGELUNG_THRESHOLD,
+        'ETA_STROM_GAS': ws_calculator.ETA_STROM_GAS,
+        'ETA_GAS_STROM': ws_calculator.ETA_GAS_STROM,
+        'GAS_STORAGE_OFFSET': ws_calculator.GAS_STORAGE_OFFSET,
+    }
+
+
+def expand_grid(grid, defaults=None):
+    """
+    Expand {parameter: [values]} into a list of complete parameter dicts.
+
+    Parameters missing from the grid take their value from defaults.
+    """
+    unknown = set(grid) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    if 'storage_size' not in grid and 'storage_size' not in (defaults or {}):
+        raise ValueError("Sweep grid needs 'storage_size' values")
+    defaults = dict(defaults or {})
+    names = list(grid)
+    points = []
+    for values in itertools.product(*(grid[n] for n in names)):
+        point = dict(defaults)
+        point.update({n: float(v) for n, v in zip(names, values)})
+        points.append(point)
+    return points
+
+
+def evaluate_point(generation, demand, point, dt=24.0):
+    """
+    Run one dispatch simulation for a parameter point.
+
+    Returns:
+        Dict with the parameters plus curtailment, residual_fossil, stored and
+        reconverted energy
+    """
+    generation = np.asarray(generation, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    threshold = point['ABREGELUNG_THRESHOLD']
+
+    # Vectorized curtailment: charging is limited to threshold * demand per step
+    direct = np.minimum(generation, demand)
+    surplus = generation - direct
+    chargeable = np.minimum(surplus, threshold * demand)
+    pre_curtailed = float((surplus - chargeable).sum())
+
+    usable = max(point['storage_size'] - point['GAS_STORAGE_OFFSET'], 0.0)
+    storage = StorageTechnology(
+        'h2',
+        capacity=usable,
+        power_in=float(chargeable.max(initial=0.0)) / dt,
+        power_out=float(demand.max(initial=0.0)) / dt,
+        eta_charge=point['ETA_STROM_GAS'],
+        eta_discharge=point['ETA_GAS_STROM'],
+    )
+    result = simulate_dispatch(direct + chargeable, demand, [storage], dt=dt, use_cache=False)
+    h2 = result['technologies']['h2']
+    row = dict(point)
+    row.update({
+        'curtailment': pre_curtailed + result['totals']['curtailed'],
+        'residual_fossil': result['totals']['unmet'],
+        'stored_energy': h2['charged_energy'],
+        'reconverted_energy': h2['discharged_energy'],
+        'max_soc': h2['max_soc'],
+    })
+    return row
+
+
+def _evaluate_chunk(generation, demand, points, dt):
+    return [evaluate_point(generation, demand, point, dt) for point in points]
+
+
+def mark_pareto(rows, objectives=('storage_size', 'curtailment', 'residual_fossil')):
+    """Flag rows that are not dominated in all objectives (all minimized)."""
+    if not rows:
+        return rows
+    values = np.array([[row[o] for o in objectives] for row in rows], dtype=np.float64)
+    # dominated[i] if some j is <= in every objective and < in at least one
+    le = (values[np.newaxis, :, :] <= values[:, np.newaxis, :]).all(axis=2)
+    lt = (values[np.newaxis, :, :] < values[:, np.newaxis, :]).any(axis=2)
+    dominated = (le & lt).any(axis=1)
+    for row, is_dominated in zip(rows, dominated):
+        row['pareto'] = not bool(is_dominated)
+    return rows
+
+
+def run_sweep(generation, demand, grid, defaults=None, dt=24.0, max_workers=None, use_cache=True):
+    """
+    Evaluate the storage simulation over a parameter grid.
+
+    Args:
+        generation: Generation per step (e.g. WS wind_solar_konstant, GWh/day)
+        demand: Demand per step (e.g. WS stromverbr_raumwaerm_korr, GWh/day)
+        grid: {parameter: [values]}; must include 'storage_size'
+        defaults: Values for parameters not in the grid; defaults to the
+                  WSCalculator constants
+        dt: Hours per step (24 for WS daily rows, 1 for hourly profiles)
+        max_workers: Process pool size; 1 (or a single chunk) runs in-process
+        use_cache: Reuse cached grid points for identical inputs
+
+    Returns:
+        List of row dicts (parameters + curtailment, residual_fossil, ...,
+        pareto) sorted by storage_size
+    """
+    generation = np.asarray(generation, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    if defaults is None:
+        defaults = default_parameters()
+    points = expand_grid(grid, defaults)
+    input_key = fingerprint('sweep', generation, demand, float(dt))
+
+    rows = [None] * len(points)
+    todo = []
+    for i, point in enumerate(points):
+        cached = _point_cache.get(fingerprint(input_key, point)) if use_cache else None
+        if cached is not None:
+            rows[i] = dict(cached)
+        else:
+            todo.append(i)
+
+    chunks = [todo[i:i + CHUNK_SIZE] for i in range(0, len(todo), CHUNK_SIZE)]
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    if len(chunks) <= 1 or workers <= 1:
+        results = [_evaluate_chunk(generation, demand, [points[i] for i in chunk], dt) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [
+                pool.submit(_evaluate_chunk, generation, demand, [points[i] for i in chunk], dt)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+
+    for chunk, chunk_rows in zip(chunks, results):
+        for i, row in zip(chunk, chunk_rows):
+            _point_cache.set(fingerprint(input_key, points[i]), dict(row))
+            rows[i] = row
+
+    rows.sort(key=lambda row: (row['storage_size'], row['curtailment'], row['residual_fossil']))
+    return mark_pareto(rows)
+
+
+def ws_profiles(demand_shape=None):
+    """
+    Daily generation/demand profiles (GWh/day) from the current WS table.
+
+    Reads WS rows 1-365 in one query: wind_solar_konstant as generation and
+    stromverbr_raumwaerm_korr as demand. With ``demand_shape`` (per-unit
+    daily shape, e.g. load_profiles.daily_demand_shapes()['ziel']) the WS annual
+    demand is redistributed over the days with that shape instead.
+    """
+    from django.apps import apps
+
+    WSData = apps.get_model('simulator', 'WSData')
+    rows = list(
+        WSData.objects.filter(tag_im_jahr__gte=1, tag_im_jahr__lte=365)
+        .order_by('tag_im_jahr')
+        .values_list('wind_solar_konstant', 'stromverbr_raumwaerm_korr')
+    )
+    values = np.array([[g or 0.0, d or 0.0] for g, d in rows], dtype=np.float64).reshape(-1, 2)
+    generation, demand = values[:, 0], values[:, 1]
+    if demand_shape is not None and len(demand):
+        if len(demand_shape) != len(demand):
+            raise ValueError(f"Demand shape has {len(demand_shape)} days, the WS table {len(demand)}")
+        demand = demand.sum() * np.asarray(demand_shape, dtype=np.float64)
+    return generation, demand
+
+
+def clear_cache():
+    """Drop cached grid points."""
+    _point_cache.clear()
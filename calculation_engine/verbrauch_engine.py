@@ -13,7 +13,7 @@ This provides:
 """
 
 from .formula_evaluator import FormulaEvaluator
-from simulator.formula_service import FormulaService
+from simulator.formula_service import get_formula_service
 
 
 class VerbrauchCalculator:
@@ -24,7 +24,7 @@ class VerbrauchCalculator:
     
     def __init__(self):
         self.evaluator = FormulaEvaluator()
-        self.formula_service = FormulaService(use_cache=True)
+        self.formula_service = get_formula_service()
         self.cache = {}
     
     def set_data_sources(self, verbrauch_data, renewable_data=None, landuse_data=None):
@@ -13,11 +13,7 @@ All formulas are loaded from Formula database model for extensibility.
 """
 
 from typing import Dict, Optional, Tuple
-import sys
-import os
-
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import threading
 
 
 class WSCalculator:
@@ -28,8 +24,8 @@ class WSCalculator:
     
     def __init__(self):
         """Initialize WS calculator with FormulaService"""
-        from simulator.formula_service import FormulaService
-        self.formula_service = FormulaService()
+        from simulator.formula_service import get_formula_service
+        self.formula_service = get_formula_service()
         self.cache = {}
         
         # WS Constants (these could also be in database as constants)
@@ -299,3 +295,18 @@ class WSCalculator:
         result['ladezustand_netto'] = previous_netto + einspeich - ausspeich_rueck - ausspeich_gas - selbstentl
         
         return result
+
+
+# Process-level instance, created on first use (not at import / app startup)
+_ws_calculator = None
+_ws_calculator_lock = threading.Lock()
+
+
+def get_ws_calculator() -> WSCalculator:
+    """Get or create the process-wide WSCalculator instance"""
+    global _ws_calculator
+    if _ws_calculator is None:
+        with _ws_calculator_lock:
+            if _ws_calculator is None:
+                _ws_calculator = WSCalculator()
+    return _ws_calculator
@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'simulator.profiling.ProfilingMiddleware',
+    'simulator.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'simulator.data_context.DataContextMiddleware',
 ]
 
 ROOT_URLCONF = 'landuse_project.urls'
@@ -97,6 +100,64 @@ DATABASES = {
         },
     }
 }
+# SQLite journal mode set on every new connection (simulator.signals.configure_sqlite);
+# WAL lets reads proceed while a recalculation writes. Empty keeps the default.
+SQLITE_JOURNAL_MODE = os.environ.get("DJANGO_SQLITE_JOURNAL_MODE", "wal")
+
+
+# Cache
+# Shared result caches (formulas, bilanz) use the default backend. LocMemCache
+# is per process; point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache or FileBasedCache)
+# to share cached results across workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.environ.get("DJANGO_CACHE_LOCATION", "landuse-simulator"),
+        'TIMEOUT': int(os.environ.get("DJANGO_CACHE_TIMEOUT", "300")),
+    }
+}
+
+
+# Debounced recalculation queue for slider edits (simulator/recalc_queue.py)
+RECALC_DEBOUNCE_SECONDS = float(os.environ.get("DJANGO_RECALC_DEBOUNCE_SECONDS", "0.5"))
+RECALC_MAX_DELAY_SECONDS = float(os.environ.get("DJANGO_RECALC_MAX_DELAY_SECONDS", "5"))
+# The queue lives in process memory, so only one web process may run; wsgi.py
+# and asgi.py lock this file (default: one per project in the temp directory)
+RECALC_QUEUE_LOCK_FILE = os.environ.get("DJANGO_RECALC_QUEUE_LOCK_FILE", "")
+
+
+# Calculation jobs (simulator/jobs.py): "spawn" starts a drain worker process
+# per enqueue, "worker" relies on a running `manage.py run_jobs`, "inline"
+# runs in the request.
+CALCULATION_JOBS_MODE = os.environ.get("DJANGO_CALCULATION_JOBS_MODE", "spawn")
+# Running jobs older than this many seconds are treated as lost and failed.
+CALCULATION_JOB_TIMEOUT = int(os.environ.get("DJANGO_CALCULATION_JOB_TIMEOUT", "3600"))
+
+
+# Request profiling (simulator/profiling.py): query count, SQL time, repeated
+# query shapes and cascade depth as "perf" log records and a Server-Timing
+# header. Off by default; a sample rate below 1 keeps the overhead low in production.
+PROFILING_ENABLED = os.environ.get("DJANGO_PROFILING", "false").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.environ.get("DJANGO_PROFILING_SAMPLE_RATE", "1.0"))
+# Number of repeated query shapes reported per request
+PROFILING_TOP_QUERIES = int(os.environ.get("DJANGO_PROFILING_TOP_QUERIES", "5"))
+
+# Cascade traces stored on job runs (simulator/cascade_trace.py); nodes beyond
+# the limit are counted but not stored.
+CASCADE_TRACE_ENABLED = os.environ.get("DJANGO_CASCADE_TRACE", "true").lower() in ("1", "true", "yes")
+CASCADE_TRACE_MAX_NODES = int(os.environ.get("DJANGO_CASCADE_TRACE_MAX_NODES", "50000"))
+
+# Prometheus metrics (simulator/metrics.py, served at /metrics/). With
+# several worker processes point DJANGO_METRICS_DIR at a directory shared by
+# all of them (on one host); each process writes its own file there, /metrics/
+# sums them and folds the files of exited processes into aggregate.json.
+METRICS_DIR = os.environ.get("DJANGO_METRICS_DIR", "")
+# Seconds between a process' metric file writes
+METRICS_FLUSH_INTERVAL = float(os.environ.get("DJANGO_METRICS_FLUSH_INTERVAL", "1.0"))
+# When set, /metrics/ requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN", "")
 
 
 # Password validation
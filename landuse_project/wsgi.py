@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'landuse_project.settings')
 
 application = get_wsgi_application()
+
+# One web process only: the recalculation queue lives in process memory
+from simulator.recalc_queue import claim_web_process  # noqa: E402
+
+claim_web_process()
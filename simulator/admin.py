@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 from django.utils.html import format_html
+from simulator.data_version import bump_data_version
 from .models import (
     Formula,
     FormulaVariable,
@@ -121,11 +122,13 @@ class FormulaAdmin(admin.ModelAdmin):
     # Admin actions
     def activate_formulas(self, request, queryset):
         updated = queryset.update(is_active=True)
+        bump_data_version("formula_activate")
         self.message_user(request, f'{updated} formula(s) activated.')
     activate_formulas.short_description = "✓ Activate selected formulas"
     
     def deactivate_formulas(self, request, queryset):
         updated = queryset.update(is_active=False)
+        bump_data_version("formula_deactivate")
         self.message_user(request, f'{updated} formula(s) deactivated.')
     deactivate_formulas.short_description = "✗ Deactivate selected formulas"
     
@@ -0,0 +1,164 @@
+"""
+GoalSeek balancing runs (formerly inlined in balance_energy / balance_ws_storage).
+
+Both functions take an optional ``progress`` callable(step, iteration=None,
+residual=None, **extra) so job workers can report where a run is (see
+simulator/jobs.py), and return the JSON-ready summary the views used to send.
+"""
+from calculation_engine.bilanz_engine import calculate_bilanz_data
+from simulator.data_version import bump_data_version
+from simulator.goal_seek import goal_seek
+from simulator.models import LandUse, RenewableData
+from simulator.recalc_service import recalc_all_renewables_full
+from simulator.signals import compute_ws_diagram_reference, recalculate_ws_data
+from simulator.ws_models import WSData
+
+BALANCE_DRIVERS = {"solar": "LU_2.1", "wind": "LU_1.1"}
+
+
+class BalancingError(ValueError):
+    """Balancing cannot start (e.g. the driver LandUse row is missing)."""
+
+
+def _noop_progress(step, iteration=None, residual=None, **extra):
+    pass
+
+
+def balance_energy(driver="solar", tolerance=1.0, progress=None):
+    """
+    GoalSeek outer loop: adjust Solar (LU_2.1) or Wind (LU_1.1) land area until
+    renewable_by_sector.ziel.gesamt matches verbrauch_gesamt.ziel.gesamt (gap ≈ 0).
+    """
+    progress = progress or _noop_progress
+    driver_code = BALANCE_DRIVERS["solar"] if driver == "solar" else BALANCE_DRIVERS["wind"]
+    try:
+        lu = LandUse.objects.get(code=driver_code)
+    except LandUse.DoesNotExist:
+        raise BalancingError(f"LandUse {driver_code} not found. Available: LU_1.1 (wind), LU_2.1 (solar)")
+
+    def set_and_gap(target_ha: float):
+        lu.target_ha = max(0, target_ha)
+        lu.target_locked = True
+        lu.save(skip_cascade=False, force_recalc=False)
+        lu.refresh_from_db()
+        recalc_all_renewables_full()
+        bilanz = calculate_bilanz_data()
+        demand = bilanz.get("verbrauch_gesamt", {}).get("ziel", {}).get("gesamt", 0) or 0
+        renewable = bilanz.get("renewable_by_sector", {}).get("ziel", {}).get("gesamt", 0) or 0
+        gap = demand - renewable  # positive gap => need more renewable
+        return gap, demand, renewable, lu.target_ha
+
+    progress("initial_gap")
+    base_ha = lu.target_ha or 0
+    gap0, demand0, renewable0, ha0 = set_and_gap(base_ha)
+
+    if abs(gap0) <= tolerance:
+        return {"status": "balanced", "final_gap": gap0, "final_ha": ha0, "iterations": 0}
+
+    # Choose second guess direction based on gap sign
+    if gap0 > 0:
+        x1 = ha0 * 1.1 + 100 if ha0 == 0 else ha0 * 1.1
+    else:
+        x1 = max(ha0 * 0.9, 0)
+
+    def gap_func(area):
+        g, _, _, _ = set_and_gap(area)
+        return g
+
+    def report(iteration, x, residual):
+        progress("goal_seek", iteration=iteration, residual=residual, target_ha=x)
+
+    final_ha = goal_seek(
+        gap_func, ha0, x1, target=0.0, tol=tolerance, max_iter=30, progress=report, name="balance_energy"
+    )
+    progress("final_pass")
+    final_gap, final_demand, final_renewable, final_ha = set_and_gap(final_ha)
+
+    return {
+        "status": "balanced" if abs(final_gap) <= tolerance else "partial",
+        "initial_gap": gap0,
+        "final_gap": final_gap,
+        "initial_ha": ha0,
+        "final_ha": final_ha,
+        "demand": final_demand,
+        "renewable": final_renewable,
+        "driver": driver_code,
+    }
+
+
+def balance_ws_storage(progress=None):
+    """
+    GoalSeek Stromverbr. Raumw.korr. (row 366) until LadezustandNetto (row 366) == 0.
+    Uses secant method, matching Excel GoalSeek behavior.
+    """
+    progress = progress or _noop_progress
+    diagram = compute_ws_diagram_reference()
+    reference_stromverbr = diagram.get("stromverbr_raumwaerm_korr_366", 0) or 0
+
+    # First pass: use the diagram reference exactly once (seed state)
+    progress("seed")
+    recalculate_ws_data(stromverbr_override=reference_stromverbr, use_diagram_reference=True)
+
+    def storage_balance(stromverbr_value: float) -> float:
+        # Override with proposed value; do not recompute from diagram inside the loop
+        recalculate_ws_data(stromverbr_override=stromverbr_value, use_diagram_reference=False)
+        try:
+            row_366 = WSData.objects.get(tag_im_jahr=366)
+            return row_366.ladezustand_netto or 0.0
+        except WSData.DoesNotExist:
+            return 0.0
+
+    # Set initial guesses for secant: current value and a small nudge
+    x0 = reference_stromverbr
+    x1 = reference_stromverbr * 1.05 if reference_stromverbr != 0 else 1.0
+
+    def report(iteration, x, residual):
+        progress("goal_seek", iteration=iteration, residual=residual, stromverbr=x)
+
+    final_value = goal_seek(
+        storage_balance, x0, x1, target=0.0, tol=1e-6, max_iter=30, progress=report, name="balance_ws_storage"
+    )
+
+    # One final pass to persist the converged value
+    progress("final_pass")
+    recalculate_ws_data(stromverbr_override=final_value, use_diagram_reference=False)
+    row_366 = WSData.objects.get(tag_im_jahr=366)
+
+    # Derived values for the Annual Electricity diagram after balancing:
+    # Q (Abregelung) comes from WS row 366 Abregelung.Z
+    abregelung_ws = row_366.abregelung_z or 0.0
+    # N ElektrolyseStromspeicher (Überschuss) comes from EINSPEICH / n1 (0.65)
+    n1_eff = 0.65
+    # Requested logic: ElektrolyseStromspeicher (Überschuss) = Einspeich / n1
+    ely_surplus_ws = (row_366.einspeich or 0.0) / n1_eff if n1_eff else 0.0
+    h2_surplus_ws = ely_surplus_ws * n1_eff
+
+    # U (Gasspeicher Strom) stays tied to Einspeich path (Hydrogen created)
+    gas_storage_ws = h2_surplus_ws
+    # T uses Ausspeich. Rückverstr. if present; U remains from Einspeich
+    if row_366.ausspeich_rueckverstr is not None:
+        t_value_ws = row_366.ausspeich_rueckverstr * 0.585
+    else:
+        t_value_ws = gas_storage_ws * 0.585
+
+    # Push balanced WS values back into RenewableData (target only; keep status untouched)
+    RenewableData.objects.filter(code='9.3.4').update(target_value=abregelung_ws)
+    RenewableData.objects.filter(code='9.3.1').update(target_value=ely_surplus_ws)
+    # .update() bypasses post_save, so bump the data version explicitly
+    bump_data_version("balance_ws_storage")
+
+    # Recalculate dependents so downstream targets (e.g., 10.x) reflect updated 9.3.1/9.3.4
+    progress("renewables")
+    recalc_all_renewables_full()
+
+    return {
+        "status": "ok",
+        "reference_stromverbr": reference_stromverbr,
+        "final_stromverbr": final_value,
+        "ladezustand_netto_row_366": row_366.ladezustand_netto,
+        "abregelung_ws": abregelung_ws,
+        "ely_surplus_ws": ely_surplus_ws,
+        "h2_surplus_ws": h2_surplus_ws,
+        "gas_storage_ws": gas_storage_ws,
+        "t_value_ws": t_value_ws,
+    }
@@ -0,0 +1,439 @@
+"""
+Batch edits for LandUse, RenewableData and VerbrauchData with one recalculation.
+
+Saving rows one by one runs the model ``save()`` cascades per row
+(``_recalculate_renewable_dependents``, ``_cascade_to_children``, Verbrauch
+dependents), so N edits cost N cascades. ``apply_batch_edit()`` instead:
+
+1. loads the three tables once and applies all edits in memory
+2. derives LandUse targets in hierarchy order (parents before children, same
+   rules as ``LandUse.save(force_recalc=True)`` / ``_cascade_to_children``)
+3. refreshes the Verbrauch rollups (``recalc_all_verbrauch``)
+4. recalculates only the RenewableData rows whose formulas reference a changed
+   code, transitively, in dependency order with one RenewableCalculator;
+   steps 3 and 4 repeat while renewables change, since Verbrauch formulas may
+   reference renewables (at most MAX_PASSES times)
+5. writes everything with ``bulk_update`` inside one transaction and bumps the
+   data version once
+
+Changes format::
+
+    {
+        "landuse": {"1.1": {"user_percent": 40}},
+        "renewable": {"4.4.1": {"target_value": 1200}},
+        "verbrauch": {"2.4": {"ziel": 55}},
+    }
+
+A bare value instead of a field dict sets the table's DEFAULT_FIELDS entry.
+
+``cascade`` lists LandUse codes whose user_percent edit is a slider edit
+(``update_user_percent(request, code)``): a parent's percent is split over its
+descendants by target_ha, a leaf's percent is summed into its ancestors. The
+cascade is planned on the merged batch, in edit order, so several queued
+slider edits under one parent add up instead of each planning from the
+stored rows.
+
+``changed_codes`` ({table: codes}) marks rows as changed without editing
+them, so their dependents are recalculated too (formula-backed renewables
+among them are re-evaluated themselves); the diff import
+(simulator/bulk_import.py) passes the codes it inserted, deleted or whose
+formula it changed.
+"""
+import logging
+import re
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from simulator.cascade_trace import trace_step
+from simulator.data_version import batch as data_version_batch, bump_data_version
+from simulator.models import LandUse, RenewableData, VerbrauchData
+
+logger = logging.getLogger(__name__)
+
+EDITABLE_FIELDS = {
+    "landuse": ("user_percent", "status_ha", "target_ha"),
+    "renewable": ("status_value", "target_value", "user_input"),
+    "verbrauch": ("status", "ziel", "user_percent"),
+}
+# Verbrauch <-> renewable refresh passes per batch (see apply_batch_edit)
+MAX_PASSES = 5
+DEFAULT_FIELDS = {
+    "landuse": "user_percent",
+    "renewable": "user_input",
+    "verbrauch": "user_percent",
+}
+
+_FORMULA_TOKEN = re.compile(r"LandUse_[A-Za-z0-9\._]+|VerbrauchData_[\d\.]+|\d+(?:\.\d+)*")
+_RENEWABLE_REFERENCE = re.compile(r"\bRenewable_(\d+(?:\.\d+)*)")
+
+
+def _parse_value(value):
+    """'' / None clear the field; everything else must be numeric."""
+    if value == "" or value is None:
+        return None
+    return float(value)
+
+
+def _apply_edits(table, rows, edits, errors):
+    """Apply {code: {field: value}} to rows in memory; returns {code: set(fields)}."""
+    edited = {}
+    for code, fields in (edits or {}).items():
+        row = rows.get(code)
+        if row is None:
+            errors.append(f"Code {code} not found")
+            continue
+        if not isinstance(fields, dict):
+            fields = {DEFAULT_FIELDS[table]: fields}
+        for field, value in fields.items():
+            if field not in EDITABLE_FIELDS[table]:
+                errors.append(f"Field {field} is not editable for {code}")
+                continue
+            try:
+                setattr(row, field, _parse_value(value))
+            except (ValueError, TypeError):
+                errors.append(f"Invalid value for {code}: {value}")
+                continue
+            edited.setdefault(code, set()).add(field)
+    return edited
+
+
+def _plan_percent_cascade(landuse, edits, cascade):
+    """
+    Add the ancestor/descendant user_percent edits of the slider edits in
+    ``cascade`` to ``edits`` ({code: fields}), planned in edit order on the
+    rows plus the edits before them. Returns the extended edits.
+    """
+    by_pk = {row.pk: row for row in landuse.values()}
+    children = {}
+    for row in landuse.values():
+        if row.parent_id is not None and row.parent_id != row.pk:
+            children.setdefault(row.parent_id, []).append(row)
+    planned = {}
+
+    def downwards(row, percent):
+        # Parent drives its children proportionally to their targets
+        planned[row.code] = percent
+        kids = children.get(row.pk, [])
+        total_target = sum(kid.target_ha or 0 for kid in kids)
+        for kid in kids:
+            ratio = (kid.target_ha or 0) / total_target if total_target > 0 else 0
+            downwards(kid, percent * ratio)
+
+    def upwards(row):
+        # Children drive their parent by summing, up to the root
+        seen = {row.pk}
+        parent = by_pk.get(row.parent_id)
+        while parent is not None and parent.pk not in seen:
+            seen.add(parent.pk)
+            planned[parent.code] = sum(
+                planned.get(kid.code, kid.user_percent) or 0 for kid in children.get(parent.pk, [])
+            )
+            parent = by_pk.get(parent.parent_id)
+
+    for code, fields in edits.items():
+        row = landuse.get(code)
+        value = fields.get("user_percent") if isinstance(fields, dict) else fields
+        if row is None or (isinstance(fields, dict) and "user_percent" not in fields):
+            continue
+        try:
+            percent = _parse_value(value)
+        except (ValueError, TypeError):
+            continue  # reported by _apply_edits
+        if code not in cascade or percent is None:
+            planned[code] = percent
+        elif children.get(row.pk):
+            downwards(row, percent)
+        else:
+            planned[code] = percent
+            upwards(row)
+
+    extended = dict(edits)
+    for code, percent in planned.items():
+        fields = extended.get(code, {})
+        fields = dict(fields) if isinstance(fields, dict) else {DEFAULT_FIELDS["landuse"]: fields}
+        fields["user_percent"] = percent
+        extended[code] = fields
+    return extended
+
+
+def _renewables_read_by_verbrauch():
+    """Renewable codes that Verbrauch formulas (V_<code> keys) reference as Renewable_<code>."""
+    from simulator.formula_service import get_formula_service
+
+    return {
+        code
+        for key, formula in get_formula_service().get_formula_map().items()
+        if key.startswith("V_")
+        for code in _RENEWABLE_REFERENCE.findall(formula.get("expression") or "")
+    }
+
+
+def _landuse_depth(row, by_pk, cache):
+    if row.pk in cache:
+        return cache[row.pk]
+    parent = by_pk.get(row.parent_id)
+    depth = 0 if parent is None or parent.pk == row.pk else _landuse_depth(parent, by_pk, cache) + 1
+    cache[row.pk] = depth
+    return depth
+
+
+def _derive_landuse_targets(landuse, edited, lock_targets=True):
+    """
+    Recompute target_ha top-down in one ordered pass.
+
+    Edited rows first apply their status/target formula overrides
+    (``LandUse._apply_formula_overrides``). Edited user_percent -> target_ha =
+    parent target * percent (row is locked, like force_recalc); an edited
+    target_ha locks the row unless lock_targets is False (imported values);
+    unlocked children with a user_percent follow a changed parent. Returns
+    codes with changed target_ha.
+    """
+    by_pk = {row.pk: row for row in landuse.values()}
+    original = {code: row.target_ha for code, row in landuse.items()}
+    depth_cache = {}
+    changed = set()
+    for row in sorted(landuse.values(), key=lambda r: (_landuse_depth(r, by_pk, depth_cache), r.code)):
+        parent = by_pk.get(row.parent_id)
+        fields = edited.get(row.code, ())
+        if fields:
+            # DB-stored status/target formulas first, like save(force_recalc=True);
+            # an edited target_ha is kept
+            edited_target = row.target_ha
+            row._apply_formula_overrides(force_recalc=True)
+            if "target_ha" in fields:
+                row.target_ha = edited_target
+        if "target_ha" in fields:
+            row.target_locked = row.target_locked or lock_targets
+        elif "user_percent" in fields:
+            if row.user_percent is not None and parent is not None and parent.target_ha:
+                row.target_ha = (parent.target_ha * row.user_percent) / 100.0
+                row.target_locked = True
+        elif (
+            parent is not None
+            and parent.code in changed
+            and row.user_percent is not None
+            and parent.target_ha is not None
+            and not row.target_locked
+        ):
+            row.target_ha = (parent.target_ha * row.user_percent) / 100.0
+        if row.target_ha != original[row.code]:
+            changed.add(row.code)
+    return changed
+
+
+def _renewable_order(renewables, changed_tokens, reevaluate=()):
+    """
+    Formula-backed renewables that depend (transitively) on changed_tokens,
+    plus the formula-backed codes in reevaluate, in dependency order.
+    Renewable codes appear bare in formulas; LandUse and Verbrauch codes carry
+    their LandUse_/VerbrauchData_ prefix.
+    """
+    refs = {}
+    for code, row in renewables.items():
+        if row.formula:
+            tokens = set(_FORMULA_TOKEN.findall(row.formula))
+            refs[code] = tokens | {t.replace("LandUse_LU_", "LandUse_") for t in tokens}
+
+    affected = {code for code in reevaluate if code in refs}
+    frontier = set(changed_tokens) | affected
+    while frontier:
+        hits = {code for code, tokens in refs.items() if code not in affected and tokens & frontier}
+        affected |= hits
+        frontier = hits
+
+    # Kahn's algorithm over renewable -> renewable references; cycles go last in code order
+    deps = {code: {t for t in refs[code] if t in affected and t != code} for code in affected}
+    order = []
+    ready = sorted(code for code, d in deps.items() if not d)
+    while ready:
+        code = ready.pop(0)
+        order.append(code)
+        for other, d in deps.items():
+            if code in d:
+                d.discard(code)
+                if not d and other not in order and other not in ready:
+                    ready.append(other)
+        ready.sort()
+    order.extend(sorted(affected - set(order)))
+    return order
+
+
+def _recalculate_renewables(order, renewables, landuse, verbrauch_values):
+    """Evaluate renewables in order with one calculator; returns changed codes."""
+    from calculation_engine.renewable_engine import RenewableCalculator
+
+    calculator = RenewableCalculator()
+    calculator.set_data_sources(
+        {code: {"status_ha": r.status_ha or 0, "target_ha": r.target_ha or 0} for code, r in landuse.items()},
+        verbrauch_values,
+        {code: {"status_value": r.status_value or 0, "target_value": r.target_value or 0} for code, r in renewables.items()},
+    )
+    changed = []
+    for code in order:
+        item = renewables[code]
+        with trace_step(code, "batch_edit", item.status_value, item.target_value) as step:
+            try:
+                calc_status, calc_target = calculator.calculate(code)
+            except Exception as exc:
+                print(f"❌ Error recalculating RenewableData {code} in batch edit: {exc}")
+                continue
+            if code == "9.2.1.3" and calc_target is not None:
+                calc_status = 0  # status side is defined as zero (see recalc_all_renewables_full)
+            step.evaluated(calc_status, calc_target)
+            if calc_status is None or calc_target is None:
+                continue
+            if item.status_value != calc_status or item.target_value != calc_target:
+                item.status_value = calc_status
+                item.target_value = calc_target
+                changed.append(code)
+                step.wrote()  # bulk_update() by the caller
+        calculator.evaluator.status_lookup[f"RenewableData_{code}"] = float(calc_status)
+        calculator.evaluator.target_lookup[f"RenewableData_{code}"] = float(calc_target)
+    return changed
+
+
+def apply_batch_edit(changes, changed_codes=None, lock_targets=True, cascade=()):
+    """
+    Apply edits to LandUse, RenewableData and VerbrauchData with one recalculation.
+
+    Valid edits are applied even when others fail validation (errors are
+    returned, like save_all_user_inputs).
+
+    Args:
+        changes: {table: {code: {field: value}}} (see module docstring)
+        changed_codes: Optional {table: codes} changed outside this call
+            (inserted or deleted rows, changed formulas) whose dependents are
+            recalculated too
+        lock_targets: Whether an edited LandUse target_ha locks the row
+        cascade: LandUse codes whose user_percent edit cascades through the
+            hierarchy like a slider (see module docstring)
+
+    Returns:
+        dict with saved (edited rows per table), recalculated codes per table,
+        errors and duration_ms
+    """
+    from simulator.verbrauch_recalculator import recalc_all_verbrauch
+
+    start = time.perf_counter()
+    errors = []
+    changed_codes = {table: set(codes) for table, codes in (changed_codes or {}).items()}
+    with transaction.atomic(), data_version_batch():
+        landuse = {row.code: row for row in LandUse.objects.all()}
+        renewables = {row.code: row for row in RenewableData.objects.exclude(code__isnull=True)}
+        verbrauch = {row.code: row for row in VerbrauchData.objects.all()}
+        original_status_ha = {code: row.status_ha for code, row in landuse.items()}
+
+        landuse_changes = changes.get("landuse")
+        if cascade and landuse_changes:
+            landuse_changes = _plan_percent_cascade(landuse, landuse_changes, set(cascade))
+        landuse_edits = _apply_edits("landuse", landuse, landuse_changes, errors)
+        renewable_edits = _apply_edits("renewable", renewables, changes.get("renewable"), errors)
+        verbrauch_edits = _apply_edits("verbrauch", verbrauch, changes.get("verbrauch"), errors)
+
+        target_changed = _derive_landuse_targets(landuse, landuse_edits, lock_targets)
+        landuse_changed = target_changed | changed_codes.get("landuse", set()) | {
+            code for code, row in landuse.items() if row.status_ha != original_status_ha[code]
+        }
+        landuse_dirty = [landuse[code] for code in set(landuse_edits) | target_changed]
+        if landuse_dirty:
+            LandUse.objects.bulk_update(
+                landuse_dirty, ["user_percent", "status_ha", "target_ha", "target_locked"]
+            )
+
+        now = timezone.now()
+        verbrauch_changed = set(verbrauch_edits) | changed_codes.get("verbrauch", set())
+        if verbrauch_edits:
+            dirty = [verbrauch[code] for code in verbrauch_edits]
+            for row in dirty:
+                row.updated_at = now
+            VerbrauchData.objects.bulk_update(dirty, ["status", "ziel", "user_percent", "updated_at"])
+
+        # Verbrauch formulas may reference renewables (Renewable_<code>) and
+        # renewable formulas Verbrauch rows, so both refreshes alternate until
+        # neither changes anything (bounded by MAX_PASSES)
+        refresh_verbrauch = bool(verbrauch_changed)
+        changed_tokens = (
+            {f"LandUse_{code}" for code in landuse_changed}
+            | {f"LandUse_{code.replace('LU_', '')}" for code in landuse_changed}
+            | {f"VerbrauchData_{code}" for code in verbrauch_changed}
+            | set(renewable_edits)
+            | changed_codes.get("renewable", set())
+        )
+        reevaluate = changed_codes.get("renewable", set())
+        unwritten = set(renewable_edits)
+        renewable_changed = []
+        read_by_verbrauch = None
+        for _pass in range(MAX_PASSES):
+            if refresh_verbrauch:
+                refreshed = recalc_all_verbrauch(trigger_code="batch_edit", propagate_renewables=False)
+                if _pass and not refreshed:
+                    break
+                verbrauch_changed |= set(refreshed)
+                changed_tokens |= {f"VerbrauchData_{code}" for code in refreshed}
+                verbrauch_values = {
+                    code: {"status": status or 0, "ziel": ziel or 0}
+                    for code, status, ziel in VerbrauchData.objects.values_list("code", "status", "ziel")
+                }
+            elif _pass == 0:
+                verbrauch_values = {
+                    code: {"status": row.status or 0, "ziel": row.ziel or 0} for code, row in verbrauch.items()
+                }
+
+            order = _renewable_order(renewables, changed_tokens, reevaluate)
+            changed = _recalculate_renewables(order, renewables, landuse, verbrauch_values)
+            renewable_changed.extend(code for code in changed if code not in renewable_changed)
+            renewable_dirty = [renewables[code] for code in unwritten | set(changed)]
+            unwritten = set()
+            if renewable_dirty:
+                for row in renewable_dirty:
+                    row.updated_at = now
+                RenewableData.objects.bulk_update(
+                    renewable_dirty, ["status_value", "target_value", "user_input", "updated_at"]
+                )
+            # Next pass: refresh the Verbrauch rollups that read the written renewables
+            if read_by_verbrauch is None and renewable_dirty:
+                read_by_verbrauch = _renewables_read_by_verbrauch()
+            if not read_by_verbrauch or not {row.code for row in renewable_dirty} & read_by_verbrauch:
+                break
+            refresh_verbrauch = True
+            changed_tokens, reevaluate = set(), ()
+        else:
+            logger.warning(
+                "Batch edit did not converge",
+                extra={"eventType": "batch_edit", "context": {"passes": MAX_PASSES}},
+            )
+
+        # bulk_update() sends no post_save signals
+        if landuse_dirty or verbrauch_changed or renewable_edits or renewable_changed:
+            bump_data_version("batch_edit")
+
+    duration_ms = int((time.perf_counter() - start) * 1000)
+    summary = {
+        "saved": {
+            "landuse": len(landuse_edits),
+            "renewable": len(renewable_edits),
+            "verbrauch": len(verbrauch_edits),
+        },
+        "recalculated": {
+            "landuse": sorted(target_changed - set(landuse_edits)),
+            "renewable": sorted(renewable_changed),
+            "verbrauch": sorted(verbrauch_changed - set(verbrauch_edits)),
+        },
+        "errors": errors,
+        "duration_ms": duration_ms,
+    }
+    logger.info(
+        "Batch edit applied",
+        extra={
+            "eventType": "batch_edit",
+            "context": {
+                "saved": summary["saved"],
+                "renewables_recalculated": len(renewable_changed),
+                "errors": len(errors),
+                "duration_ms": duration_ms,
+            },
+        },
+    )
+    return summary
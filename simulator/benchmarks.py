@@ -0,0 +1,270 @@
+"""
+Benchmarks for the calculation hot paths.
+
+Each benchmark runs ``repeat`` timed passes plus one instrumented pass that
+counts queries and records peak Python memory (tracemalloc, which slows code
+down and is therefore kept out of the timed passes). Everything runs inside
+one transaction that is rolled back at the end, so benchmarks can run against
+the real database; with ``scale`` they run on a synthetic dataset
+(simulator/synthetic.py) generated inside that transaction, which includes
+WSData days and the codes bilanz and the WS diagram read.
+
+Results are JSON-ready (``run_benchmarks()``) and two result files can be
+compared with ``compare_results()``; see ``manage.py benchmark``.
+"""
+from datetime import datetime, timezone as dt_timezone
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from simulator.models import LandUse, RenewableData, VerbrauchData
+from simulator.profiling import RequestProfile
+from simulator.ws_models import WSData
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+
+
+class _Rollback(Exception):
+    """Raised to roll back the benchmark transaction."""
+
+
+def _full_recalc():
+    from simulator.recalc_service import run_full_recalc
+
+    run_full_recalc()
+
+
+def _recalc_all_verbrauch():
+    from simulator.verbrauch_recalculator import recalc_all_verbrauch
+
+    recalc_all_verbrauch(trigger_code="benchmark")
+
+
+def _landuse_edit_cascade():
+    # Top-level branch with children: a percent change re-derives the subtree
+    row = (
+        LandUse.objects.filter(parent__isnull=False, children__isnull=False, user_percent__isnull=False)
+        .order_by("code")
+        .first()
+    )
+    if row is None:
+        raise LookupError("No LandUse row with a parent, children and user_percent")
+    row.user_percent = row.user_percent * 1.01
+    row.save(force_recalc=True)
+
+
+def _recalculate_ws_data():
+    from simulator.signals import recalculate_ws_data
+
+    recalculate_ws_data()
+
+
+def _balance_ws_storage():
+    from simulator.balancing import balance_ws_storage
+
+    balance_ws_storage()
+
+
+def _balance_energy():
+    from simulator.balancing import balance_energy
+
+    balance_energy(driver="solar")
+
+
+def _calculate_bilanz_data():
+    from calculation_engine.bilanz_engine import calculate_bilanz_data
+
+    calculate_bilanz_data(use_cache=False)
+
+
+def _formula_evaluator(passes=20):
+    """Evaluate every renewable formula (status and target) ``passes`` times."""
+    from calculation_engine.code_values import load_renewable_calculator
+
+    evaluator = load_renewable_calculator().evaluator
+    formulas = list(
+        RenewableData.objects.exclude(formula__isnull=True).exclude(formula="").values_list("formula", flat=True)
+    )
+    start = time.perf_counter()
+    for _ in range(passes):
+        for formula in formulas:
+            evaluator.evaluate(formula, use_target=False)
+            evaluator.evaluate(formula, use_target=True)
+    elapsed = time.perf_counter() - start
+    evaluations = 2 * passes * len(formulas)
+    return {"evaluations": evaluations, "evaluations_per_s": round(evaluations / elapsed) if elapsed else None}
+
+
+BENCHMARKS = {
+    "run_full_recalc": _full_recalc,
+    "recalc_all_verbrauch": _recalc_all_verbrauch,
+    "landuse_edit_cascade": _landuse_edit_cascade,
+    "recalculate_ws_data": _recalculate_ws_data,
+    "balance_ws_storage": _balance_ws_storage,
+    "balance_energy": _balance_energy,
+    "calculate_bilanz_data": _calculate_bilanz_data,
+    "formula_evaluator": _formula_evaluator,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def measure(func, repeat=3):
+    """
+    Time ``func`` ``repeat`` times, then run it once more counting queries
+    and peak memory. Each pass runs in a savepoint that is rolled back, so
+    every pass starts from the same data.
+
+    Returns:
+        dict with wall_ms (median), min_ms, max_ms, queries, peak_memory_kb,
+        extra (whatever func returned) and error (first line, or None)
+    """
+    timings = []
+    extra = None
+    try:
+        for _ in range(max(repeat, 1)):
+            sid = transaction.savepoint()
+            start = time.perf_counter()
+            try:
+                extra = func()
+            finally:
+                timings.append((time.perf_counter() - start) * 1000)
+                transaction.savepoint_rollback(sid)
+
+        sid = transaction.savepoint()
+        # Counted by an execute_wrapper: the query log CaptureQueriesContext
+        # reads is capped at 9000 entries, which WS balancing exceeds
+        profile = RequestProfile()
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(profile):
+                func()
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            transaction.savepoint_rollback(sid)
+    except Exception as exc:
+        return {"error": str(exc).splitlines()[0] if str(exc) else type(exc).__name__}
+
+    return {
+        "wall_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "queries": profile.queries,
+        "peak_memory_kb": round(peak / 1024, 1),
+        "extra": extra,
+        "error": None,
+    }
+
+
+def run_benchmarks(names=None, repeat=3, scale=None, seed=0):
+    """
+    Run the selected benchmarks (all by default) and return the results.
+
+    Args:
+        names: Benchmark names (keys of BENCHMARKS)
+        repeat: Timed passes per benchmark
+        scale: Generate a synthetic dataset of this scale first (None = use
+            the current database)
+        seed: Seed for the synthetic dataset
+
+    Returns:
+        dict with meta (commit, time, dataset sizes) and results per benchmark
+    """
+    names = list(names or BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    formula_keys = []
+    output = {}
+    try:
+        with transaction.atomic():
+            if scale:
+                from simulator.formula_service import FormulaService
+                from simulator.synthetic import generate_dataset
+
+                generated = generate_dataset(scale=scale, seed=seed)
+                formula_keys = [FormulaService.CACHE_PREFIX + key for key in generated["formula_keys"]]
+                # Formulas cached from the real data must not shadow the synthetic ones
+                cache.delete_many(formula_keys)
+            output["meta"] = {
+                "version": RESULTS_VERSION,
+                "commit": _git_commit(),
+                "created_at": datetime.now(dt_timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "repeat": repeat,
+                "scale": scale,
+                "rows": {
+                    "landuse": LandUse.objects.count(),
+                    "renewable": RenewableData.objects.count(),
+                    "verbrauch": VerbrauchData.objects.count(),
+                    "ws": WSData.objects.count(),
+                },
+            }
+            output["results"] = {}
+            for name in names:
+                result = measure(BENCHMARKS[name], repeat=repeat)
+                output["results"][name] = result
+                context = {key: value for key, value in result.items() if key != "extra"}
+                logger.info("Benchmark finished", extra={"eventType": "benchmark", "context": {"name": name, **context}})
+            raise _Rollback
+    except _Rollback:
+        pass
+    finally:
+        if formula_keys:
+            cache.delete_many(formula_keys)
+    return output
+
+
+def compare_results(baseline, current, threshold=1.25, min_ms=5.0):
+    """
+    Compare two run_benchmarks() outputs.
+
+    A benchmark regresses when its median wall time grew by more than
+    ``threshold`` (and by more than ``min_ms``, to ignore noise on tiny
+    timings) or its query count grew.
+
+    Returns:
+        list of dicts (name, metric, baseline, current, ratio) for regressions
+    """
+    regressions = []
+    for name, result in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base or base.get("error") or result.get("error"):
+            continue
+        if result["wall_ms"] > base["wall_ms"] * threshold and result["wall_ms"] - base["wall_ms"] > min_ms:
+            regressions.append({
+                "name": name,
+                "metric": "wall_ms",
+                "baseline": base["wall_ms"],
+                "current": result["wall_ms"],
+                "ratio": round(result["wall_ms"] / base["wall_ms"], 2) if base["wall_ms"] else None,
+            })
+        if result["queries"] > base["queries"]:
+            regressions.append({
+                "name": name,
+                "metric": "queries",
+                "baseline": base["queries"],
+                "current": result["queries"],
+                "ratio": round(result["queries"] / base["queries"], 2) if base["queries"] else None,
+            })
+    return regressions
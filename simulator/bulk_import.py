@@ -0,0 +1,369 @@
+"""
+Bulk CSV importers for the bundled data files.
+
+Every importer parses its CSV with pandas (all columns as text, numbers
+converted per column with ``pd.to_numeric``, so codes like "2.2" stay
+strings) and writes inside one transaction in one of two modes:
+
+- ``replace``: delete the rows being replaced, ``bulk_create`` the new ones
+  in batches of ``BATCH_SIZE``, resolve LandUse parent foreign keys in a
+  second pass with one ``bulk_update`` and bump the data version once.
+  ``bulk_create``/``bulk_update`` call neither ``save()`` nor the post_save
+  signals, so no model cascade runs; callers run one consistent
+  recalculation afterwards with ``recalculate_after_import()``
+  (``manage.py rebuild_from_csv`` imports all bundled files first and
+  recalculates once).
+- ``sync``: compare incoming rows to the existing ones by code and apply
+  only the inserts, updates and deletes. Columns the CSV does not carry
+  (user_percent, target_locked, user_input, ...) keep their values, and so
+  do computed values of calculated rows whose CSV cells are blank and the
+  target_ha of LandUse rows with a user_percent or a locked target. Changed
+  values, the inserted/deleted codes and RenewableData rows whose formula
+  changed go through ``apply_batch_edit()``, which recalculates their
+  dependents (and re-evaluates the formula rows themselves).
+
+Importers return a summary: ``{"mode", "inserted", "updated", "deleted",
+"unchanged", "recalculated"}`` (``recalculated``: the batch edit's
+recalculated codes per table, sync mode only).
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+import pandas as pd
+
+from simulator.batch_edit import EDITABLE_FIELDS, apply_batch_edit
+from simulator.data_version import bump_data_version
+from simulator.models import GebaeudewaermeData, LandUse, RenewableData, VerbrauchData
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+MODES = ("replace", "sync")
+RECALC_CHOICES = ("full", "job", "none")
+
+LANDUSE_CLEAN_CSV = "Flaechen_Daten_Clean.csv"
+VERBRAUCH_CSV = "KLIK_Hierarchy_BlankForCalculated.csv"
+GEBAEUDEWAERME_CSV = "Gebaudewarme_fixed_values.csv"
+ENDENERGIE_CSV = "endenergieangebot.csv"
+
+
+def bundled_path(filename):
+    """Path of a CSV shipped in the project root."""
+    return os.path.join(settings.BASE_DIR, filename)
+
+
+def to_numbers(series):
+    """Text column -> floats; a decimal comma is accepted, anything unparsable ("-", text) becomes None."""
+    values = pd.to_numeric(series.str.replace(",", ".", regex=False), errors="coerce")
+    return values.astype(object).where(values.notna(), None)
+
+
+def read_csv(path, numeric=()):
+    """Read a CSV with every column as stripped text ("" for empty cells); ``numeric`` columns via to_numbers()."""
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    frame.columns = [column.strip() for column in frame.columns]
+    for column in frame.columns:
+        frame[column] = frame[column].str.strip()
+    for column in numeric:
+        frame[column] = to_numbers(frame[column])
+    return frame
+
+
+def text_or_none(series):
+    """Empty strings -> None."""
+    return series.map(lambda value: value or None)
+
+
+def hierarchy_parent(code):
+    """Parent of a dotted code ("2.2.1" -> "2.2"), None for top-level codes."""
+    return code.rsplit(".", 1)[0] if "." in code else None
+
+
+def _link_parents(parents, removed=()):
+    """
+    Point LandUse.parent at the rows named in {code: parent_code}; returns
+    codes whose parent changed. Rows in ``removed`` (about to be deleted) are
+    no parent, so their children are unlinked instead of cascade-deleted.
+    """
+    rows = {code: (pk, parent_id) for code, pk, parent_id in LandUse.objects.values_list("code", "id", "parent_id")}
+    ids = {code: pk for code, (pk, _parent_id) in rows.items() if code not in removed}
+    linked = []
+    for code, parent in parents.items():
+        pk, current = rows[code]
+        wanted = ids.get(parent)
+        if wanted != current:
+            linked.append(LandUse(id=pk, parent_id=wanted))
+    LandUse.objects.bulk_update(linked, ["parent"], batch_size=BATCH_SIZE)
+    by_pk = {pk: code for code, (pk, _parent_id) in rows.items()}
+    return {by_pk[row.id] for row in linked}
+
+
+def _user_owned_fields(table, row):
+    """CSV columns that do not overwrite ``row``: a LandUse target set by the user stays."""
+    if table == "landuse" and (row.user_percent is not None or row.target_locked):
+        return ("target_ha",)
+    return ()
+
+
+def _sync_rows(model, queryset, objects, fields, table, parents):
+    """Apply the diff between ``queryset`` and ``objects`` (matched by code); see module docstring."""
+    existing = {row.code: row for row in queryset}
+    incoming = {row.code: row for row in objects}
+    inserts = [row for code, row in incoming.items() if code not in existing]
+    deletes = [code for code in existing if code not in incoming]
+    editable = EDITABLE_FIELDS.get(table, ())
+
+    edits = {}
+    dirty = []
+    dirty_fields = set()
+    reevaluate = set()
+    for code, row in incoming.items():
+        current = existing.get(code)
+        if current is None:
+            continue
+        changed = [
+            field for field in fields
+            if getattr(current, field) != getattr(row, field)
+            # Blank cells of calculated rows ("BlankForCalculated") keep the computed value
+            and not (getattr(row, field) is None and getattr(current, "is_calculated", False))
+            and field not in _user_owned_fields(table, current)
+        ]
+        if "formula" in changed:
+            # The row itself is re-evaluated, not only its dependents
+            reevaluate.add(code)
+        for field in changed:
+            if field in editable:
+                # Written by apply_batch_edit() together with the recalculation
+                edits.setdefault(code, {})[field] = getattr(row, field)
+            else:
+                setattr(current, field, getattr(row, field))
+                dirty_fields.add(field)
+        if any(field not in editable for field in changed):
+            dirty.append(current)
+
+    model.objects.bulk_create(inserts, batch_size=BATCH_SIZE)
+    if dirty:
+        model.objects.bulk_update(dirty, sorted(dirty_fields), batch_size=BATCH_SIZE)
+    changed_codes = {row.code for row in inserts} | set(deletes) | reevaluate
+    updated = {row.code for row in dirty} | set(edits)
+    if parents is not None:
+        # Before the deletes: children of a removed row must not be deleted with it
+        relinked = _link_parents(parents, removed=set(deletes))
+        changed_codes |= relinked
+        updated |= relinked - {row.code for row in inserts}
+    queryset.filter(code__in=deletes).delete()
+
+    recalculated = None
+    if table and (edits or changed_codes):
+        result = apply_batch_edit({table: edits}, changed_codes={table: changed_codes}, lock_targets=False)
+        recalculated = result["recalculated"]
+    return {
+        "inserted": len(inserts),
+        "updated": len(updated),
+        "deleted": len(deletes),
+        "unchanged": len(incoming) - len(inserts) - len(updated),
+        "recalculated": recalculated,
+    }
+
+
+def _import_rows(model, queryset, objects, fields, mode, reason, table=None, parents=None):
+    """
+    Write ``objects`` in ``mode`` (see module docstring).
+
+    Args:
+        fields: Columns the CSV provides (compared in sync mode)
+        table: batch_edit table name ("landuse", "verbrauch", "renewable")
+            for the targeted recalculation; None for tables without one
+        parents: LandUse only, {code: parent_code}
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    with transaction.atomic():
+        if mode == "sync":
+            summary = _sync_rows(model, queryset, objects, fields, table, parents)
+        else:
+            deleted = queryset.count()
+            queryset.delete()
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+            if parents is not None:
+                _link_parents(parents)
+            summary = {"inserted": len(objects), "updated": 0, "deleted": deleted, "unchanged": 0, "recalculated": None}
+        if summary["inserted"] or summary["updated"] or summary["deleted"]:
+            bump_data_version(reason)
+    summary["mode"] = mode
+    logger.info("CSV import applied", extra={"eventType": "import", "context": {"reason": reason, **summary}})
+    return summary
+
+
+def describe(summary):
+    """One-line summary for command output."""
+    return (
+        f"{summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['deleted']} deleted, {summary['unchanged']} unchanged ({summary['mode']})"
+    )
+
+
+def import_landuse(path, parent_codes=None, mode="replace"):
+    """
+    Import LandUse rows from ``path``.
+
+    Args:
+        path: CSV in the Flaechen_Daten_Clean.csv layout (Code, Name,
+            Status_ha, Target_ha, Parent_Code, Quelle) or the
+            Flaechen_Daten_Hierarchie.csv layout (German headers)
+        parent_codes: Column holding the parent code; None derives the
+            parent from the dotted code (CSVs without a parent column)
+        mode: "replace" or "sync"
+
+    Returns:
+        dict: Import summary (see module docstring)
+    """
+    frame = read_csv(path)
+    if "Status (ha)" in frame.columns:
+        frame = frame.rename(columns={
+            "Flächenart / Energetische Nutzung": "Name",
+            "Status (ha)": "Status_ha",
+            "Ziel (ha)": "Target_ha",
+        })
+    for column in ("Status_ha", "Target_ha"):
+        frame[column] = to_numbers(frame[column])
+    if parent_codes is None and "Parent_Code" in frame.columns:
+        parent_codes = "Parent_Code"
+    parents = text_or_none(frame[parent_codes]) if parent_codes else frame["Code"].map(hierarchy_parent)
+
+    objects = [
+        LandUse(code=code, name=name, status_ha=status, target_ha=target, quelle=quelle or None)
+        for code, name, status, target, quelle in zip(
+            frame["Code"], frame["Name"], frame["Status_ha"], frame["Target_ha"], frame["Quelle"]
+        )
+    ]
+    return _import_rows(
+        LandUse, LandUse.objects.all(), objects, ("name", "status_ha", "target_ha", "quelle"), mode,
+        "import_landuse", table="landuse", parents=dict(zip(frame["Code"], parents)),
+    )
+
+
+def import_verbrauch(path, mode="replace"):
+    """Import VerbrauchData rows (KLIK_Hierarchy_BlankForCalculated.csv layout)."""
+    frame = read_csv(path, numeric=("Status", "Ziel"))
+    objects = [
+        VerbrauchData(code=code, category=category.replace('"', ""), unit=unit, status=status, ziel=ziel)
+        for code, category, unit, status, ziel in zip(
+            frame["Code"], frame["Category"], frame["Unit"], frame["Status"], frame["Ziel"]
+        )
+    ]
+    return _import_rows(
+        VerbrauchData, VerbrauchData.objects.all(), objects, ("category", "unit", "status", "ziel"), mode,
+        "import_verbrauch", table="verbrauch",
+    )
+
+
+def import_gebaeudewaerme(path, mode="replace"):
+    """Import GebaeudewaermeData rows (Gebaudewarme_fixed_values.csv layout)."""
+    frame = read_csv(path, numeric=("Status", "Ziel"))
+    formulas = text_or_none(frame["Formula"])
+    objects = [
+        GebaeudewaermeData(
+            code=code, category=category, unit=unit, status=status, ziel=ziel,
+            formula=formula, is_calculated=formula is not None,
+        )
+        for code, category, unit, status, ziel, formula in zip(
+            frame["Code"], frame["Category"], frame["Unit"], frame["Status"], frame["Ziel"], formulas
+        )
+    ]
+    return _import_rows(
+        GebaeudewaermeData, GebaeudewaermeData.objects.all(), objects,
+        ("category", "unit", "status", "ziel", "formula", "is_calculated"), mode, "import_gebaeudewaerme",
+    )
+
+
+def import_endenergie(path, mode="replace"):
+    """
+    Import the RenewableData rows of hierarchy 10 (endenergieangebot.csv layout).
+
+    The first column holds "<code> <name> (<unit>)"; rows outside hierarchy
+    10 are skipped.
+    """
+    frame = read_csv(path, numeric=("Status", "Ziel"))
+    frame = frame[frame["Hierarchy"].str.startswith("10.")]
+    parts = frame["Hierarchy"].str.split(" ", n=1, expand=True).reindex(columns=[0, 1]).fillna("")
+    with_unit = frame["Hierarchy"].str.contains("(", regex=False) & frame["Hierarchy"].str.contains(")", regex=False)
+    # "10. Section header" -> code "10"; "10.1 Name (Unit)" keeps its code
+    codes = parts[0].where(with_unit, parts[0].str.rstrip("."))
+    names = parts[1].str.split("(", n=1).str[0].str.strip().where(with_unit, parts[1])
+    units = parts[1].str.extract(r"\(([^)]*)\)", expand=False).fillna("").str.strip().where(with_unit, "")
+    objects = [
+        RenewableData(
+            category="Endenergie", subcategory="Erneuerbare Quellen", code=code, name=name,
+            description=description, unit=unit, status_value=status, target_value=target, formula=formula,
+        )
+        for code, name, description, unit, status, target, formula in zip(
+            codes, names, frame["Hierarchy"], units, frame["Status"], frame["Ziel"],
+            text_or_none(frame["Formula/Note"]),
+        )
+    ]
+    # The section header row is stored as "10"
+    existing = RenewableData.objects.filter(Q(code="10") | Q(code__startswith="10."))
+    return _import_rows(
+        RenewableData, existing, objects,
+        ("name", "description", "unit", "status_value", "target_value", "formula"), mode,
+        "import_endenergie", table="renewable",
+    )
+
+
+def recalculate_after_import(mode="full", triggered_by="import"):
+    """
+    Run the one recalculation after an import.
+
+    Args:
+        mode: "full" runs run_full_recalc() now, "job" enqueues a full_recalc
+            job for the worker, "none" skips it
+
+    Returns:
+        run_full_recalc() summary, the CalculationJob, or None
+    """
+    if mode not in RECALC_CHOICES:
+        raise ValueError(f"Unknown recalculation mode: {mode}")
+    if mode == "none":
+        return None
+    if mode == "job":
+        from simulator.jobs import enqueue_job
+
+        return enqueue_job("full_recalc", triggered_by=triggered_by)
+    from simulator.recalc_service import run_full_recalc
+
+    start = time.perf_counter()
+    summary = run_full_recalc()
+    logger.info(
+        "Import recalculation finished",
+        extra={
+            "eventType": "import",
+            "context": {"triggered_by": triggered_by, "duration_ms": int((time.perf_counter() - start) * 1000)},
+        },
+    )
+    return summary
+
+
+def add_import_arguments(parser):
+    """--mode and --recalc for the import commands."""
+    parser.add_argument(
+        "--mode", choices=MODES, default="replace",
+        help="replace: delete and recreate the rows; sync: apply only inserts/updates/deletes by code "
+        "(keeps user inputs) and recalculate their dependents",
+    )
+    parser.add_argument(
+        "--recalc", choices=RECALC_CHOICES, default="full",
+        help="Recalculation after a replace import: run it now (full), queue a job, or skip it (none)",
+    )
+
+
+def finish_import(options, triggered_by):
+    """Run the --recalc recalculation; sync imports already recalculated their dependents."""
+    if options["mode"] == "sync":
+        return None
+    return recalculate_after_import(options["recalc"], triggered_by=triggered_by)
@@ -0,0 +1,268 @@
+"""
+Cascade tracer: what a recalculation's save cascade actually did.
+
+While a trace is active (``trace_cascade()``), every dependent evaluated by
+the model cascades (``_recalculate_dependents``, ``_recalculate_renewable_dependents``,
+``LandUse._cascade_to_children``) and by the bulk recalculations
+(``recalc_all_verbrauch``, ``recalc_all_renewables_full``, the batch edit's
+renewable pass) becomes a node:
+
+    [code, trigger, old_status, old_target, new_status, new_target, eval_us, wrote, children]
+
+``trigger`` is the code whose change caused the evaluation (or the step name
+for bulk passes), ``eval_us`` the evaluation time in microseconds, ``wrote``
+1 when the row was saved, and ``children`` the nodes evaluated by the cascade
+that write started. Jobs trace their handler and store the tree on their
+CalculationRun; recalculations outside jobs (recalc queue batches, the
+synchronous save views) use ``persisted_trace()``, which stores it on a
+CalculationRun without a snapshot. The tree is stored as zlib-compressed
+JSON (``cascade_trace``) together with a per-code summary
+(``cascade_codes``: ``{code: [evaluations, writes, eval_ms]}``)
+so runs can be filtered by code in the database
+(``CalculationRun.objects.filter(cascade_codes__has_key=code)``) and hot or
+redundantly recomputed codes found without decoding the tree; see also
+``manage.py cascade_trace``.
+
+Disabled (``settings.CASCADE_TRACE_ENABLED`` False) or outside a trace,
+``trace_step()`` costs one contextvar lookup and returns a shared no-op step.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import time
+import zlib
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CODE, TRIGGER, OLD_STATUS, OLD_TARGET, NEW_STATUS, NEW_TARGET, EVAL_US, WROTE, CHILDREN = range(9)
+
+_active = ContextVar("simulator_cascade_trace", default=None)
+
+
+class _NullStep:
+    """Step returned when no trace is active; every method is a no-op."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def evaluated(self, new_status, new_target):
+        pass
+
+    def wrote(self):
+        pass
+
+
+_NULL_STEP = _NullStep()
+
+
+class _Step:
+    """One traced evaluation; nodes recorded inside the block become its children."""
+
+    __slots__ = ("trace", "node", "start")
+
+    def __init__(self, trace, node):
+        self.trace = trace
+        self.node = node
+
+    def __enter__(self):
+        self.trace.push(self.node)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.node[EVAL_US] is None:
+            self.node[EVAL_US] = int((time.perf_counter() - self.start) * 1e6)
+        self.trace.pop()
+        return False
+
+    def evaluated(self, new_status, new_target):
+        """Record the computed values; the evaluation time ends here."""
+        self.node[NEW_STATUS] = new_status
+        self.node[NEW_TARGET] = new_target
+        self.node[EVAL_US] = int((time.perf_counter() - self.start) * 1e6)
+
+    def wrote(self):
+        """Mark that the evaluated row was saved."""
+        self.node[WROTE] = 1
+
+
+class CascadeTrace:
+    """Tree of traced evaluations for one recalculation."""
+
+    def __init__(self, trigger, max_nodes=None):
+        self.trigger = trigger
+        self.roots = []
+        self.nodes = 0
+        self.dropped = 0
+        self.max_nodes = max_nodes if max_nodes is not None else getattr(settings, "CASCADE_TRACE_MAX_NODES", 50000)
+        self._stack = []
+        self.started = time.perf_counter()
+        self.duration_ms = None
+
+    def step(self, code, trigger, old_status, old_target):
+        if self.nodes >= self.max_nodes:
+            self.dropped += 1
+            return _NULL_STEP
+        self.nodes += 1
+        return _Step(self, [code, trigger, old_status, old_target, None, None, None, 0, []])
+
+    def push(self, node):
+        (self._stack[-1][CHILDREN] if self._stack else self.roots).append(node)
+        self._stack.append(node)
+
+    def pop(self):
+        self._stack.pop()
+
+    def as_dict(self):
+        return {
+            "trigger": self.trigger,
+            "duration_ms": self.duration_ms,
+            "nodes": self.nodes,
+            "dropped": self.dropped,
+            "roots": self.roots,
+        }
+
+
+def tracing_enabled():
+    return getattr(settings, "CASCADE_TRACE_ENABLED", True)
+
+
+@contextmanager
+def trace_cascade(trigger):
+    """
+    Trace the cascades run inside the block; yields the CascadeTrace.
+
+    Yields the enclosing trace when one is already active, and None when
+    tracing is disabled.
+    """
+    trace = _active.get()
+    if trace is not None or not tracing_enabled():
+        yield trace
+        return
+    trace = CascadeTrace(trigger)
+    token = _active.set(trace)
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+        trace.duration_ms = int((time.perf_counter() - trace.started) * 1000)
+        logger.info(
+            "Cascade traced",
+            extra={
+                "eventType": "cascade",
+                "context": {
+                    "trigger": trigger,
+                    "nodes": trace.nodes,
+                    "dropped": trace.dropped,
+                    "depth": tree_depth(trace.roots),
+                    "duration_ms": trace.duration_ms,
+                },
+            },
+        )
+
+
+@contextmanager
+def persisted_trace(trigger, triggered_by=None):
+    """
+    trace_cascade() for recalculations outside jobs (recalc queue batches,
+    synchronous saves in views): the finished trace is stored with
+    store_trace(). Inside an active trace (e.g. a job) the enclosing trace
+    records the cascade and nothing is stored here.
+    """
+    outermost = _active.get() is None
+    with trace_cascade(trigger) as trace:
+        yield trace
+    if outermost and trace is not None:
+        store_trace(trace, triggered_by)
+
+
+def store_trace(trace, triggered_by=None):
+    """
+    Store a finished trace on a CalculationRun without a snapshot (read views
+    never serve it); traces without nodes are not stored. Returns the run.
+    """
+    from simulator.models import CalculationRun
+
+    if not trace.nodes:
+        return None
+    blob, codes = encode_trace(trace)
+    run = CalculationRun(
+        duration_ms=trace.duration_ms or 0,
+        summary={"trace": trace.trigger},
+        triggered_by=triggered_by or trace.trigger,
+        cascade_trace=blob,
+        cascade_codes=codes,
+    )
+    # bulk_create(): no post_save, so no data version bump (no page changes)
+    CalculationRun.objects.bulk_create([run])
+    return run
+
+
+def trace_step(code, trigger, old_status=None, old_target=None):
+    """Context manager for one dependent evaluation (no-op without an active trace)."""
+    trace = _active.get()
+    if trace is None:
+        return _NULL_STEP
+    return trace.step(code, trigger, old_status, old_target)
+
+
+def walk(nodes, path=()):
+    """Yield (path, node) for every node; path holds the ancestor codes."""
+    for node in nodes:
+        yield path, node
+        if node[CHILDREN]:
+            yield from walk(node[CHILDREN], path + (node[CODE],))
+
+
+def tree_depth(nodes):
+    return max((len(path) + 1 for path, _node in walk(nodes)), default=0)
+
+
+def code_stats(nodes):
+    """{code: [evaluations, writes, eval_ms]} over the tree."""
+    stats = {}
+    for _path, node in walk(nodes):
+        entry = stats.setdefault(node[CODE], [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += node[WROTE]
+        entry[2] += (node[EVAL_US] or 0) / 1000
+    for entry in stats.values():
+        entry[2] = round(entry[2], 3)
+    return stats
+
+
+def find_nodes(nodes, code):
+    """Nodes evaluated for ``code`` as dicts (with the path that led there)."""
+    return [
+        {
+            "path": list(path),
+            "code": node[CODE],
+            "trigger": node[TRIGGER],
+            "old": [node[OLD_STATUS], node[OLD_TARGET]],
+            "new": [node[NEW_STATUS], node[NEW_TARGET]],
+            "eval_us": node[EVAL_US],
+            "wrote": bool(node[WROTE]),
+            "descendants": sum(1 for _ in walk(node[CHILDREN])),
+        }
+        for path, node in walk(nodes)
+        if node[CODE] == code
+    ]
+
+
+def encode_trace(trace):
+    """CascadeTrace -> (compressed bytes, per-code summary) for CalculationRun."""
+    raw = json.dumps(trace.as_dict(), separators=(",", ":"), default=float).encode("utf-8")
+    return zlib.compress(raw, 6), code_stats(trace.roots)
+
+
+def decode_trace(blob):
+    """Compressed bytes -> trace dict (see CascadeTrace.as_dict)."""
+    return json.loads(zlib.decompress(bytes(blob)).decode("utf-8"))
@@ -0,0 +1,140 @@
+"""
+Request-scoped data context shared by all model helpers in a view.
+
+``VerbrauchData.calculate_value()`` / ``calculate_ziel_value()`` and
+``RenewableData.get_calculated_values()`` load the LandUse, VerbrauchData and
+RenewableData tables on every call, so a page evaluating every row loaded
+them once per row. ``DataContextMiddleware`` activates a ``DataContext`` for
+each request (a contextvar, local to the request's thread); while one is
+active those helpers take their data sources and calculators from it:
+
+- each table is loaded once per request, on first use
+- one VerbrauchCalculator and one RenewableCalculator per request
+- computed (status, target) values are memoized per code
+
+Every data version bump (``simulator.data_version.bump_data_version``, i.e.
+any save/update of a calculation input) clears the active context, so helpers
+called after a write in the same request read the new values. Outside a
+request (jobs, commands, the recalc queue thread) no context is active and the
+helpers load from the database as before; ``data_context()`` activates one
+explicitly.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+
+_current = ContextVar("simulator_data_context", default=None)
+
+
+class DataContext:
+    """Lazily loaded data sources and calculators for one request."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget loaded tables and calculators (called on every data version bump)."""
+        self._tables = {}
+        self._calculators = {}
+        self._values = {}
+
+    def _table(self, name, loader):
+        if name not in self._tables:
+            self._tables[name] = loader()
+        return self._tables[name]
+
+    def landuse_sources(self):
+        """{code: {'status_ha': x, 'target_ha': y}} with None as 0."""
+        LandUse = apps.get_model('simulator', 'LandUse')
+        return self._table('landuse', lambda: {
+            code: {'status_ha': status or 0, 'target_ha': target or 0}
+            for code, status, target in LandUse.objects.values_list('code', 'status_ha', 'target_ha')
+        })
+
+    def verbrauch_sources(self):
+        """{code: {'status': x, 'ziel': y}} with None as 0."""
+        VerbrauchData = apps.get_model('simulator', 'VerbrauchData')
+        return self._table('verbrauch', lambda: {
+            code: {'status': status or 0, 'ziel': ziel or 0}
+            for code, status, ziel in VerbrauchData.objects.values_list('code', 'status', 'ziel')
+        })
+
+    def renewable_sources(self):
+        """{code: {'status_value': x, 'target_value': y}} with None as 0."""
+        RenewableData = apps.get_model('simulator', 'RenewableData')
+        return self._table('renewable', lambda: {
+            code: {'status_value': status or 0, 'target_value': target or 0}
+            for code, status, target in RenewableData.objects.values_list('code', 'status_value', 'target_value')
+        })
+
+    def verbrauch_calculator(self):
+        """VerbrauchCalculator over this request's data (results cached per code)."""
+        if 'verbrauch' not in self._calculators:
+            from calculation_engine.verbrauch_engine import VerbrauchCalculator
+
+            calculator = VerbrauchCalculator()
+            calculator.set_data_sources(self.verbrauch_sources(), self.renewable_sources(), self.landuse_sources())
+            self._calculators['verbrauch'] = calculator
+        return self._calculators['verbrauch']
+
+    def renewable_calculator(self):
+        """RenewableCalculator over this request's data (results cached per code)."""
+        if 'renewable' not in self._calculators:
+            from calculation_engine.renewable_engine import RenewableCalculator
+
+            calculator = RenewableCalculator()
+            calculator.set_data_sources(self.landuse_sources(), self.verbrauch_sources(), self.renewable_sources())
+            self._calculators['renewable'] = calculator
+        return self._calculators['renewable']
+
+    def _memoized(self, key, compute):
+        if key not in self._values:
+            self._values[key] = compute()
+        return self._values[key]
+
+    def verbrauch_values(self, code):
+        """(status, ziel) of a Verbrauch code from the request's calculator, memoized."""
+        return self._memoized(('verbrauch', code), lambda: self.verbrauch_calculator().calculate(code))
+
+    def renewable_values(self, code):
+        """(status, target) of a renewable code from the request's calculator, memoized."""
+        return self._memoized(('renewable', code), lambda: self.renewable_calculator().calculate(code))
+
+
+def current_data_context():
+    """The active DataContext, or None outside a request/``data_context()`` block."""
+    return _current.get()
+
+
+@contextmanager
+def data_context():
+    """Activate a DataContext for the block (reuses the active one when nested)."""
+    context = _current.get()
+    if context is not None:
+        yield context
+        return
+    context = DataContext()
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def invalidate_data_context():
+    """Clear the active context after a write (no-op when none is active)."""
+    context = _current.get()
+    if context is not None:
+        context.clear()
+
+
+class DataContextMiddleware:
+    """Runs every request inside its own DataContext."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with data_context():
+            return self.get_response(request)
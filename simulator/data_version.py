@@ -0,0 +1,135 @@
+"""
+Monotonic data version for all calculation inputs.
+
+Every change to LandUse, RenewableData, VerbrauchData, GebaeudewaermeData,
+WSData, Formula/FormulaVariable or a new CalculationRun bumps one counter
+(``DataVersion`` row). ``bump_data_version()`` is the only writer:
+- post_save/post_delete signals (see simulator/signals.py) call it
+- code paths that bypass signals (``QuerySet.update()``, bulk operations)
+  call it explicitly
+
+Bumps are coalesced: inside a transaction one bump runs on commit (nothing on
+rollback), and ``batch()`` collapses loops of saves outside a transaction into
+one bump at the end.
+
+Read views use ``etag_for_request`` / ``last_modified_for_request`` with
+Django's ``condition`` decorator, so an unchanged version answers 304 before
+any calculation runs.
+"""
+from contextlib import contextmanager
+import hashlib
+import logging
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from simulator.data_context import invalidate_data_context
+from simulator.models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def get_data_version():
+    """Return (version, updated_at); creates the row on first use."""
+    row = DataVersion.objects.filter(pk=1).values_list("version", "updated_at").first()
+    if row is None:
+        obj, _ = DataVersion.objects.get_or_create(pk=1, defaults={"version": 0, "updated_at": timezone.now()})
+        return obj.version, obj.updated_at
+    return row
+
+
+def lock_data_version():
+    """
+    Serialize writers for the rest of the current transaction and return the
+    current version. A no-op UPDATE on the DataVersion row takes the SQLite
+    write lock (a row lock on other databases), so check-then-insert
+    sequences such as single-flight job enqueueing cannot interleave.
+    """
+    get_data_version()
+    DataVersion.objects.filter(pk=1).update(version=F("version"))
+    return DataVersion.objects.filter(pk=1).values_list("version", flat=True).get()
+
+
+def _apply_bump():
+    now = timezone.now()
+    updated = DataVersion.objects.filter(pk=1).update(version=F("version") + 1, updated_at=now)
+    if not updated:
+        obj, created = DataVersion.objects.get_or_create(pk=1, defaults={"version": 1, "updated_at": now})
+        if not created:
+            DataVersion.objects.filter(pk=1).update(version=F("version") + 1, updated_at=now)
+
+
+def _bump_pending_on_commit():
+    return any(
+        getattr(entry[1], "__name__", None) == "_apply_bump" for entry in getattr(connection, "run_on_commit", [])
+    )
+
+
+def bump_data_version(reason=""):
+    """
+    Increase the data version (the single place that writes DataVersion).
+
+    Inside an atomic block the bump is deferred to commit and registered only
+    once per transaction; inside ``batch()`` it is deferred to the end of the
+    batch. The request's data context (simulator/data_context.py) is cleared
+    right away, so later reads in the same request see the change.
+    """
+    invalidate_data_context()
+    if getattr(_state, "batch_depth", 0):
+        _state.batch_dirty = True
+        return
+    if connection.in_atomic_block:
+        if not _bump_pending_on_commit():
+            transaction.on_commit(_apply_bump)
+        return
+    _apply_bump()
+    logger.debug("Data version bumped", extra={"eventType": "data_version", "context": {"reason": reason}})
+
+
+@contextmanager
+def batch():
+    """Collapse all bumps inside the block into a single bump at the end."""
+    _state.batch_depth = getattr(_state, "batch_depth", 0) + 1
+    try:
+        yield
+    finally:
+        _state.batch_depth -= 1
+        if _state.batch_depth == 0 and getattr(_state, "batch_dirty", False):
+            _state.batch_dirty = False
+            bump_data_version("batch")
+
+
+def _request_version(request):
+    """Read the version once per request (shared by the ETag and Last-Modified callbacks)."""
+    cached = getattr(request, "_data_version", None)
+    if cached is None:
+        cached = get_data_version()
+        request._data_version = cached
+    return cached
+
+
+def etag_for_request(request, *args, **kwargs):
+    """
+    ETag = data version + viewer + query string (pages differ per user and ?run_id).
+
+    The viewer includes the session key and CSRF cookie: pages embed the CSRF
+    token, so a copy cached before a logout/login must not revalidate.
+    """
+    version, _updated_at = _request_version(request)
+    user = getattr(request, "user", None)
+    user_key = user.pk if user is not None and user.is_authenticated else "anon"
+    session = getattr(request, "session", None)
+    session_key = session.session_key if session is not None else None
+    csrf_cookie = request.META.get("CSRF_COOKIE", "")
+    variant = hashlib.sha1(
+        f"{user_key}|{session_key}|{csrf_cookie}|{request.get_full_path()}".encode()
+    ).hexdigest()[:12]
+    return f"v{version}-{variant}"
+
+
+def last_modified_for_request(request, *args, **kwargs):
+    return _request_version(request)[1]
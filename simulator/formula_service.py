@@ -21,7 +21,9 @@ from django.db import models
 from django.core.cache import cache
 from django.utils import timezone
 import logging
+import threading
 
+from simulator.metrics import count_cache
 from simulator.models import (
     Formula,
     FormulaVariable,
@@ -157,6 +159,7 @@ class FormulaService:
         # Try cache first
         if self.use_cache:
             cached = cache.get(f'{self.CACHE_PREFIX}{key}')
+            count_cache("formula", cached is not None)
             if cached is not None:
                 return cached
         
@@ -211,10 +214,6 @@ class FormulaService:
     def _load_python_formulas(self):
         """Load all formulas from Python files into cache"""
         try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            
             from renewable_energy_complete_formulas import (
                 SECTION_1_FORMULAS,
                 SECTION_2_FORMULAS,
@@ -309,6 +308,17 @@ class FormulaService:
         
         return formulas
     
+    def get_formula_map(self) -> Dict[str, Dict]:
+        """
+        All formula definitions by key, with get_formula()'s precedence
+        (active database formulas over the Python files), from one query.
+        """
+        if not self._python_formulas_loaded:
+            self._load_python_formulas()
+        formulas = dict(self._python_formulas_cache)
+        formulas.update((formula['key'], formula) for formula in self.get_all_formulas())
+        return formulas
+    
     def save_formula(self, key: str, expression: str, description: str = '', 
                     category: str = 'renewable', is_fixed: bool = False) -> bool:
         """
@@ -367,12 +377,15 @@ class FormulaService:
         logger.info("Formula cache cleared")
 
 
-# Global instance for easy access
+# Global instance for easy access (shared by the calculators, created on first use)
 _formula_service = None
+_formula_service_lock = threading.Lock()
 
 def get_formula_service() -> FormulaService:
     """Get or create global FormulaService instance"""
     global _formula_service
     if _formula_service is None:
-        _formula_service = FormulaService()
+        with _formula_service_lock:
+            if _formula_service is None:
+                _formula_service = FormulaService()
     return _formula_service
@@ -1,12 +1,34 @@
-def goal_seek(func, x0, x1, target=0.0, tol=1e-6, max_iter=30):
+from simulator.metrics import GOAL_SEEK_ITERATIONS, GOAL_SEEK_RESIDUAL
+
+
+def goal_seek(func, x0, x1, target=0.0, tol=1e-6, max_iter=30, progress=None, name="goal_seek"):
     """
     Secant-method GoalSeek.
     func: callable that returns the measured value for the current guess.
     x0, x1: starting guesses (x1 should differ from x0 to set direction).
     target: desired function value.
+    progress: optional callable(iteration, x, residual) called after every evaluation.
+    name: label for the iteration/residual metrics (simulator/metrics.py).
     Returns the best x found (last iterate) even if tolerance not reached.
     """
+    last = {}
+
+    def report(iteration, x, residual):
+        last["iteration"], last["residual"] = iteration, residual
+        if progress is not None:
+            progress(iteration, x, residual)
+
+    try:
+        return _secant(func, x0, x1, target, tol, max_iter, report)
+    finally:
+        if last:
+            GOAL_SEEK_ITERATIONS.observe(last["iteration"] + 1, name=name)
+            GOAL_SEEK_RESIDUAL.observe(abs(last["residual"]), name=name)
+
+
+def _secant(func, x0, x1, target, tol, max_iter, report):
     f0 = func(x0) - target
+    report(0, x0, f0)
     if abs(f0) < tol:
         return x0
 
@@ -15,8 +37,9 @@ def goal_seek(func, x0, x1, target=0.0, tol=1e-6, max_iter=30):
         x1 = x0 * 1.05 if x0 != 0 else 1.0
 
     f1 = func(x1) - target
+    report(1, x1, f1)
 
-    for _ in range(max_iter):
+    for iteration in range(2, max_iter + 2):
         if abs(f1) < tol:
             return x1
 
@@ -28,5 +51,6 @@ def goal_seek(func, x0, x1, target=0.0, tol=1e-6, max_iter=30):
 
         x0, f0 = x1, f1
         x1, f1 = x2, func(x2) - target
+        report(iteration, x1, f1)
 
     return x1
@@ -0,0 +1,275 @@
+"""
+Database-backed job runner for long computations (no external broker).
+
+Views enqueue a CalculationJob and return its id; a worker process claims
+queued jobs, runs them and writes progress (step, iteration, residual) to the
+job row, which ``api/jobs/<id>/`` serves for polling. Every finished job
+materializes a CalculationRun snapshot, so pages show the balanced state,
+and stores the trace of the cascades it ran (simulator/cascade_trace.py).
+
+Execution mode (``settings.CALCULATION_JOBS_MODE``):
+- "spawn" (default): enqueue starts ``manage.py run_jobs --drain`` as a
+  detached child process that exits when the queue is empty
+- "worker": jobs are only picked up by a long-running ``manage.py run_jobs``
+- "inline": run inside the request (tests, debugging)
+
+Single flight: a request for the same kind and params on the same data
+version joins the queued or running job instead of creating another one
+(``enqueue_job`` returns it with ``joined=True``); a request made after the
+data changed queues a new job behind it. At most one job runs at a time:
+claiming is an atomic ``UPDATE ... WHERE status='queued' AND NOT EXISTS
+(running job)``, so several workers can drain the same queue without two
+heavy writers racing for the SQLite lock. A job's own writes are collapsed
+into one data version bump at the end (``data_version.batch()``), so the
+version it was requested against stays valid while it runs.
+"""
+from datetime import timedelta
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from simulator.cascade_trace import trace_cascade
+from simulator.data_version import batch as data_version_batch, lock_data_version
+from simulator.models import CalculationJob
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress writes (the final state is always written)
+PROGRESS_INTERVAL = 0.5
+
+ACTIVE_STATUSES = (CalculationJob.STATUS_QUEUED, CalculationJob.STATUS_RUNNING)
+
+
+def _full_recalc(params, progress):
+    from simulator.recalc_service import run_full_recalc
+
+    progress("full_recalc")
+    return run_full_recalc()
+
+
+def _balance_energy(params, progress):
+    from simulator.balancing import balance_energy
+
+    summary = balance_energy(
+        driver=params.get("driver", "solar"),
+        tolerance=float(params.get("tolerance", 1.0)),
+        progress=progress,
+    )
+    return {"status": "ok", "summary": summary}
+
+
+def _balance_ws_storage(params, progress):
+    from simulator.balancing import balance_ws_storage
+
+    return balance_ws_storage(progress=progress)
+
+
+JOB_HANDLERS = {
+    "full_recalc": _full_recalc,
+    "balance_energy": _balance_energy,
+    "balance_ws_storage": _balance_ws_storage,
+}
+
+
+def enqueue_job(kind, params=None, triggered_by=None):
+    """
+    Create a queued job and make sure something will run it.
+
+    Joins (returns) an active job with the same kind and params requested
+    against the current data version; the returned job has ``joined=True``.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params = params or {}
+    with transaction.atomic():
+        version = lock_data_version()
+        existing = next(
+            (
+                job
+                for job in CalculationJob.objects.filter(
+                    kind=kind, data_version=version, status__in=ACTIVE_STATUSES
+                ).order_by("created_at", "pk")
+                if job.params == params
+            ),
+            None,
+        )
+        if existing is None:
+            job = CalculationJob.objects.create(
+                kind=kind, params=params, triggered_by=triggered_by, data_version=version
+            )
+    if existing is not None:
+        existing.joined = True
+        logger.info(
+            "Job joined",
+            extra={
+                "eventType": "job",
+                "context": {"job_id": existing.pk, "kind": kind, "data_version": version},
+            },
+        )
+        return existing
+
+    job.joined = False
+    logger.info(
+        "Job queued",
+        extra={"eventType": "job", "context": {"job_id": job.pk, "kind": kind, "data_version": version}},
+    )
+    mode = getattr(settings, "CALCULATION_JOBS_MODE", "spawn")
+    if mode == "inline":
+        run_job(job)
+        job.refresh_from_db()
+    elif mode == "spawn":
+        _spawn_worker()
+    return job
+
+
+def _spawn_worker():
+    manage_py = os.path.join(settings.BASE_DIR, "manage.py")
+    subprocess.Popen(
+        [sys.executable, manage_py, "run_jobs", "--drain"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _expire_stale_jobs():
+    """Fail running jobs whose worker vanished, so they stop blocking the queue."""
+    timeout = getattr(settings, "CALCULATION_JOB_TIMEOUT", 3600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    expired = CalculationJob.objects.filter(
+        status=CalculationJob.STATUS_RUNNING, started_at__lt=cutoff
+    ).update(
+        status=CalculationJob.STATUS_FAILED,
+        error=f"Worker did not finish within {timeout}s",
+        finished_at=timezone.now(),
+    )
+    if expired:
+        logger.warning("Stale jobs expired", extra={"eventType": "job", "context": {"count": expired}})
+
+
+def claim_next_job(worker_name=None):
+    """
+    Atomically move the oldest queued job to running; returns it or None.
+
+    Nothing is claimed while another job is running (one heavy writer at a time).
+    """
+    worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+    _expire_stale_jobs()
+    running = CalculationJob.objects.filter(status=CalculationJob.STATUS_RUNNING).exclude(pk=OuterRef("pk"))
+    for job_id in CalculationJob.objects.filter(status=CalculationJob.STATUS_QUEUED).order_by(
+        "created_at", "pk"
+    ).values_list("pk", flat=True)[:5]:
+        claimed = CalculationJob.objects.filter(
+            ~Exists(running), pk=job_id, status=CalculationJob.STATUS_QUEUED
+        ).update(status=CalculationJob.STATUS_RUNNING, started_at=timezone.now(), worker=worker_name)
+        if claimed:
+            return CalculationJob.objects.get(pk=job_id)
+    return None
+
+
+def _progress_writer(job):
+    state = {"last": 0.0}
+
+    def progress(step, iteration=None, residual=None, force=False, **extra):
+        payload = {"step": step, "iteration": iteration, "residual": residual, **extra}
+        now = time.monotonic()
+        if not force and now - state["last"] < PROGRESS_INTERVAL and step == job.progress.get("step"):
+            job.progress = payload
+            return
+        state["last"] = now
+        job.progress = payload
+        CalculationJob.objects.filter(pk=job.pk).update(progress=payload)
+
+    return progress
+
+
+def run_job(job):
+    """Run a claimed (or inline) job and store its result/run or error."""
+    from simulator.snapshots import create_run_with_snapshot
+
+    if job.status == CalculationJob.STATUS_QUEUED:
+        CalculationJob.objects.filter(pk=job.pk).update(
+            status=CalculationJob.STATUS_RUNNING, started_at=timezone.now(), worker="inline"
+        )
+    progress = _progress_writer(job)
+    start = time.perf_counter()
+    try:
+        # One bump when the job is done instead of one per save inside it
+        with data_version_batch():
+            with trace_cascade(job.kind) as trace:
+                result = JOB_HANDLERS[job.kind](job.params, progress)
+            summary = result if job.kind == "full_recalc" else {
+                "duration_ms": int((time.perf_counter() - start) * 1000),
+                "job": job.kind,
+                "result": result,
+            }
+            run = create_run_with_snapshot(summary, triggered_by=job.triggered_by, trace=trace)
+        if job.kind == "full_recalc":
+            result = {
+                "status": "ok",
+                "run_id": run.id,
+                "duration_ms": run.duration_ms,
+                "summary": summary,
+                "created_at": run.created_at.isoformat(),
+            }
+        progress("done", force=True)
+        CalculationJob.objects.filter(pk=job.pk).update(
+            status=CalculationJob.STATUS_DONE, result=result, run=run, finished_at=timezone.now()
+        )
+        logger.info(
+            "Job finished",
+            extra={"eventType": "job", "context": {"job_id": job.pk, "kind": job.kind, "run_id": run.id}},
+        )
+    except Exception as exc:
+        progress("failed", force=True)
+        CalculationJob.objects.filter(pk=job.pk).update(
+            status=CalculationJob.STATUS_FAILED,
+            error=f"{exc}\n{traceback.format_exc()}",
+            finished_at=timezone.now(),
+        )
+        logger.error(
+            "Job failed",
+            extra={"eventType": "job", "context": {"job_id": job.pk, "kind": job.kind, "error": str(exc)}},
+        )
+
+
+def work(drain=False, poll_interval=1.0, worker_name=None):
+    """Worker loop: claim and run jobs; with drain=True stop when the queue is empty."""
+    processed = 0
+    while True:
+        close_old_connections()
+        job = claim_next_job(worker_name)
+        if job is None:
+            if drain:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+
+
+def job_status(job):
+    """JSON-ready status of a job."""
+    return {
+        "job_id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error.splitlines()[0] if job.error else None,
+        "run_id": job.run_id,
+        "data_version": job.data_version,
+        "joined": getattr(job, "joined", False),
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.benchmarks import BENCHMARKS, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the calculation hot paths (wall time, queries, peak memory). "
+        "Runs in a rolled-back transaction; --scale uses a synthetic dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only", help=f"Comma separated benchmarks (default: all of {', '.join(BENCHMARKS)})"
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Timed passes per benchmark")
+        parser.add_argument("--scale", type=float, help="Run on a synthetic dataset of this scale (1 = real size)")
+        parser.add_argument("--seed", type=int, default=0, help="Synthetic dataset seed")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="Baseline JSON from an earlier --output to compare against")
+        parser.add_argument("--threshold", type=float, default=1.25, help="Wall time ratio that counts as a regression")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["only"].split(",")] if options["only"] else None
+        try:
+            output = run_benchmarks(names, repeat=options["repeat"], scale=options["scale"], seed=options["seed"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        rows = output["meta"]["rows"]
+        self.stdout.write(
+            f"Dataset: {rows['landuse']} LandUse, {rows['renewable']} RenewableData, {rows['verbrauch']} VerbrauchData"
+        )
+        self.stdout.write(f"{'benchmark':<24} {'median ms':>10} {'min ms':>10} {'queries':>8} {'peak KiB':>10}")
+        for name, result in output["results"].items():
+            if result.get("error"):
+                self.stdout.write(self.style.WARNING(f"{name:<24} error: {result['error']}"))
+                continue
+            self.stdout.write(
+                f"{name:<24} {result['wall_ms']:>10.1f} {result['min_ms']:>10.1f} "
+                f"{result['queries']:>8} {result['peak_memory_kb']:>10.1f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                json.dump(output, handle, indent=2, default=str)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as handle:
+                baseline = json.load(handle)
+            regressions = compare_results(baseline, output, threshold=options["threshold"])
+            if regressions:
+                for item in regressions:
+                    self.stdout.write(self.style.ERROR(
+                        f"REGRESSION {item['name']} {item['metric']}: {item['baseline']} -> {item['current']}"
+                    ))
+                raise CommandError(f"{len(regressions)} benchmark regression(s) against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
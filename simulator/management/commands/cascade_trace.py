@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.cascade_trace import decode_trace, find_nodes, tree_depth
+from simulator.models import CalculationRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the cascade trace stored on a CalculationRun: hottest codes, "
+        "redundant recomputations, or (--code) every evaluation of one code."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--run", type=int, help="CalculationRun id (default: latest run with a trace)")
+        parser.add_argument("--code", help="List the evaluations of this code and the runs that touched it")
+        parser.add_argument("--top", type=int, default=15, help="Number of codes to list")
+
+    def handle(self, *args, **options):
+        runs = CalculationRun.objects.filter(cascade_trace__isnull=False)
+        run = runs.filter(pk=options["run"]).first() if options["run"] else runs.first()
+        if run is None:
+            raise CommandError("No CalculationRun with a cascade trace found")
+        trace = decode_trace(run.cascade_trace)
+        self.stdout.write(
+            f"Run {run.pk} ({trace['trigger']}): {trace['nodes']} nodes, depth {tree_depth(trace['roots'])}, "
+            f"{trace['duration_ms']} ms" + (f", {trace['dropped']} dropped" if trace["dropped"] else "")
+        )
+
+        code = options["code"]
+        if code:
+            other_runs = list(runs.filter(cascade_codes__has_key=code).values_list("pk", flat=True)[:20])
+            self.stdout.write(f"Runs that evaluated {code}: {', '.join(map(str, other_runs)) or '-'}")
+            for node in find_nodes(trace["roots"], code):
+                self.stdout.write(
+                    f"  {' > '.join(node['path'] + [code])} (trigger {node['trigger']}): "
+                    f"{node['old']} -> {node['new']}, {node['eval_us']} us, "
+                    f"{'written' if node['wrote'] else 'unchanged'}, {node['descendants']} descendants"
+                )
+            return
+
+        stats = sorted(run.cascade_codes.items(), key=lambda item: item[1][2], reverse=True)
+        self.stdout.write(f"{'code':<20} {'evals':>6} {'writes':>7} {'eval ms':>9}")
+        for code, (evaluations, writes, eval_ms) in stats[: options["top"]]:
+            line = f"{code:<20} {evaluations:>6} {writes:>7} {eval_ms:>9.2f}"
+            self.stdout.write(self.style.WARNING(line) if evaluations > 1 else line)
+        redundant = sum(1 for evaluations, _writes, _ms in run.cascade_codes.values() if evaluations > 1)
+        self.stdout.write(self.style.SUCCESS(f"{redundant} code(s) evaluated more than once"))
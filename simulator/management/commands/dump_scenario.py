@@ -0,0 +1,27 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from simulator.scenario import dump_scenario
+
+
+class Command(BaseCommand):
+    help = (
+        "Write all calculation inputs (formulas, LandUse, RenewableData, VerbrauchData, "
+        "GebaeudewaermeData, WSData daily profiles) to a compact binary scenario file (.npz)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file (.npz)")
+        parser.add_argument(
+            "--computed", action="store_true",
+            help="Also store computed values (the file then loads without a recalculation)",
+        )
+
+    def handle(self, *args, **options):
+        meta = dump_scenario(options["path"], include_computed=options["computed"])
+        rows = ", ".join(f"{name} {table['rows']}" for name, table in meta["tables"].items())
+        size_kb = os.path.getsize(options["path"]) / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote scenario v{meta['version']} ({rows}) to {options['path']} ({size_kb:.1f} KiB)"
+        ))
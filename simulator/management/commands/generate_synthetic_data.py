@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.models import LandUse, RenewableData, VerbrauchData
+from simulator.synthetic import DEFAULT_DEPTH, DEFAULT_FANOUT, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace LandUse, RenewableData and VerbrauchData with a synthetic hierarchy "
+        "(plus its Formula rows) for stress tests at 10x-100x data size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0, help="Branch multiplier (1 = real data size)")
+        parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="Levels below each branch")
+        parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help="Children per inner node")
+        parser.add_argument(
+            "--formula-density", type=float, default=1.0, help="Share of generation rows backed by a formula"
+        )
+        parser.add_argument("--if-share", type=float, default=0.1, help="Share of formulas written as IF(...)")
+        parser.add_argument(
+            "--cross-share", type=float, default=0.2, help="Share of Verbrauch leaves calculated from other tables"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--replace", action="store_true", help="Required when the tables already contain data (it is deleted)"
+        )
+
+    def handle(self, *args, **options):
+        existing = LandUse.objects.count() + RenewableData.objects.count() + VerbrauchData.objects.count()
+        if existing and not options["replace"]:
+            raise CommandError(f"{existing} existing rows would be deleted; pass --replace to continue")
+        try:
+            counts = generate_dataset(
+                scale=options["scale"],
+                depth=options["depth"],
+                fanout=options["fanout"],
+                formula_density=options["formula_density"],
+                if_share=options["if_share"],
+                cross_share=options["cross_share"],
+                seed=options["seed"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Generated {counts['landuse']} LandUse, {counts['renewable']} RenewableData, "
+            f"{counts['verbrauch']} VerbrauchData rows and {counts['formulas']} formulas "
+            f"({counts['if_formulas']} IF, {counts['cross_formulas']} cross-table)"
+        ))
@@ -1,56 +1,27 @@
+import time
+
 from django.core.management.base import BaseCommand
-import pandas as pd
+from simulator.bulk_import import LANDUSE_CLEAN_CSV, add_import_arguments, bundled_path, describe, finish_import, import_landuse
 from simulator.models import LandUse
 
 class Command(BaseCommand):
     help = 'Import clean CSV data with proper parent relationships'
 
+    def add_arguments(self, parser):
+        add_import_arguments(parser)
+
     def handle(self, *args, **options):
-        # Clear existing data
-        LandUse.objects.all().delete()
-        self.stdout.write('🗑️  Cleared existing data.')
-        
-        # Load the clean CSV
-        df = pd.read_csv("Flaechen_Daten_Clean.csv")
-        self.stdout.write(f'📁 Loading {len(df)} rows from Flaechen_Daten_Clean.csv...')
-        
-        # First pass: Create all objects
-        created_objects = {}
-        for _, row in df.iterrows():
-            code = str(row["Code"])
-            landuse = LandUse.objects.create(
-                code=code,
-                name=row["Name"],
-                status_ha=float(row["Status_ha"]) if pd.notna(row["Status_ha"]) else None,
-                target_ha=float(row["Target_ha"]) if pd.notna(row["Target_ha"]) else None,
-                quelle=row["Quelle"]
-            )
-            created_objects[code] = landuse
-        
-        # Second pass: Set parent relationships
-        for _, row in df.iterrows():
-            code = str(row["Code"])
-            parent_code_raw = row["Parent_Code"]
-            
-            if pd.notna(parent_code_raw):
-                parent_code = str(int(parent_code_raw)) if isinstance(parent_code_raw, float) else str(parent_code_raw)
-                if parent_code in created_objects:
-                    child = created_objects[code]
-                    parent = created_objects[parent_code]
-                    child.parent = parent
-                    child.save()
+        start = time.perf_counter()
+        summary = import_landuse(bundled_path(LANDUSE_CLEAN_CSV), mode=options['mode'])
+        self.stdout.write(f'📁 {LANDUSE_CLEAN_CSV}: {describe(summary)} in {time.perf_counter() - start:.2f}s')
+        finish_import(options, 'import_clean')
         
         self.stdout.write(
             self.style.SUCCESS(f'✅ Successfully imported {LandUse.objects.count()} records from clean CSV!')
         )
         
         # Show some examples
-        self.stdout.write('\n📊 Sample data with calculated percentages:')
-        for code in ['1', '1.1', '2', '2.1']:
-            try:
-                lu = LandUse.objects.get(code=code)
-                status_pct = f'{lu.status_percent}%' if lu.status_percent else '-'
-                target_pct = f'{lu.target_percent}%' if lu.target_percent else '-'
-                self.stdout.write(f'  {lu.code} - {lu.name}: Status {status_pct}, Target {target_pct}')
-            except LandUse.DoesNotExist:
-                pass
+        self.stdout.write('\n📊 Sample data:')
+        for lu in LandUse.objects.filter(code__in=['1', '1.1', '2', '2.1']).select_related('parent').order_by('code'):
+            parent = lu.parent.code if lu.parent else '-'
+            self.stdout.write(f'  {lu.code} - {lu.name} (parent {parent}): Status {lu.status_ha} ha, Target {lu.target_ha} ha')
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.bulk_import import RECALC_CHOICES, recalculate_after_import
+from simulator.models import LandUse, RenewableData, VerbrauchData
+from simulator.scenario import load_scenario
+
+
+class Command(BaseCommand):
+    help = "Replace the calculation inputs with the contents of a scenario file written by dump_scenario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Scenario file (.npz)")
+        parser.add_argument(
+            "--recalc", choices=RECALC_CHOICES, default=None,
+            help="Recalculation after loading (default: full, or none when the file has computed values)",
+        )
+        parser.add_argument(
+            "--replace", action="store_true", help="Required when the tables already contain data (it is deleted)"
+        )
+
+    def handle(self, *args, **options):
+        existing = LandUse.objects.count() + RenewableData.objects.count() + VerbrauchData.objects.count()
+        if existing and not options["replace"]:
+            raise CommandError(f"{existing} existing rows would be deleted; pass --replace to continue")
+        start = time.perf_counter()
+        try:
+            result = load_scenario(options["path"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        rows = ", ".join(f"{name} {count}" for name, count in result["rows"].items())
+        self.stdout.write(f"📁 Loaded scenario v{result['version']} ({rows}) in {result['duration_ms']} ms")
+        recalc = options["recalc"] or ("none" if result["include_computed"] else "full")
+        recalculate_after_import(recalc, triggered_by="load_scenario")
+        self.stdout.write(self.style.SUCCESS(f"✅ Done in {time.perf_counter() - start:.2f}s (recalc: {recalc})"))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.bulk_import import (
+    ENDENERGIE_CSV,
+    GEBAEUDEWAERME_CSV,
+    LANDUSE_CLEAN_CSV,
+    VERBRAUCH_CSV,
+    add_import_arguments,
+    bundled_path,
+    describe,
+    finish_import,
+    import_endenergie,
+    import_gebaeudewaerme,
+    import_landuse,
+    import_verbrauch,
+)
+from simulator.models import LandUse, VerbrauchData
+
+IMPORTS = (
+    ("LandUse", LANDUSE_CLEAN_CSV, import_landuse),
+    ("VerbrauchData", VERBRAUCH_CSV, import_verbrauch),
+    ("GebaeudewaermeData", GEBAEUDEWAERME_CSV, import_gebaeudewaerme),
+    ("RenewableData (10.x)", ENDENERGIE_CSV, import_endenergie),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild LandUse, VerbrauchData, GebaeudewaermeData and the 10.x RenewableData rows "
+        "from the bundled CSVs with bulk inserts, then recalculate once (--mode sync: apply only "
+        "the differences and recalculate their dependents)."
+    )
+
+    def add_arguments(self, parser):
+        add_import_arguments(parser)
+        parser.add_argument(
+            "--replace", action="store_true", help="Required when the tables already contain data (it is deleted)"
+        )
+
+    def handle(self, *args, **options):
+        existing = LandUse.objects.count() + VerbrauchData.objects.count()
+        if existing and options["mode"] == "replace" and not options["replace"]:
+            raise CommandError(
+                f"{existing} existing rows would be deleted; pass --replace or --mode sync to continue"
+            )
+        start = time.perf_counter()
+        for label, filename, importer in IMPORTS:
+            step = time.perf_counter()
+            summary = importer(bundled_path(filename), mode=options["mode"])
+            self.stdout.write(f"📁 {label} from {filename}: {describe(summary)} ({time.perf_counter() - step:.2f}s)")
+        step = time.perf_counter()
+        if finish_import(options, triggered_by="rebuild_from_csv") is not None:
+            self.stdout.write(f"🔄 Recalculation ({options['recalc']}): {time.perf_counter() - step:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt from CSV in {time.perf_counter() - start:.2f}s"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from simulator.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run queued calculation jobs (full recalc, balancing). Keeps polling unless --drain is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drain", action="store_true", help="Exit when no queued job is left")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between queue polls")
+
+    def handle(self, *args, **options):
+        processed = work(drain=options["drain"], poll_interval=options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calculation_engine.load_profiles import daily_demand_shapes
+from calculation_engine.storage_sweep import run_sweep, ws_profiles
+
+
+def _floats(value):
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = "Sweep storage size and WS parameters over the current WS profiles and print the Pareto table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", required=True, help="Comma separated storage sizes (GWh)")
+        parser.add_argument("--threshold", help="ABREGELUNG_THRESHOLD values")
+        parser.add_argument("--eta-strom-gas", help="ETA_STROM_GAS values")
+        parser.add_argument("--eta-gas-strom", help="ETA_GAS_STROM values")
+        parser.add_argument("--offset", help="GAS_STORAGE_OFFSET values (GWh)")
+        parser.add_argument(
+            "--demand", choices=("load-profiles", "ws"), default="load-profiles",
+            help="Daily demand shape: the synthesized sector load profiles (ziel, scaled to the WS annual "
+            "demand) or the WS table's own stromverbr_raumwaerm_korr column",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+        parser.add_argument("--pareto-only", action="store_true", help="Only print non-dominated rows")
+        parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+
+    def handle(self, *args, **options):
+        grid = {"storage_size": _floats(options["sizes"])}
+        for option, name in [
+            ("threshold", "ABREGELUNG_THRESHOLD"),
+            ("eta_strom_gas", "ETA_STROM_GAS"),
+            ("eta_gas_strom", "ETA_GAS_STROM"),
+            ("offset", "GAS_STORAGE_OFFSET"),
+        ]:
+            if options[option]:
+                grid[name] = _floats(options[option])
+
+        demand_shape = daily_demand_shapes()["ziel"] if options["demand"] == "load-profiles" else None
+        try:
+            generation, demand = ws_profiles(demand_shape)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        rows = run_sweep(generation, demand, grid, max_workers=options["workers"])
+        if options["pareto_only"]:
+            rows = [row for row in rows if row["pareto"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'size':>10} {'thresh':>7} {'eta_sg':>7} {'eta_gs':>7} {'offset':>8} "
+            f"{'curtail':>10} {'fossil':>10}  pareto"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['storage_size']:>10.1f} {row['ABREGELUNG_THRESHOLD']:>7.2f} "
+                f"{row['ETA_STROM_GAS']:>7.3f} {row['ETA_GAS_STROM']:>7.3f} "
+                f"{row['GAS_STORAGE_OFFSET']:>8.1f} {row['curtailment']:>10.1f} "
+                f"{row['residual_fossil']:>10.1f}  {'*' if row['pareto'] else ''}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Evaluated {len(rows)} grid points"))
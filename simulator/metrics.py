@@ -0,0 +1,369 @@
+"""
+Process metrics in Prometheus text format (``/metrics/``).
+
+A small registry of counters and histograms (no client library needed):
+request latency per view (``MetricsMiddleware``), full recalculation and WS
+recalculation durations, GoalSeek iterations and final residuals, cascade
+fan-out (dependents evaluated per cascade call), cache hits/misses and
+database writes (an execute wrapper installed on every connection, so bulk
+updates count too).
+
+Multiple worker processes: with ``settings.METRICS_DIR`` (env
+``DJANGO_METRICS_DIR``) every process writes its values to its own JSON file
+in that directory (atomically, at most every ``METRICS_FLUSH_INTERVAL``
+seconds and at exit) and the endpoint sums the files of all processes, so any
+worker can serve the totals. Files of exited processes are folded into one
+``aggregate.json`` when the endpoint is scraped, so counters never go
+backwards and the directory does not grow with every restart (the directory
+must be local to one host: liveness is checked by pid). Without a directory
+the endpoint reports the serving process only.
+"""
+import atexit
+from bisect import bisect_left
+from contextlib import ContextDecorator
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+try:  # Serializes merging the files of exited processes
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows; files of exited processes are kept
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_WRITE_STATEMENT = re.compile(r'^\s*(INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+["`]?(\w+)', re.IGNORECASE)
+
+AGGREGATE_FILE = "aggregate.json"
+LOCK_FILE = ".lock"
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # e.g. EPERM: exists, owned by another user
+        return True
+    return True
+
+
+def _read_values(path):
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_values(path, values):
+    """Atomic write; the temp name is unique per process and thread."""
+    temp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp, "w", encoding="utf-8") as handle:
+        json.dump(values, handle, separators=(",", ":"))
+    os.replace(temp, path)
+
+
+def _add_values(totals, values):
+    """Add one file's values ({raw key: number or histogram list}) to ``totals``."""
+    for raw_key, value in values.items():
+        if isinstance(value, list):
+            current = totals.setdefault(raw_key, [0] * len(value))
+            for index, item in enumerate(value):
+                current[index] += item
+        else:
+            totals[raw_key] = totals.get(raw_key, 0) + value
+    return totals
+
+
+class Registry:
+    """Metric values of this process plus the shared-file backend."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._filename = None
+        self._last_flush = 0.0
+        # Held while flushing, so threads neither race on _last_flush nor on the file
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _check_pid(self):
+        # A forked worker starts with its own (empty) values and file
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = {}
+            self._filename = f"{self._pid}-{int(time.time() * 1000)}.json"
+
+    def update(self, key, apply):
+        with self._lock:
+            self._check_pid()
+            apply(self._values, key)
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_pid()
+            return {json.dumps(key): value[:] if isinstance(value, list) else value for key, value in self._values.items()}
+
+    def _directory(self):
+        return getattr(settings, "METRICS_DIR", "")
+
+    def maybe_flush(self, force=False):
+        directory = self._directory()
+        if not directory:
+            return
+        with self._flush_lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0):
+                return
+            self._last_flush = now
+            try:
+                os.makedirs(directory, exist_ok=True)
+                values = self.snapshot()
+                _write_values(os.path.join(directory, self._filename), values)
+            except OSError as exc:
+                logger.warning("Metrics flush failed", extra={"eventType": "metrics", "context": {"error": str(exc)}})
+
+    def _merge_exited(self, directory):
+        """Fold the files of exited processes into the aggregate file (lock held exclusively)."""
+        exited, stale = [], []
+        for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.tmp")):
+            pid = os.path.basename(path).split("-", 1)[0]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                (stale if path.endswith(".tmp") else exited).append(path)
+        for path in stale:  # left behind by a process that died while writing
+            os.remove(path)
+        if not exited:
+            return
+        aggregate = os.path.join(directory, AGGREGATE_FILE)
+        totals = _read_values(aggregate) or {}
+        for path in exited:
+            _add_values(totals, _read_values(path) or {})
+        _write_values(aggregate, totals)
+        for path in exited:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logger.info(
+            "Merged metrics of exited processes",
+            extra={"eventType": "metrics", "context": {"files": len(exited)}},
+        )
+
+    def _read_directory(self, directory):
+        """Values of every file in the directory, merging exited processes' files first."""
+        if fcntl is None:
+            return [values for values in map(_read_values, glob.glob(os.path.join(directory, "*.json"))) if values]
+        with open(os.path.join(directory, LOCK_FILE), "a") as lock_handle:
+            # Exclusive while merging, so no reader sees a file both merged and not yet removed
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            try:
+                self._merge_exited(directory)
+                paths = glob.glob(os.path.join(directory, "*.json"))
+                return [values for values in map(_read_values, paths) if values]
+            finally:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+    def collect(self):
+        """Values summed over all processes ({(name, labels): value})."""
+        self.maybe_flush(force=True)
+        directory = self._directory()
+        if not directory:
+            sources = [self.snapshot()]
+        else:
+            try:
+                sources = self._read_directory(directory)
+            except OSError as exc:
+                logger.warning("Metrics merge failed", extra={"eventType": "metrics", "context": {"error": str(exc)}})
+                sources = [self.snapshot()]
+        raw_totals = {}
+        for values in sources:
+            _add_values(raw_totals, values)
+        totals = {}
+        for raw_key, value in raw_totals.items():
+            key = tuple(json.loads(raw_key))
+            totals[(key[0], tuple(tuple(pair) for pair in key[1]))] = value
+        return totals
+
+
+REGISTRY = Registry()
+atexit.register(lambda: REGISTRY.maybe_flush(force=True))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return (self.name, tuple((name, str(labels[name])) for name in self.labelnames))
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        def apply(values, key):
+            values[key] = values.get(key, 0) + amount
+
+        self.registry.update(self._key(labels), apply)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Fresh start time per decorated call (recursion, threads)
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets; stored as [bucket counts..., sum, count]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        index = bisect_left(self.buckets, value)
+
+        def apply(values, key):
+            entry = values.get(key)
+            if entry is None:
+                entry = values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+        self.registry.update(self._key(labels), apply)
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed seconds."""
+        return _Timer(self, labels)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def render(registry=REGISTRY):
+    """Prometheus text exposition (format 0.0.4) of all processes."""
+    totals = registry.collect()
+    lines = []
+    for name, metric in sorted(registry.metrics.items()):
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for (key_name, labels), value in sorted(totals.items()):
+            if key_name != name:
+                continue
+            if metric.kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "simulator_request_duration_seconds", "Request latency per view.", ["view", "method", "status"]
+)
+FULL_RECALC_DURATION = Histogram("simulator_full_recalc_duration_seconds", "Duration of run_full_recalc().")
+WS_RECALC_DURATION = Histogram("simulator_ws_recalc_duration_seconds", "Duration of recalculate_ws_data().")
+GOAL_SEEK_ITERATIONS = Histogram(
+    "simulator_goal_seek_iterations", "Function evaluations per GoalSeek run.", ["name"],
+    buckets=(1, 2, 3, 5, 8, 13, 20, 32),
+)
+GOAL_SEEK_RESIDUAL = Histogram(
+    "simulator_goal_seek_abs_residual", "Absolute residual GoalSeek finished with.", ["name"],
+    buckets=(1e-6, 1e-4, 1e-2, 1.0, 10.0, 100.0, 1000.0, 10000.0),
+)
+CASCADE_FANOUT = Histogram(
+    "simulator_cascade_fanout", "Dependents evaluated per cascade call.", ["cascade"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+CACHE_REQUESTS = Counter("simulator_cache_requests_total", "Result cache lookups.", ["cache", "result"])
+DB_WRITES = Counter("simulator_db_writes_total", "INSERT/UPDATE/DELETE statements per table.", ["statement", "table"])
+
+
+def count_cache(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result="hit" if hit else "miss")
+
+
+def count_db_writes(execute, sql, params, many, context):
+    """Execute wrapper counting write statements (installed by signals.install_write_counter)."""
+    match = _WRITE_STATEMENT.match(sql)
+    if match is not None:
+        rows = len(params) if many and hasattr(params, "__len__") else 1
+        DB_WRITES.inc(rows, statement=match.group(1).split()[0].lower(), table=match.group(2))
+    return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Observes every request's latency labelled with the resolved view name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            view=match.view_name if match else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulator", "0028_enhance_formula_models"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculationrun",
+            name="snapshot",
+            field=models.BinaryField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulator", "0031_calculationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculationjob",
+            name="data_version",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def publish_latest_run(apps, schema_editor):
+    CalculationRun = apps.get_model("simulator", "CalculationRun")
+    PublishedRun = apps.get_model("simulator", "PublishedRun")
+    latest = CalculationRun.objects.filter(snapshot__isnull=False).order_by("-created_at").first()
+    if latest is not None:
+        PublishedRun.objects.update_or_create(pk=1, defaults={"run": latest, "published_at": timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulator", "0032_calculationjob_data_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculationrun",
+            name="data_version",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="PublishedRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("published_at", models.DateTimeField()),
+                (
+                    "run",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="published_pointer",
+                        to="simulator.calculationrun",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(publish_latest_run, migrations.RunPython.noop),
+    ]
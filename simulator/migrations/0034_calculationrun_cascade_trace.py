@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("simulator", "0033_publishedrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calculationrun",
+            name="cascade_trace",
+            field=models.BinaryField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="calculationrun",
+            name="cascade_codes",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -6,6 +6,10 @@ from typing import Optional, List
 
 # Import WS Data model
 from .ws_models import WSData
+from .data_context import current_data_context
+from .profiling import tracks_cascade
+from .cascade_trace import trace_step
+from .metrics import CASCADE_FANOUT
 
 
 class Formula(models.Model):
@@ -334,6 +338,7 @@ class LandUse(models.Model):
             if target_val is not None:
                 self.target_ha = target_val
     
+    @tracks_cascade
     def _recalculate_renewable_dependents(self):
         """
         Find and recalculate all RenewableData items that reference this LandUse code.
@@ -390,42 +395,49 @@ class LandUse(models.Model):
             if renewable.target_value is not None:
                 target_lookup[renewable.code] = float(renewable.target_value)
         
+        evaluated = 0
         for item in dependent_items:
             if item.formula and (landuse_pattern in item.formula or (alt_landuse_pattern and alt_landuse_pattern in item.formula)):
+                evaluated += 1
                 try:
-                    calc_status, calc_target = item.get_calculated_values(
-                        _cache={},
-                        status_lookup=status_lookup,
-                        target_lookup=target_lookup
-                    )
-                    
-                    values_changed = False
-                    if calc_status is not None and item.status_value != calc_status:
-                        item.status_value = calc_status
-                        values_changed = True
-                    
-                    if calc_target is not None and item.target_value != calc_target:
-                        item.target_value = calc_target
-                        values_changed = True
-                    
-                    if values_changed:
-                        # Avoid triggering full Verbrauch recalculation for every dependent during LandUse cascades
-                        item.save(skip_verbrauch_recalc=True)
-                        
-                        # 🔥 CRITICAL FIX: update lookup so next items see new values
-                        status_lookup[item.code] = item.status_value
-                        target_lookup[item.code] = item.target_value
-                        
-                        updated_count += 1
-                
+                    with trace_step(item.code, self.code, item.status_value, item.target_value) as step:
+                        calc_status, calc_target = item.get_calculated_values(
+                            _cache={},
+                            status_lookup=status_lookup,
+                            target_lookup=target_lookup
+                        )
+                        step.evaluated(calc_status, calc_target)
+
+                        values_changed = False
+                        if calc_status is not None and item.status_value != calc_status:
+                            item.status_value = calc_status
+                            values_changed = True
+
+                        if calc_target is not None and item.target_value != calc_target:
+                            item.target_value = calc_target
+                            values_changed = True
+
+                        if values_changed:
+                            step.wrote()
+                            # Avoid triggering full Verbrauch recalculation for every dependent during LandUse cascades
+                            item.save(skip_verbrauch_recalc=True)
+
+                            # 🔥 CRITICAL FIX: update lookup so next items see new values
+                            status_lookup[item.code] = item.status_value
+                            target_lookup[item.code] = item.target_value
+
+                            updated_count += 1
+
                 except Exception as e:
                     print(f"❌ Error recalculating RenewableData {item.code} from LandUse {self.code}: {str(e)}")
                     import traceback
                     traceback.print_exc()
+        CASCADE_FANOUT.observe(evaluated, cascade="landuse_renewable")
         
         # Silent by default - set settings.LOG_CASCADE_UPDATES = True to enable logging
         pass
     
+    @tracks_cascade
     def _cascade_to_children(self):
         """
         When this LandUse item's target_ha changes, cascade the update to all children.
@@ -444,14 +456,18 @@ class LandUse(models.Model):
                 try:
                     # Recalculate child's target_ha based on new parent value
                     old_child_target = child.target_ha
-                    child.target_ha = (self.target_ha * child.user_percent) / 100.0
-                    
-                    # Save child (this will trigger its own cascade to grandchildren)
-                    child.save()
+                    with trace_step(child.code, self.code, child.status_ha, old_child_target) as step:
+                        child.target_ha = (self.target_ha * child.user_percent) / 100.0
+                        step.evaluated(child.status_ha, child.target_ha)
+                        step.wrote()
+
+                        # Save child (this will trigger its own cascade to grandchildren)
+                        child.save()
                     
                     print(f"🔄 Cascaded: {child.code} target_ha: {old_child_target} → {child.target_ha}")
                 except Exception as e:
                     print(f"❌ Error cascading to child {child.code}: {str(e)}")
+        CASCADE_FANOUT.observe(len(children), cascade="landuse_children")
 
 
 class RenewableData(models.Model):
@@ -541,6 +557,7 @@ class RenewableData(models.Model):
         # Reset skip flag after save to avoid leaking into unrelated operations
         self._skip_verbrauch_recalc = False
     
+    @tracks_cascade
     def _recalculate_dependents(self):
         """
         Find and recalculate all RenewableData items that reference this code in their formulas.
@@ -571,15 +588,13 @@ class RenewableData(models.Model):
         for item in dependent_items:
             if item.formula and re.search(pattern, item.formula):
                 items_to_update.append(item)
+        CASCADE_FANOUT.observe(len(items_to_update), cascade="renewable")
         
         if not items_to_update:
             return
         
         try:
             # Import calculation engine
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             from calculation_engine.renewable_engine import RenewableCalculator
             from simulator.models import LandUse, VerbrauchData
             
@@ -605,20 +620,23 @@ class RenewableData(models.Model):
             # Recalculate each dependent item
             for item in items_to_update:
                 try:
-                    calc_status, calc_target = calculator.calculate(item.code)
-                    
-                    if calc_status is not None and calc_target is not None:
-                        # Check if values changed
-                        status_changed = abs((item.status_value or 0) - calc_status) > 0.01
-                        target_changed = abs((item.target_value or 0) - calc_target) > 0.01
-                        
-                        if status_changed or target_changed:
-                            item.status_value = calc_status
-                            item.target_value = calc_target
-                            # Save and trigger cascade
-                            super(RenewableData, item).save(update_fields=['status_value', 'target_value', 'updated_at'])
-                            item._recalculate_dependents()
-                        
+                    with trace_step(item.code, self.code, item.status_value, item.target_value) as step:
+                        calc_status, calc_target = calculator.calculate(item.code)
+                        step.evaluated(calc_status, calc_target)
+
+                        if calc_status is not None and calc_target is not None:
+                            # Check if values changed
+                            status_changed = abs((item.status_value or 0) - calc_status) > 0.01
+                            target_changed = abs((item.target_value or 0) - calc_target) > 0.01
+
+                            if status_changed or target_changed:
+                                item.status_value = calc_status
+                                item.target_value = calc_target
+                                step.wrote()
+                                # Save and trigger cascade
+                                super(RenewableData, item).save(update_fields=['status_value', 'target_value', 'updated_at'])
+                                item._recalculate_dependents()
+
                 except Exception as e:
                     print(f"❌ Error recalculating {item.code}: {str(e)}")
                     
@@ -672,9 +690,6 @@ class RenewableData(models.Model):
         
         # Use calculation engine for all calculations
         try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             from calculation_engine.renewable_engine import RenewableCalculator
             from simulator.models import LandUse, VerbrauchData
             
@@ -718,6 +733,10 @@ class RenewableData(models.Model):
                     i.code: {'status': i.status or 0, 'ziel': i.ziel or 0}
                     for i in VerbrauchData.objects.all()
                 }
+                calculator.set_data_sources(landuse_data, verbrauch_data, renewable_data)
+            elif current_data_context() is not None:
+                # Tables loaded and values memoized once per request (simulator/data_context.py)
+                calculator = None
             else:
                 # Load all data sources from database
                 landuse_data = {
@@ -732,11 +751,13 @@ class RenewableData(models.Model):
                     i.code: {'status_value': i.status_value or 0, 'target_value': i.target_value or 0}
                     for i in RenewableData.objects.all()
                 }
-            
-            calculator.set_data_sources(landuse_data, verbrauch_data, renewable_data)
+                calculator.set_data_sources(landuse_data, verbrauch_data, renewable_data)
             
             # Calculate using engine
-            calc_status, calc_target = calculator.calculate(self.code)
+            if calculator is None:
+                calc_status, calc_target = current_data_context().renewable_values(self.code)
+            else:
+                calc_status, calc_target = calculator.calculate(self.code)
             
             if calc_status is not None and calc_target is not None:
                 return calc_status, calc_target
@@ -841,6 +862,7 @@ class VerbrauchData(models.Model):
             except Exception as exc:  # pragma: no cover - defensive guard
                 print(f"Error triggering Verbrauch recalculation for {self.code}: {exc}")
     
+    @tracks_cascade
     def _recalculate_dependents(self):
         """
         Find and recalculate all VerbrauchData items that depend on this code.
@@ -873,36 +895,40 @@ class VerbrauchData(models.Model):
             try:
                 old_status = item.status
                 old_ziel = item.ziel
-                
-                # Recalculate values
-                new_status = None
-                new_ziel = None
-                
-                if item.status_calculated or item.is_calculated:
-                    new_status = item.calculate_value()
-                    
-                if item.ziel_calculated or item.is_calculated:
-                    new_ziel = item.calculate_ziel_value()
-                
-                # Check if values changed
-                values_changed = False
-                if new_status is not None and old_status != new_status:
-                    item.status = new_status
-                    values_changed = True
-                if new_ziel is not None and old_ziel != new_ziel:
-                    item.ziel = new_ziel
-                    values_changed = True
-                
-                if values_changed:
-                    # Save WITH cascade to propagate changes
-                    super(VerbrauchData, item).save(update_fields=['status', 'ziel', 'updated_at'])
-                    # Manually trigger cascade since we used super()
-                    item._recalculate_dependents()
-                    updated_count += 1
-                    
+
+                with trace_step(item.code, self.code, old_status, old_ziel) as step:
+                    # Recalculate values
+                    new_status = None
+                    new_ziel = None
+
+                    if item.status_calculated or item.is_calculated:
+                        new_status = item.calculate_value()
+
+                    if item.ziel_calculated or item.is_calculated:
+                        new_ziel = item.calculate_ziel_value()
+                    step.evaluated(new_status, new_ziel)
+
+                    # Check if values changed
+                    values_changed = False
+                    if new_status is not None and old_status != new_status:
+                        item.status = new_status
+                        values_changed = True
+                    if new_ziel is not None and old_ziel != new_ziel:
+                        item.ziel = new_ziel
+                        values_changed = True
+
+                    if values_changed:
+                        step.wrote()
+                        # Save WITH cascade to propagate changes
+                        super(VerbrauchData, item).save(update_fields=['status', 'ziel', 'updated_at'])
+                        # Manually trigger cascade since we used super()
+                        item._recalculate_dependents()
+                        updated_count += 1
+
             except Exception as e:
                 # Log error but don't fail
                 print(f"❌ Error recalculating dependent VerbrauchData {item.code}: {str(e)}")
+        CASCADE_FANOUT.observe(len(dependent_items), cascade="verbrauch")
         
         if updated_count > 0:
             print(f"✅ Cascaded update: VerbrauchData {self.code} -> {updated_count} dependent(s) recalculated")
@@ -910,6 +936,7 @@ class VerbrauchData(models.Model):
         # CASCADE TO RENEWABLEDATA: Find all RenewableData items that reference this VerbrauchData code
         self._recalculate_renewable_dependents()
     
+    @tracks_cascade
     def _recalculate_renewable_dependents(self):
         """
         Find and recalculate all RenewableData items that reference this VerbrauchData code.
@@ -941,15 +968,13 @@ class VerbrauchData(models.Model):
         for item in dependent_items:
             if item.formula and verbrauch_pattern in item.formula:
                 items_to_update.append(item)
+        CASCADE_FANOUT.observe(len(items_to_update), cascade="verbrauch_renewable")
         
         if not items_to_update:
             return
         
         try:
             # Import calculation engine
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             from calculation_engine.renewable_engine import RenewableCalculator
             from simulator.models import LandUse
             
@@ -975,17 +1000,20 @@ class VerbrauchData(models.Model):
             updated_count = 0
             for item in items_to_update:
                 try:
-                    calc_status, calc_target = calculator.calculate(item.code)
-                    
-                    if calc_status is not None and calc_target is not None:
-                        status_changed = abs((item.status_value or 0) - calc_status) > 0.01
-                        target_changed = abs((item.target_value or 0) - calc_target) > 0.01
-                        
-                        if status_changed or target_changed:
-                            item.status_value = calc_status
-                            item.target_value = calc_target
-                            item.save(skip_cascade=False)  # Trigger further cascades
-                            updated_count += 1
+                    with trace_step(item.code, self.code, item.status_value, item.target_value) as step:
+                        calc_status, calc_target = calculator.calculate(item.code)
+                        step.evaluated(calc_status, calc_target)
+
+                        if calc_status is not None and calc_target is not None:
+                            status_changed = abs((item.status_value or 0) - calc_status) > 0.01
+                            target_changed = abs((item.target_value or 0) - calc_target) > 0.01
+
+                            if status_changed or target_changed:
+                                item.status_value = calc_status
+                                item.target_value = calc_target
+                                step.wrote()
+                                item.save(skip_cascade=False)  # Trigger further cascades
+                                updated_count += 1
                 
                 except Exception as e:
                     print(f"❌ Error recalculating RenewableData {item.code} from VerbrauchData {self.code}: {str(e)}")
@@ -1038,11 +1066,14 @@ class VerbrauchData(models.Model):
     def calculate_value(self):
         """Calculate STATUS value using calculation_engine.VerbrauchCalculator (database-driven)"""
         try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             from calculation_engine.verbrauch_engine import VerbrauchCalculator
             
+            context = current_data_context()
+            if context is not None:
+                # Tables loaded and values memoized once per request (simulator/data_context.py)
+                status_value, _ = context.verbrauch_values(self.code)
+                return status_value
+
             # Initialize calculator
             calculator = VerbrauchCalculator()
             
@@ -1079,11 +1110,14 @@ class VerbrauchData(models.Model):
     def calculate_ziel_value(self):
         """Calculate ZIEL value using calculation_engine.VerbrauchCalculator (database-driven)"""
         try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             from calculation_engine.verbrauch_engine import VerbrauchCalculator
             
+            context = current_data_context()
+            if context is not None:
+                # Tables loaded and values memoized once per request (simulator/data_context.py)
+                _, ziel_value = context.verbrauch_values(self.code)
+                return ziel_value
+
             # Initialize calculator
             calculator = VerbrauchCalculator()
             
@@ -1200,14 +1234,92 @@ class CalculationRun(models.Model):
     """
     Snapshot of an explicit full recalculation (renewable + Verbrauch + WS).
     Stored to let pages read the latest run metadata without re-running heavy steps.
+    Runs without a snapshot only carry the cascade trace of a recalculation
+    outside a job (see simulator/cascade_trace.py, persisted_trace()).
     """
     created_at = models.DateTimeField(auto_now_add=True)
     duration_ms = models.PositiveIntegerField()
     summary = models.JSONField(default=dict, blank=True)
     triggered_by = models.CharField(max_length=150, blank=True, null=True)
+    # Materialized results (zlib-compressed JSON, see simulator/snapshots.py)
+    snapshot = models.BinaryField(blank=True, null=True, editable=False)
+    # Data version the snapshot was read at
+    data_version = models.PositiveBigIntegerField(null=True, blank=True)
+    # Cascade tree of the recalculation (zlib-compressed JSON) and
+    # {code: [evaluations, writes, eval_ms]}, see simulator/cascade_trace.py
+    cascade_trace = models.BinaryField(blank=True, null=True, editable=False)
+    cascade_codes = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
 
     def __str__(self):
         return f"Run at {self.created_at.isoformat()} ({self.duration_ms} ms)"
+
+
+class PublishedRun(models.Model):
+    """
+    Single-row pointer to the CalculationRun whose snapshot read views serve.
+    Writers build the next run on the side and swap this pointer with one
+    UPDATE (simulator.snapshots.publish_run).
+    """
+    run = models.ForeignKey(
+        CalculationRun, on_delete=models.SET_NULL, null=True, blank=True, related_name="published_pointer"
+    )
+    published_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Published run {self.run_id} ({self.published_at.isoformat()})"
+
+
+class DataVersion(models.Model):
+    """
+    Single-row, monotonically increasing version of all calculation inputs.
+    Bumped only through simulator.data_version.bump_data_version(); used for
+    ETag / Last-Modified on read views.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Data version {self.version} ({self.updated_at.isoformat()})"
+
+
+class CalculationJob(models.Model):
+    """
+    Long-running computation (full recalc, balancing) queued in the database
+    and executed by a worker process (see simulator/jobs.py). Progress is
+    written while it runs; the result is stored as a CalculationRun.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    run = models.ForeignKey(CalculationRun, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs")
+    triggered_by = models.CharField(max_length=150, blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    # Data version the job was requested against (single-flight key, see jobs.enqueue_job)
+    data_version = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.status})"
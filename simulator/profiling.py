@@ -0,0 +1,168 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` measures a sampled share of requests and reports:
+- query count and total SQL time (a ``connection.execute_wrapper``, so it
+  works with DEBUG off)
+- the most repeated query shapes (SQL with literals and IN lists
+  normalized), which makes N+1 patterns visible
+- the deepest model cascade reached (``_recalculate_dependents`` & co. are
+  decorated with ``tracks_cascade``)
+- wall time
+
+as an ``eventType: "perf"`` log record and a ``Server-Timing`` header.
+
+Settings: ``PROFILING_ENABLED`` (env ``DJANGO_PROFILING``),
+``PROFILING_SAMPLE_RATE`` (0..1, env ``DJANGO_PROFILING_SAMPLE_RATE``) and
+``PROFILING_TOP_QUERIES``. Unsampled requests, and code running outside a
+profiled request, only pay for one contextvar lookup per cascade call.
+"""
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+import functools
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_active = ContextVar("simulator_request_profile", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:[^()]*)\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(sql):
+    """SQL with literals, placeholders lists and whitespace normalized."""
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class RequestProfile:
+    """Counters for one request; also the execute_wrapper that feeds them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.shapes = Counter()
+        self.shape_seconds = defaultdict(float)
+        self.cascade_depth = 0
+        self.max_cascade_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            shape = query_shape(sql)
+            self.queries += 1
+            self.sql_seconds += elapsed
+            self.shapes[shape] += 1
+            self.shape_seconds[shape] += elapsed
+
+    def repeated_queries(self, limit=5):
+        """Most repeated query shapes (executed more than once)."""
+        return [
+            {"shape": shape, "count": count, "time_ms": round(self.shape_seconds[shape] * 1000, 2)}
+            for shape, count in self.shapes.most_common(limit)
+            if count > 1
+        ]
+
+
+def current_profile():
+    """The profile of the running request, or None."""
+    return _active.get()
+
+
+@contextmanager
+def cascade_level():
+    """Count one cascade level for the active profile (no-op without one)."""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    profile.cascade_depth += 1
+    profile.max_cascade_depth = max(profile.max_cascade_depth, profile.cascade_depth)
+    try:
+        yield
+    finally:
+        profile.cascade_depth -= 1
+
+
+def tracks_cascade(method):
+    """Decorator for recursive cascade methods: records the depth reached."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _active.get() is None:
+            return method(*args, **kwargs)
+        with cascade_level():
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def _sampled():
+    if not getattr(settings, "PROFILING_ENABLED", False):
+        return False
+    rate = float(getattr(settings, "PROFILING_SAMPLE_RATE", 1.0))
+    return rate >= 1.0 or random.random() < rate
+
+
+class ProfilingMiddleware:
+    """Profiles sampled requests (see module docstring)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _active.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _active.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+        sql_ms = profile.sql_seconds * 1000
+
+        timing = (
+            f'db;dur={sql_ms:.1f};desc="{profile.queries} queries", '
+            f"app;dur={max(wall_ms - sql_ms, 0.0):.1f}, total;dur={wall_ms:.1f}"
+        )
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        logger.info(
+            "Request profile",
+            extra={
+                "eventType": "perf",
+                "context": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "wall_ms": round(wall_ms, 2),
+                    "queries": profile.queries,
+                    "sql_ms": round(sql_ms, 2),
+                    "cascade_depth": profile.max_cascade_depth,
+                    "repeated_queries": profile.repeated_queries(getattr(settings, "PROFILING_TOP_QUERIES", 5)),
+                },
+            },
+        )
+        return response
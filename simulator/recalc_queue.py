@@ -0,0 +1,218 @@
+"""
+Debounced, coalescing recalculation queue for slider-driven edits.
+
+Slider endpoints submit their changes (batch-edit format, see
+simulator/batch_edit.py) and return immediately. Submissions are merged per
+table/code/field (last value wins, codes in the order of their last edit);
+LandUse slider edits submitted with ``cascade`` get their ancestor/descendant
+percents planned when the batch runs, on the merged edits (``apply_batch_edit``
+``cascade``), not per request on the stored rows. Batches are applied by a
+background timer thread
+once no new edit arrived for ``settings.RECALC_DEBOUNCE_SECONDS`` (at most
+``RECALC_MAX_DELAY_SECONDS`` after the first pending edit), so a burst of
+edits runs one ``apply_batch_edit()`` with one recalculation. Each batch's
+cascade trace is stored (``persisted_trace()``, simulator/cascade_trace.py).
+
+Clients poll ``api/data-version/`` (``recalc_pending`` counts edits still
+queued or being applied) and reload once the version moved past the one
+returned with their edit and nothing is pending. A failed batch puts its
+edits back into the queue (retried with the next submission) and is reported
+as ``recalc_error`` until then.
+
+The queue lives in the web process's memory, so exactly one web process may
+serve the site (threads are fine): a second process would apply its own
+batches and answer polls with its own pending count. ``claim_web_process()``
+(called by wsgi.py/asgi.py) enforces this with a lock file; a second process
+fails to start with ImproperlyConfigured.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils import timezone
+
+from simulator.batch_edit import apply_batch_edit
+from simulator.cascade_trace import persisted_trace
+
+try:  # Lock file enforcing a single web process
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows; a single process is then not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_process_lock = None
+
+
+def _setting(name, default):
+    return float(getattr(settings, name, default))
+
+
+class RecalcQueue:
+    """Merges submitted changes and applies them in one batch after a quiet window."""
+
+    def __init__(self, runner=apply_batch_edit):
+        self._runner = runner
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._pending = {}
+        self._cascade = set()  # LandUse codes whose pending user_percent is a slider edit
+        self._running = 0  # codes of the batch being applied
+        self._first_submit = None
+        self._timer = None
+        self.batches_run = 0
+        self.last_result = None
+        self.last_error = None  # {"error", "codes", "at"} of a failed batch until the next submission
+        self.failures = 0
+
+    def submit(self, changes, cascade=()):
+        """
+        Queue changes ({table: {code: {field: value}}}); ``cascade`` lists the
+        LandUse codes whose user_percent edit cascades through the hierarchy.
+        Returns the pending code count.
+        """
+        with self._lock:
+            # The edits of a failed batch are retried with this one
+            self.last_error = None
+            for table, rows in changes.items():
+                target = self._pending.setdefault(table, {})
+                for code, fields in rows.items():
+                    # Re-inserted, so the batch plans cascades in edit order
+                    target[code] = {**target.pop(code, {}), **fields}
+                    if table == "landuse" and "user_percent" in fields:
+                        if code in cascade:
+                            self._cascade.add(code)
+                        else:
+                            self._cascade.discard(code)
+            now = time.monotonic()
+            if self._first_submit is None:
+                self._first_submit = now
+            window = _setting("RECALC_DEBOUNCE_SECONDS", 0.5)
+            max_delay = _setting("RECALC_MAX_DELAY_SECONDS", 5.0)
+            delay = max(min(window, self._first_submit + max_delay - now), 0.0)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._run_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+            return self._pending_count()
+
+    def _pending_count(self):
+        return self._pending_count_of(self._pending)
+
+    @staticmethod
+    def _pending_count_of(changes):
+        return sum(len(rows) for rows in changes.values())
+
+    def pending_count(self):
+        """Queued codes plus those of the batch being applied (not yet committed)."""
+        with self._lock:
+            return self._pending_count() + self._running
+
+    def _take(self):
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            cascade, self._cascade = self._cascade, set()
+            self._running = self._pending_count_of(changes)
+            self._first_submit = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return changes, cascade
+
+    def _restore(self, changes, cascade, exc):
+        """Put a failed batch's edits back in front of the newer ones and record the failure."""
+        with self._lock:
+            for table, rows in changes.items():
+                newer = self._pending.get(table, {})
+                restored = {code: {**fields, **newer.get(code, {})} for code, fields in rows.items()}
+                restored.update((code, fields) for code, fields in newer.items() if code not in restored)
+                self._pending[table] = restored
+                if table == "landuse":
+                    self._cascade |= {
+                        code for code in cascade if "user_percent" not in newer.get(code, {})
+                    }
+            self.failures += 1
+            self.last_error = {
+                "error": str(exc).splitlines()[0] if str(exc) else type(exc).__name__,
+                "codes": self._pending_count_of(changes),
+                "at": timezone.now().isoformat(),
+            }
+
+    def flush(self):
+        """Apply everything pending now (in the calling thread); returns the batch result or None."""
+        with self._run_lock:
+            changes, cascade = self._take()
+            if not changes:
+                return None
+            try:
+                with persisted_trace("recalc_queue"):
+                    result = self._runner(changes, cascade=cascade) if cascade else self._runner(changes)
+            except Exception as exc:
+                self._restore(changes, cascade, exc)
+                raise
+            finally:
+                with self._lock:
+                    self._running = 0
+            self.batches_run += 1
+            self.last_result = result
+            self.last_error = None
+            logger.info(
+                "Queued recalculation applied",
+                extra={
+                    "eventType": "recalc_queue",
+                    "context": {
+                        "codes": self._pending_count_of(changes),
+                        "duration_ms": result.get("duration_ms") if isinstance(result, dict) else None,
+                    },
+                },
+            )
+            return result
+
+    def _run_in_background(self):
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.error(
+                "Queued recalculation failed",
+                extra={"eventType": "recalc_queue", "context": {"error": str(exc)}},
+                exc_info=exc,
+            )
+        finally:
+            # Timer threads get their own DB connections; do not leak them
+            connections.close_all()
+
+
+def _default_lock_file():
+    digest = hashlib.sha1(str(settings.BASE_DIR).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"simulator-recalc-queue-{digest}.lock")
+
+
+def claim_web_process(path=None):
+    """
+    Take the single-web-process lock (see module docstring) for the life of
+    this process. Raises ImproperlyConfigured when another process holds it.
+    """
+    global _process_lock
+    if fcntl is None or _process_lock is not None:
+        return
+    path = path or getattr(settings, "RECALC_QUEUE_LOCK_FILE", "") or _default_lock_file()
+    handle = open(path, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise ImproperlyConfigured(
+            f"Another web process holds {path}: the recalculation queue keeps its edits in "
+            "process memory, so run a single web process (use threads for concurrency)"
+        )
+    _process_lock = handle
+
+
+recalc_queue = RecalcQueue()
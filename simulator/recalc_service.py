@@ -1,19 +1,28 @@
+from contextlib import contextmanager
+import logging
+import threading
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from django.db import transaction
+from django.db.models.signals import post_save
 
+from simulator.cascade_trace import trace_step
+from simulator.metrics import FULL_RECALC_DURATION
 from simulator.models import LandUse, RenewableData, VerbrauchData
 from simulator.verbrauch_recalculator import recalc_all_verbrauch
 from simulator.signals import recalculate_ws_data
 
+logger = logging.getLogger(__name__)
 
-def recalc_all_renewables_full() -> int:
+
+def recalc_all_renewables_full(lookups: Optional[Dict[str, Dict[str, float]]] = None) -> int:
     """
     Recalculate all non-fixed RenewableData items in a single pass using
     fresh LandUse and Verbrauch lookups. Uses in-memory lookups to avoid
     repeated database reads and suppresses downstream Verbrauch recalc to
-    keep this step bounded.
+    keep this step bounded. ``lookups`` (when given) receives the final
+    "status" and "target" lookups ({code: value}) of the pass.
     """
     dependent_items = RenewableData.objects.filter(
         formula__isnull=False,
@@ -51,62 +60,96 @@ def recalc_all_renewables_full() -> int:
 
     updated_count = 0
     for item in dependent_items:
-        try:
-            calc_status, calc_target = item.get_calculated_values(
-                _cache={},
-                status_lookup=status_lookup,
-                target_lookup=target_lookup,
-            )
-        except Exception:
-            calc_status, calc_target = None, None
-
-        # Special case: status for 9.2.1.3 is defined as zero (no status-side supply)
-        if item.code == "9.2.1.3":
-            calc_status = 0
-
-        def manual_eval(formula: str, use_target: bool):
-            expr = formula or ""
-
-            def repl(match):
-                token = match.group(0)
-                if token.startswith("LandUse_"):
-                    return str(target_lookup.get(token, 0) if use_target else status_lookup.get(token, 0))
-                if token.startswith("VerbrauchData_"):
-                    vcode = token.replace("VerbrauchData_", "")
-                    return str(verbrauch_target.get(vcode, 0) if use_target else verbrauch_status.get(vcode, 0))
-                # Renewable codes keyed without prefix
-                return str(target_lookup.get(token, 0) if use_target else status_lookup.get(token, 0))
-
-            import re
-
-            expr = re.sub(r"LandUse_[A-Za-z0-9\._]+|VerbrauchData_[\d\.]+|\d+(?:\.\d+)*", repl, expr)
+        with trace_step(item.code, "recalc_all_renewables_full", item.status_value, item.target_value) as step:
             try:
-                return eval(expr, {"__builtins__": {}})
+                calc_status, calc_target = item.get_calculated_values(
+                    _cache={},
+                    status_lookup=status_lookup,
+                    target_lookup=target_lookup,
+                )
             except Exception:
-                return None
-
-        if calc_status is None and item.formula:
-            calc_status = manual_eval(item.formula, use_target=False)
-        if calc_target is None and item.formula:
-            calc_target = manual_eval(item.formula, use_target=True)
-
-        values_changed = False
-        if calc_status is not None and item.status_value != calc_status:
-            item.status_value = calc_status
-            values_changed = True
-        if calc_target is not None and item.target_value != calc_target:
-            item.target_value = calc_target
-            values_changed = True
-
-        if values_changed:
-            item.save(skip_cascade=True, skip_verbrauch_recalc=True)
-            status_lookup[item.code] = item.status_value
-            target_lookup[item.code] = item.target_value
-            updated_count += 1
+                calc_status, calc_target = None, None
+
+            # Special case: status for 9.2.1.3 is defined as zero (no status-side supply)
+            if item.code == "9.2.1.3":
+                calc_status = 0
+
+            def manual_eval(formula: str, use_target: bool):
+                expr = formula or ""
+
+                def repl(match):
+                    token = match.group(0)
+                    if token.startswith("LandUse_"):
+                        return str(target_lookup.get(token, 0) if use_target else status_lookup.get(token, 0))
+                    if token.startswith("VerbrauchData_"):
+                        vcode = token.replace("VerbrauchData_", "")
+                        return str(verbrauch_target.get(vcode, 0) if use_target else verbrauch_status.get(vcode, 0))
+                    # Renewable codes keyed without prefix
+                    return str(target_lookup.get(token, 0) if use_target else status_lookup.get(token, 0))
 
+                import re
+
+                expr = re.sub(r"LandUse_[A-Za-z0-9\._]+|VerbrauchData_[\d\.]+|\d+(?:\.\d+)*", repl, expr)
+                try:
+                    return eval(expr, {"__builtins__": {}})
+                except Exception:
+                    return None
+
+            if calc_status is None and item.formula:
+                calc_status = manual_eval(item.formula, use_target=False)
+            if calc_target is None and item.formula:
+                calc_target = manual_eval(item.formula, use_target=True)
+            step.evaluated(calc_status, calc_target)
+
+            values_changed = False
+            if calc_status is not None and item.status_value != calc_status:
+                item.status_value = calc_status
+                values_changed = True
+            if calc_target is not None and item.target_value != calc_target:
+                item.target_value = calc_target
+                values_changed = True
+
+            if values_changed:
+                step.wrote()
+                item.save(skip_cascade=True, skip_verbrauch_recalc=True)
+                status_lookup[item.code] = item.status_value
+                target_lookup[item.code] = item.target_value
+                updated_count += 1
+
+    if lookups is not None:
+        lookups["status"] = status_lookup
+        lookups["target"] = target_lookup
     return updated_count
 
 
+@contextmanager
+def _track_saved_values(inputs):
+    """
+    Keep ``inputs`` (allocate_sectors() keyword arguments) current with the
+    RenewableData/VerbrauchData saves made by this thread inside the block.
+    """
+    thread = threading.get_ident()
+
+    def on_save(sender, instance, **kwargs):
+        if threading.get_ident() != thread:
+            return
+        if sender is RenewableData:
+            inputs["renewable_status"][instance.code] = instance.status_value
+            inputs["renewable_target"][instance.code] = instance.target_value
+        else:
+            inputs["verbrauch_status"][instance.code] = instance.status
+            inputs["verbrauch_ziel"][instance.code] = instance.ziel
+
+    for model in (RenewableData, VerbrauchData):
+        post_save.connect(on_save, sender=model, weak=False)
+    try:
+        yield inputs
+    finally:
+        for model in (RenewableData, VerbrauchData):
+            post_save.disconnect(on_save, sender=model)
+
+
+@FULL_RECALC_DURATION.time()
 def run_full_recalc() -> Dict[str, Any]:
     """
     Centralized heavy recalculation invoked explicitly (e.g., from UI).
@@ -114,6 +157,7 @@ def run_full_recalc() -> Dict[str, Any]:
     - recalc all renewables once
     - recalc all Verbrauch rollups once
     - recalc WS data once
+    - allocate renewable supply to demand sectors (LP, cached)
     Returns summary with timing and counts.
     """
     start = time.perf_counter()
@@ -126,19 +170,48 @@ def run_full_recalc() -> Dict[str, Any]:
             after = RenewableData.objects.count()
             lu_updates += max(after - before, 0)
 
-        renewables_updated = recalc_all_renewables_full()
-        verbrauch_updated_codes: List[str] = recalc_all_verbrauch(trigger_code="manual")
-        try:
-            from simulator.renewable_recalc import recalc_renewables_for_verbrauch
-
-            updated_from_verbrauch = 0
-            for code in VerbrauchData.objects.values_list("code", flat=True):
-                updated_codes = recalc_renewables_for_verbrauch(code)
-                updated_from_verbrauch += len(updated_codes)
-        except Exception:
-            updated_from_verbrauch = 0
+        renewable_lookups: Dict[str, Dict[str, float]] = {}
+        renewables_updated = recalc_all_renewables_full(lookups=renewable_lookups)
+        verbrauch_values: Dict[str, Any] = {}
+        # Allocation inputs: the values this run computed, kept current by the
+        # saves of the remaining passes (no re-read afterwards)
+        allocation_inputs = {
+            "renewable_status": renewable_lookups["status"],
+            "renewable_target": renewable_lookups["target"],
+            "verbrauch_status": {},
+            "verbrauch_ziel": {},
+        }
+        with _track_saved_values(allocation_inputs):
+            verbrauch_updated_codes: List[str] = recalc_all_verbrauch(trigger_code="manual", values=verbrauch_values)
+            # Rows saved since are already tracked (and newer)
+            for code, (status, ziel) in verbrauch_values.items():
+                allocation_inputs["verbrauch_status"].setdefault(code, status)
+                allocation_inputs["verbrauch_ziel"].setdefault(code, ziel)
+            try:
+                from simulator.renewable_recalc import recalc_renewables_for_verbrauch
+
+                updated_from_verbrauch = 0
+                for code in VerbrauchData.objects.values_list("code", flat=True):
+                    updated_codes = recalc_renewables_for_verbrauch(code)
+                    updated_from_verbrauch += len(updated_codes)
+            except Exception:
+                updated_from_verbrauch = 0
         recalculate_ws_data()
 
+    from calculation_engine.sector_allocation import allocate_sectors
+
+    sector_allocation_error = None
+    try:
+        sector_allocation = allocate_sectors(**allocation_inputs)
+    except (ValueError, ArithmeticError) as exc:
+        # Recorded in the summary; the recalculated values above stay committed
+        logger.warning(
+            "Sector allocation failed",
+            extra={"eventType": "recalc", "context": {"error": str(exc)}},
+        )
+        sector_allocation = None
+        sector_allocation_error = str(exc)
+
     duration_ms = int((time.perf_counter() - start) * 1000)
     return {
         "duration_ms": duration_ms,
@@ -146,4 +219,6 @@ def run_full_recalc() -> Dict[str, Any]:
         "verbrauch_updated": len(verbrauch_updated_codes),
         "renewables_from_verbrauch": updated_from_verbrauch,
         "landuse_driven_updates": lu_updates,
+        "sector_allocation": sector_allocation,
+        "sector_allocation_error": sector_allocation_error,
     }
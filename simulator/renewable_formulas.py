@@ -9,12 +9,6 @@ with Django models and views.
 This is the SINGLE SOURCE OF TRUTH for all renewable energy formulas (sections 1-9).
 """
 
-import sys
-import os
-
-# Add parent directory to path to import the complete formulas file
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 # Import all formula dictionaries from the complete formulas file
 try:
     from renewable_energy_complete_formulas import (
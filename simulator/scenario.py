@@ -0,0 +1,283 @@
+"""
+Binary scenario files: all calculation inputs in one compact file.
+
+``dump_scenario()`` writes Formula, FormulaVariable, LandUse, RenewableData,
+VerbrauchData, GebaeudewaermeData and WSData to a compressed NumPy ``.npz``
+archive. Computed values (formula-backed renewables, calculated Verbrauch
+rows, the WSData columns derived from the daily promille inputs) are blanked
+unless ``include_computed`` is set; per table:
+
+- ``<table>.index``: the row keys (code, formula key, day) as a string array
+- ``<table>.values``: numeric and boolean columns as one float64 matrix
+  (rows x columns, NaN for NULL)
+- ``<table>.text``: text columns as UTF-8 JSON (lists per column)
+- ``meta``: UTF-8 JSON with the format version and the column names per
+  table, so files of older versions still load (unknown columns are
+  ignored, missing ones get their model default)
+
+Foreign keys are stored by key (LandUse parent code, FormulaVariable formula
+key) and resolved on load. ``load_scenario()`` replaces the tables in one
+transaction with ``bulk_create`` (no save() cascades, one data version bump);
+without computed values the caller recalculates afterwards. Files are read
+with ``allow_pickle=False``.
+"""
+import json
+import logging
+import time
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from simulator.bulk_import import BATCH_SIZE
+from simulator.data_version import bump_data_version, get_data_version
+from simulator.models import Formula, FormulaVariable, GebaeudewaermeData, LandUse, RenewableData, VerbrauchData
+from simulator.ws_models import WSData
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_FORMAT = "simulator-scenario"
+SCENARIO_VERSION = 1
+
+# (name, model, index field); loaded in this order (FormulaVariable after Formula)
+TABLES = (
+    ("formula", Formula, "key"),
+    ("formula_variable", FormulaVariable, None),
+    ("landuse", LandUse, "code"),
+    ("renewable", RenewableData, "code"),
+    ("verbrauch", VerbrauchData, "code"),
+    ("gebaeudewaerme", GebaeudewaermeData, "code"),
+    ("ws", WSData, "tag_im_jahr"),
+)
+# WSData inputs (daily profiles, see signals.recalculate_ws_data); every other
+# numeric WSData column is derived from them
+WS_INPUT_COLUMNS = frozenset(
+    {"tag_im_jahr", "wind_promille", "solar_promille", "verbrauch_promille", "heizung_abwaerm_promille"}
+)
+
+_NUMERIC_TYPES = {
+    "FloatField", "IntegerField", "BigIntegerField", "SmallIntegerField",
+    "PositiveIntegerField", "PositiveBigIntegerField", "PositiveSmallIntegerField", "BooleanField",
+}
+# Foreign keys are stored as the referenced row's key instead of its id
+_RELATED_KEYS = {LandUse: "code", Formula: "key"}
+
+
+def _columns(model):
+    """(numeric, text, foreign) column names; ids and auto timestamps are not stored."""
+    numeric, text, foreign = [], [], []
+    for field in model._meta.concrete_fields:
+        if field.primary_key or getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            continue
+        if field.is_relation:
+            text.append(field.name)
+            foreign.append(field.name)
+        elif field.get_internal_type() in _NUMERIC_TYPES:
+            numeric.append(field.name)
+        else:
+            text.append(field.name)
+    return numeric, text, foreign
+
+
+def _computed_mask(name, row, numeric):
+    """Numeric columns of ``row`` holding computed values (blanked without include_computed)."""
+    if name == "ws":
+        return set(numeric) - WS_INPUT_COLUMNS
+    if name == "renewable" and row.formula and not row.is_fixed:
+        return {"status_value", "target_value"}
+    if name in ("verbrauch", "gebaeudewaerme"):
+        return (
+            ({"status"} if row.is_calculated or row.status_calculated else set())
+            | ({"ziel"} if row.is_calculated or row.ziel_calculated else set())
+        )
+    return set()
+
+
+def _text_value(row, field, foreign):
+    if field in foreign:
+        related = getattr(row, field)
+        return getattr(related, _RELATED_KEYS[type(related)]) if related is not None else None
+    value = getattr(row, field)
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _encode_table(name, model, index_field, include_computed):
+    numeric, text, foreign = _columns(model)
+    queryset = model.objects.all()
+    if foreign:
+        queryset = queryset.select_related(*foreign)
+    rows = list(queryset.order_by("pk"))
+    values = np.full((len(rows), len(numeric)), np.nan)
+    for i, row in enumerate(rows):
+        blank = set() if include_computed else _computed_mask(name, row, numeric)
+        for j, field in enumerate(numeric):
+            value = getattr(row, field)
+            if value is not None and field not in blank:
+                values[i, j] = float(value)
+    columns = [[_text_value(row, field, foreign) for row in rows] for field in text]
+    index = [str(getattr(row, index_field)) if index_field else str(i) for i, row in enumerate(rows)]
+    arrays = {
+        f"{name}.index": np.array(index, dtype=str),
+        f"{name}.values": values,
+        f"{name}.text": np.frombuffer(json.dumps(columns, separators=(",", ":")).encode("utf-8"), dtype=np.uint8),
+    }
+    return arrays, {"rows": len(rows), "numeric": numeric, "text": text, "foreign": foreign}
+
+
+def dump_scenario(path, include_computed=False):
+    """
+    Write the current inputs (and optionally computed values) to ``path``.
+
+    Returns:
+        dict: the file's meta data (format, version, tables with row counts)
+    """
+    arrays = {}
+    meta = {
+        "format": SCENARIO_FORMAT,
+        "version": SCENARIO_VERSION,
+        "created_at": timezone.now().isoformat(),
+        "data_version": get_data_version()[0],
+        "include_computed": include_computed,
+        "tables": {},
+    }
+    # One consistent view of all tables
+    with transaction.atomic():
+        for name, model, index_field in TABLES:
+            table_arrays, meta["tables"][name] = _encode_table(name, model, index_field, include_computed)
+            arrays.update(table_arrays)
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    with open(path, "wb") as handle:
+        np.savez_compressed(handle, **arrays)
+    return meta
+
+
+def read_scenario(path):
+    """
+    Read a scenario file without touching the database.
+
+    Returns:
+        (meta, {table: {"index": [...], "values": {column: ndarray}, "text": {column: list},
+        "foreign": [text columns holding foreign keys]}})
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        if "meta" not in archive.files:
+            raise ValueError(f"{path} is not a scenario file")
+        meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+        if meta.get("format") != SCENARIO_FORMAT:
+            raise ValueError(f"{path} is not a scenario file")
+        if meta.get("version", 0) > SCENARIO_VERSION:
+            raise ValueError(
+                f"{path} has scenario version {meta['version']}; this code reads up to {SCENARIO_VERSION}"
+            )
+        tables = {}
+        for name, columns in meta["tables"].items():
+            values = archive[f"{name}.values"]
+            text = json.loads(archive[f"{name}.text"].tobytes().decode("utf-8"))
+            tables[name] = {
+                "index": archive[f"{name}.index"].tolist(),
+                "values": {column: values[:, j] for j, column in enumerate(columns["numeric"])},
+                "text": dict(zip(columns["text"], text)),
+                "foreign": columns.get("foreign", []),
+            }
+    return meta, tables
+
+
+def _field_value(field, value):
+    kind = field.get_internal_type()
+    if kind == "DateTimeField" and value is not None:
+        return parse_datetime(value)
+    if kind == "BooleanField":
+        return bool(value)
+    if kind != "FloatField" and isinstance(value, float):
+        return int(value)
+    return value
+
+
+def _build_rows(model, table):
+    """Unsaved model instances from a decoded table; FK key values are returned separately."""
+    fields = {field.name: field for field in model._meta.concrete_fields}
+    count = len(table["index"])
+    kwargs = [{} for _ in range(count)]
+    references = {}
+    for column, values in table["values"].items():
+        if column not in fields:
+            continue
+        field = fields[column]
+        for i, value in enumerate(values.tolist()):
+            if value == value:
+                kwargs[i][column] = _field_value(field, value)
+            elif field.null:  # NaN -> NULL (non-nullable columns keep their default)
+                kwargs[i][column] = None
+    for column, values in table["text"].items():
+        if column in table["foreign"] and column in fields:
+            references[column] = values
+        elif column in fields:
+            field = fields[column]
+            for i, value in enumerate(values):
+                if value is not None or field.null:
+                    kwargs[i][column] = _field_value(field, value)
+    return [model(**row) for row in kwargs], references
+
+
+def _create_landuse_tree(rows, parents):
+    """
+    Insert LandUse rows level by level with ``parent_id`` already set.
+
+    bulk_create() returns the new ids, so each level links to the one before
+    it without a bulk_update afterwards. Rows whose parent code is not in the
+    file stay unlinked; rows in a parent cycle go in last, unlinked.
+    """
+    parent_of = {row.code: parent for row, parent in zip(rows, parents) if parent}
+    codes = {row.code for row in rows}
+    ids = {}
+    pending = rows
+    while pending:
+        # Ready: no parent in the file, or the parent was inserted (cycles go in last)
+        level = [row for row in pending if parent_of.get(row.code) not in codes or parent_of[row.code] in ids] or pending
+        for row in level:
+            row.parent_id = ids.get(parent_of.get(row.code))
+        LandUse.objects.bulk_create(level, batch_size=BATCH_SIZE)
+        ids.update((row.code, row.pk) for row in level)
+        placed = {id(row) for row in level}
+        pending = [row for row in pending if id(row) not in placed]
+
+
+def load_scenario(path):
+    """
+    Replace the scenario's tables with the file's rows in one transaction.
+
+    Returns:
+        dict: meta data plus ``rows`` ({table: count}) and ``duration_ms``
+    """
+    start = time.perf_counter()
+    meta, tables = read_scenario(path)
+    models = {name: (model, index_field) for name, model, index_field in TABLES}
+    counts = {}
+    with transaction.atomic():
+        # Children first, so no cascade deletes run row by row
+        for name in reversed([name for name, _model, _index in TABLES]):
+            if name in tables:
+                models[name][0].objects.all().delete()
+        for name, (model, _index_field) in models.items():
+            if name not in tables:
+                continue
+            rows, references = _build_rows(model, tables[name])
+            if "formula" in references:
+                formula_ids = dict(Formula.objects.values_list("key", "id"))
+                for row, key in zip(rows, references["formula"]):
+                    row.formula_id = formula_ids.get(key)
+                rows = [row for row in rows if row.formula_id is not None]
+            if "parent" in references:
+                _create_landuse_tree(rows, references["parent"])
+            else:
+                model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            counts[name] = len(rows)
+        # bulk_create() sends no post_save signals
+        bump_data_version("load_scenario")
+    duration_ms = int((time.perf_counter() - start) * 1000)
+    logger.info(
+        "Scenario loaded",
+        extra={"eventType": "import", "context": {"path": str(path), "rows": counts, "duration_ms": duration_ms}},
+    )
+    return {**meta, "rows": counts, "duration_ms": duration_ms}
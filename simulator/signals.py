@@ -1,12 +1,21 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import LandUse, RenewableData, VerbrauchData
+from .models import (
+    CalculationRun,
+    Formula,
+    FormulaVariable,
+    GebaeudewaermeData,
+    LandUse,
+    PublishedRun,
+    RenewableData,
+    VerbrauchData,
+)
 from .ws_models import WSData
-from calculation_engine.ws_engine import WSCalculator
-
-
-# Initialize WS calculator
-ws_calculator = WSCalculator()
+from .data_version import batch as data_version_batch, bump_data_version
+from .metrics import WS_RECALC_DURATION, count_db_writes
+from calculation_engine.ws_engine import get_ws_calculator
 
 
 @receiver(post_save, sender=LandUse)
@@ -55,6 +64,11 @@ def handle_landuse_deletion(sender, instance, **kwargs):
         print(f"⚠️ LandUse {instance.code} deleted - renewable entries {affected_renewable_codes} will show empty values")
 
 
+# Codes the WS diagram reference reads (see compute_ws_diagram_reference)
+WS_RENEWABLE_CODES = ('1.1.2.1.2', '1.2.1.2', '2.1.1.2.2', '2.2.1.2', '3.1.1.2', '4.4.1', '9.2.1.5.2', '9.3.1', '9.3.4')
+WS_VERBRAUCH_CODES = ('2.9.2', '2.4')
+
+
 def compute_ws_diagram_reference():
     """
     Compute Annual Electricity (WS1) reference values using WS calculation engine.
@@ -62,8 +76,7 @@ def compute_ws_diagram_reference():
     """
     # Gather renewable data
     renewable_data = {}
-    renewable_codes = ['1.1.2.1.2', '1.2.1.2', '2.1.1.2.2', '2.2.1.2', '3.1.1.2', '4.4.1', '9.2.1.5.2', '9.3.1', '9.3.4']
-    for code in renewable_codes:
+    for code in WS_RENEWABLE_CODES:
         try:
             renewable = RenewableData.objects.get(code=code)
             renewable_data[code] = {
@@ -75,8 +88,7 @@ def compute_ws_diagram_reference():
     
     # Gather verbrauch data
     verbrauch_data = {}
-    verbrauch_codes = ['2.9.2', '2.4']
-    for code in verbrauch_codes:
+    for code in WS_VERBRAUCH_CODES:
         try:
             verbrauch = VerbrauchData.objects.get(code=code)
             verbrauch_data[code] = {
@@ -86,7 +98,7 @@ def compute_ws_diagram_reference():
             verbrauch_data[code] = {'ziel': 0}
     
     # Use WS calculator to get reference values
-    reference_values = ws_calculator.get_reference_values(renewable_data, verbrauch_data)
+    reference_values = get_ws_calculator().get_reference_values(renewable_data, verbrauch_data)
     
     # If WS row 366 exists, override certain inputs to keep baseline aligned with diagram
     try:
@@ -107,6 +119,8 @@ def compute_ws_diagram_reference():
     return reference_values
 
 
+@data_version_batch()
+@WS_RECALC_DURATION.time()
 def recalculate_ws_data(stromverbr_override=None, use_diagram_reference=True):
     """
     Recalculate all WS data based on Annual Electricity and Verbrauch data.
@@ -411,4 +425,50 @@ def renewable_data_changed(sender, instance, **kwargs):
 def verbrauch_data_changed(sender, instance, **kwargs):
     """Heavy recalculation is manual; only mark stale."""
     print(f"ℹ️ VerbrauchData {instance.code} changed; full recalculation is manual now.")
+
+
+DATA_VERSION_SENDERS = (
+    LandUse,
+    RenewableData,
+    VerbrauchData,
+    GebaeudewaermeData,
+    WSData,
+    Formula,
+    FormulaVariable,
+    CalculationRun,
+    PublishedRun,
+)
+
+
+def data_changed(sender, **kwargs):
+    """Any input change bumps the data version (coalesced per transaction)."""
+    bump_data_version(sender.__name__)
+
+
+for _sender in DATA_VERSION_SENDERS:
+    post_save.connect(data_changed, sender=_sender, dispatch_uid=f"data_version_save_{_sender.__name__}")
+    post_delete.connect(data_changed, sender=_sender, dispatch_uid=f"data_version_delete_{_sender.__name__}")
+
+
+@receiver(connection_created, dispatch_uid="configure_sqlite")
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    WAL journal for SQLite: readers keep reading the last committed state
+    while a recalculation writes, instead of waiting for its lock.
+    """
+    journal_mode = getattr(settings, "SQLITE_JOURNAL_MODE", "wal")
+    if connection.vendor != "sqlite" or not journal_mode:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        if journal_mode.lower() == "wal":
+            cursor.execute("PRAGMA synchronous=NORMAL")
+
+
+@receiver(connection_created, dispatch_uid="count_db_writes")
+def install_write_counter(sender, connection, **kwargs):
+    """Count INSERT/UPDATE/DELETE statements per table (simulator/metrics.py)."""
+    if count_db_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_db_writes)
+
 # Import this in apps.py to register the signals
@@ -0,0 +1,200 @@
+"""
+Materialized result snapshots for CalculationRun.
+
+A snapshot is built once per explicit full recalculation and stored on the
+run as zlib-compressed JSON. It is immutable: read-only pages (bilanz,
+cockpit, verbrauch, annual electricity) render from the published snapshot,
+or from ``?run_id=<id>``, with a single query instead of recomputing from live
+rows. Decoded snapshots are memoized per process by (run id, created_at).
+
+Publishing: the snapshot is read inside one transaction (a consistent view
+of all tables even while other writers commit; SQLite runs in WAL mode, see
+signals.configure_sqlite), stored on a new run, and only then made visible by
+swapping the ``PublishedRun`` pointer in one UPDATE. Readers never see a
+half-written run and never wait for a recalculation.
+"""
+import json
+import logging
+import threading
+import zlib
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from simulator.cascade_trace import encode_trace
+from simulator.data_version import bump_data_version, get_data_version
+from simulator.models import CalculationRun, LandUse, PublishedRun, RenewableData, VerbrauchData
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_decoded = {}
+_decoded_lock = threading.Lock()
+_DECODED_MAX = 16
+
+
+def encode_snapshot(data):
+    """Serialize a snapshot dict to compact compressed bytes."""
+    raw = json.dumps(data, separators=(",", ":"), default=float).encode("utf-8")
+    return zlib.compress(raw, 6)
+
+
+def decode_snapshot(blob):
+    """Inverse of encode_snapshot()."""
+    return json.loads(zlib.decompress(bytes(blob)).decode("utf-8"))
+
+
+def verbrauch_display_rows():
+    """
+    Display values for every VerbrauchData row (calculated rows evaluated).
+    Shared by verbrauch_view (live mode) and the snapshot builder.
+    """
+    rows = []
+    for item in VerbrauchData.objects.all():
+        if item.is_calculated:
+            display_status = item.calculate_value()
+            display_ziel = item.calculate_ziel_value()
+        else:
+            display_status = item.status
+            display_ziel = item.ziel
+        rows.append(
+            {
+                "code": item.code,
+                "category": item.category,
+                "unit": item.unit,
+                "status": display_status,
+                "ziel": display_ziel,
+                "user_percent": item.user_percent,
+                "is_calculated": item.is_calculated,
+            }
+        )
+    return rows
+
+
+def build_snapshot(summary=None, refresh=True):
+    """
+    Collect all computed values of the current database state. With
+    ``refresh=False`` nothing is written (bilanz skips its Verbrauch refresh).
+
+    Returns:
+        dict with version, raw values per table (code -> [status, target]),
+        Verbrauch display rows, bilanz structure and annual electricity flows.
+    """
+    from calculation_engine.annual_electricity import calculate_annual_electricity
+    from calculation_engine.bilanz_engine import calculate_bilanz_data
+
+    bilanz = calculate_bilanz_data(refresh=refresh)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "landuse": {
+            code: [status, target]
+            for code, status, target in LandUse.objects.values_list("code", "status_ha", "target_ha")
+        },
+        "renewables": {
+            code: [status, target]
+            for code, status, target in RenewableData.objects.values_list("code", "status_value", "target_value")
+        },
+        "verbrauch_rows": verbrauch_display_rows(),
+        "bilanz": bilanz,
+        "annual_electricity": calculate_annual_electricity(),
+        "sector_allocation": (summary or {}).get("sector_allocation"),
+    }
+
+
+def create_run_with_snapshot(summary, triggered_by=None, trace=None):
+    """
+    Create a CalculationRun for a finished recalculation, materialize its
+    snapshot and publish it. ``trace`` (a CascadeTrace) is stored on the run.
+    """
+    from calculation_engine.bilanz_engine import calculate_bilanz_data
+
+    # Refresh the Verbrauch rollups (and warm the bilanz cache) first; inside
+    # the read transaction bilanz must not write, even on a cache miss
+    calculate_bilanz_data()
+    with transaction.atomic():
+        version = get_data_version()[0]
+        snapshot = build_snapshot(summary, refresh=False)
+    blob = encode_snapshot(snapshot)
+    trace_blob, trace_codes = encode_trace(trace) if trace is not None else (None, {})
+    with transaction.atomic():
+        run = CalculationRun.objects.create(
+            duration_ms=summary["duration_ms"],
+            summary=summary,
+            triggered_by=triggered_by,
+            snapshot=blob,
+            data_version=version,
+            cascade_trace=trace_blob,
+            cascade_codes=trace_codes,
+        )
+        publish_run(run)
+    with _decoded_lock:
+        _decoded[(run.id, run.created_at)] = decode_snapshot(blob)
+    logger.info(
+        "Snapshot materialized",
+        extra={"eventType": "snapshot", "context": {"run_id": run.id, "bytes": len(blob), "data_version": version}},
+    )
+    return run
+
+
+def publish_run(run):
+    """
+    Point read views at run with one UPDATE (the pointer swap).
+
+    A run read at an older data version than the published one is not
+    published. Returns True when the pointer moved.
+    """
+    now = timezone.now()
+    not_newer = Q(run__isnull=True) | Q(run__data_version__isnull=True)
+    if run.data_version is not None:
+        not_newer |= Q(run__data_version__lte=run.data_version)
+    published = PublishedRun.objects.filter(not_newer, pk=1).update(run=run, published_at=now)
+    if not published:
+        _pointer, created = PublishedRun.objects.get_or_create(pk=1, defaults={"run": run, "published_at": now})
+        published = created
+    if published:
+        # .update() sends no post_save signal
+        bump_data_version("publish_run")
+    return bool(published)
+
+
+def load_snapshot(run_id=None):
+    """
+    Return (run, snapshot) for the requested or latest run that has a snapshot.
+
+    Without run_id the published run is used (latest run with a snapshot when
+    nothing was published yet). One query; decoding is memoized per run
+    because snapshots never change. Returns (None, None) when no usable
+    snapshot exists.
+    """
+    runs = CalculationRun.objects.filter(snapshot__isnull=False)
+    if run_id:
+        try:
+            run = runs.filter(pk=int(run_id)).first()
+        except (TypeError, ValueError):
+            run = None
+    else:
+        run = runs.filter(published_pointer__pk=1).first() or runs.first()
+    if run is None:
+        return None, None
+
+    key = (run.id, run.created_at)
+    with _decoded_lock:
+        snapshot = _decoded.get(key)
+    if snapshot is None:
+        try:
+            snapshot = decode_snapshot(run.snapshot)
+        except Exception as exc:
+            logger.warning(
+                "Snapshot decode failed",
+                extra={"eventType": "snapshot", "context": {"run_id": run.id, "error": str(exc)}},
+            )
+            return None, None
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None, None
+        with _decoded_lock:
+            if len(_decoded) >= _DECODED_MAX:
+                _decoded.pop(next(iter(_decoded)))
+            _decoded[key] = snapshot
+    return run, snapshot
@@ -0,0 +1,47 @@
+// Polling helpers for background work.
+// Long computations (simulator/jobs.py) answer with {job_id, status, status_url};
+// waitForJob polls the status URL until the job is done and resolves with its result.
+// Queued edits (simulator/recalc_queue.py) answer with their data_version;
+// waitForDataVersion polls the data version endpoint until the edit is applied.
+async function waitForJob(data, onProgress, intervalMs = 1000) {
+    if (!data || !data.status_url) {
+        return data;
+    }
+    let job = data;
+    while (job.status === "queued" || job.status === "running") {
+        if (onProgress) onProgress(job.progress || {});
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+        const response = await fetch(data.status_url, { headers: { "Accept": "application/json" } });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        job = await response.json();
+    }
+    if (job.status !== "done") {
+        throw new Error(job.error || `Job ${job.job_id} ${job.status}`);
+    }
+    return job.result;
+}
+
+// Resolves once the data version moved past sinceVersion and no queued edits
+// are pending, i.e. the recalculation of an edit answered with that version
+// has been committed. Rejects (error.recalcError) when the queued batch
+// failed; its edits stay queued and are retried with the next edit.
+async function waitForDataVersion(sinceVersion, url, intervalMs = 500) {
+    while (true) {
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+        const response = await fetch(url, { headers: { "Accept": "application/json" }, cache: "no-cache" });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const state = await response.json();
+        if (state.recalc_error) {
+            const error = new Error(state.recalc_error.error);
+            error.recalcError = true;
+            throw error;
+        }
+        if (state.version > sinceVersion && state.recalc_pending === 0) {
+            return state;
+        }
+    }
+}
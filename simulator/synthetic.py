@@ -0,0 +1,269 @@
+"""
+Synthetic LandUse / VerbrauchData / RenewableData / Formula datasets.
+
+Used by the benchmark suite (simulator/benchmarks.py) and
+``manage.py generate_synthetic_data`` to run the calculation paths at a
+multiple of the real data size. The shape follows the real tables:
+
+- LandUse: root "LU_0" with branches "LU_<b>"; below each branch a tree of
+  ``depth`` levels with ``fanout`` children per node. Sibling user_percent
+  shares sum to 100 and parents hold the sum of their children, so
+  "LU_1.1" / "LU_2.1" (the balance_energy drivers) exist.
+- VerbrauchData: the same tree without the "LU_" prefix; inner rows are
+  calculated (Formula "V_<code>" summing the children), leaves are fixed, or
+  with ``cross_share`` calculated from the leaf's renewable generation and
+  land area (Renewable_/LandUse_ references).
+- RenewableData: per LandUse leaf a fixed yield "<leaf>.1" and a generation
+  row "<leaf>.2": with ``formula_density`` a formula (area x yield, or with
+  ``if_share`` an IF formula in the shape of the real 9.x rows), otherwise a
+  fixed value. Per branch a total "<b>.9" over its generation rows minus a
+  share of the branch's Verbrauch total (cross-table reference).
+- Real codes: the VerbrauchData/RenewableData codes bilanz and the WS diagram
+  read (``BILANZ_*_CODES``, ``WS_*_CODES``) that the tree did not generate
+  are added, so those paths compute on the synthetic rows: Verbrauch rows
+  with fixed values, renewables as a formula over a few generation rows.
+- WSData: days 1-365 with seasonal wind/solar/consumption/heating profiles
+  (promille, like the imported WS sheet) and the sum row 366.
+
+``scale`` multiplies the number of branches; scale 1 with the defaults
+(depth 1, fanout 8) is about the size of the real dataset (~90 LandUse, ~90
+Verbrauch, ~170 RenewableData rows). Rows per branch grow as fanout**depth.
+"""
+import math
+import random
+
+from django.db import transaction
+
+from calculation_engine.bilanz_engine import BILANZ_RENEWABLE_CODES, BILANZ_VERBRAUCH_CODES
+from simulator.data_version import bump_data_version
+from simulator.models import Formula, LandUse, RenewableData, VerbrauchData
+from simulator.signals import WS_RENEWABLE_CODES, WS_VERBRAUCH_CODES
+from simulator.ws_models import WSData
+
+BRANCHES_PER_SCALE = 10
+DEFAULT_DEPTH = 1
+DEFAULT_FANOUT = 8
+
+
+def _landuse_tree(rng, root, branches, depth, fanout):
+    """Create the LandUse tree level by level; returns {code: row} (codes with LU_ prefix)."""
+    rows = {root.code: root}
+    level = LandUse.objects.bulk_create(
+        LandUse(code=f"LU_{b}", name=f"Branch {b}", parent=root, user_percent=100.0 / branches)
+        for b in range(1, branches + 1)
+    )
+    rows.update((row.code, row) for row in level)
+    for depth_index in range(depth):
+        children = []
+        for parent in level:
+            shares = [rng.uniform(1, 10) for _ in range(fanout)]
+            for index, share in enumerate(shares, start=1):
+                child = LandUse(
+                    code=f"{parent.code}.{index}",
+                    name=f"Area {parent.code[3:]}.{index}",
+                    parent=parent,
+                    user_percent=100.0 * share / sum(shares),
+                )
+                if depth_index == depth - 1:
+                    child.status_ha = rng.uniform(100, 10000)
+                    child.target_ha = child.status_ha * rng.uniform(0.8, 1.5)
+                children.append(child)
+        level = LandUse.objects.bulk_create(children)
+        rows.update((row.code, row) for row in level)
+
+    # Parents hold the sum of their children (deepest first)
+    inner = sorted(
+        (row for row in rows.values() if row.status_ha is None),
+        key=lambda row: row.code.count(".") if row.parent_id else -1,
+        reverse=True,
+    )
+    by_parent = {}
+    for row in rows.values():
+        by_parent.setdefault(row.parent_id, []).append(row)
+    for row in inner:
+        kids = by_parent.get(row.pk, [])
+        row.status_ha = sum(kid.status_ha or 0 for kid in kids)
+        row.target_ha = sum(kid.target_ha or 0 for kid in kids)
+    LandUse.objects.bulk_update(inner, ["status_ha", "target_ha"])
+    return rows
+
+
+def _ws_days(rng):
+    """WSData rows for days 1-365 (promille profiles) plus the sum row 366."""
+    profiles = {}
+    for field, amplitude, peak in (
+        ("wind_promille", 0.4, 15),  # windy winters
+        ("solar_promille", 0.8, 172),  # sunny summers
+        ("verbrauch_promille", 0.15, 15),
+        ("heizung_abwaerm_promille", 0.9, 15),
+    ):
+        values = [
+            max(1 + amplitude * math.cos(2 * math.pi * (day - peak) / 365) + rng.uniform(-0.2, 0.2), 0.01)
+            for day in range(1, 366)
+        ]
+        # Daily shares sum to 1000 promille; heating shares average 1 per day (365)
+        total = 365 if field == "heizung_abwaerm_promille" else 1000
+        profiles[field] = [value * total / sum(values) for value in values]
+    rows = [
+        WSData(tag_im_jahr=day, datum_ref=f"Tag {day}", **{field: values[day - 1] for field, values in profiles.items()})
+        for day in range(1, 366)
+    ]
+    rows.append(WSData(tag_im_jahr=366, datum_ref="Summe"))
+    return rows
+
+
+def generate_dataset(
+    scale=1.0,
+    depth=DEFAULT_DEPTH,
+    fanout=DEFAULT_FANOUT,
+    formula_density=1.0,
+    if_share=0.0,
+    cross_share=0.0,
+    seed=0,
+    clear=True,
+):
+    """
+    Write a synthetic dataset with bulk_create (no save() cascades).
+
+    Args:
+        scale: Multiplier for the number of branches (at least one branch)
+        depth: Levels below each branch (1 = branches hold the leaves)
+        fanout: Children per inner node
+        formula_density: Share of renewable generation rows backed by a formula
+        if_share: Share of those formulas written as IF(...) formulas
+        cross_share: Share of Verbrauch leaves calculated from renewable and
+            LandUse values
+        seed: Random seed for values and choices (same seed -> same dataset)
+        clear: Delete existing LandUse/RenewableData/VerbrauchData/WSData rows
+            and the Formula rows with generated keys first
+
+    Returns:
+        dict with row counts per table, formula counts and the generated
+        formula keys
+    """
+    if depth < 1 or fanout < 1:
+        raise ValueError("depth and fanout must be at least 1")
+    rng = random.Random(seed)
+    branches = max(1, int(round(BRANCHES_PER_SCALE * scale)))
+
+    formulas = {}
+    if_formulas = 0
+    with transaction.atomic():
+        if clear:
+            LandUse.objects.all().delete()
+            RenewableData.objects.all().delete()
+            VerbrauchData.objects.all().delete()
+            WSData.objects.all().delete()
+
+        root = LandUse.objects.create(code="LU_0", name="Synthetic total")
+        landuse = _landuse_tree(rng, root, branches, depth, fanout)
+        # Tree codes without the LU_ prefix (root excluded)
+        codes = sorted(
+            (code[3:] for code in landuse if code != root.code), key=lambda c: [int(p) for p in c.split(".")]
+        )
+        children = {}
+        for code in codes:
+            if "." in code:
+                children.setdefault(code.rsplit(".", 1)[0], []).append(code)
+        leaves = [code for code in codes if code not in children]
+
+        renewables = []
+        generation_codes = {}
+        plain_generation = []
+        for leaf in leaves:
+            yield_value = rng.uniform(0.5, 5)
+            branch = leaf.split(".")[0]
+            renewables.append(RenewableData(
+                category=f"Branch {branch}", code=f"{leaf}.1", name=f"Yield {leaf}", unit="MWh/ha",
+                status_value=yield_value, target_value=yield_value, is_fixed=True, parent_code=leaf,
+            ))
+            generation = RenewableData(
+                category=f"Branch {branch}", code=f"{leaf}.2", name=f"Generation {leaf}", unit="GWh/a",
+                parent_code=leaf,
+            )
+            if rng.random() < formula_density:
+                expression = f"LandUse_{leaf} * {leaf}.1 / 1000"
+                if rng.random() < if_share:
+                    expression = f"IF(VerbrauchData_{leaf} > {leaf}.1; {expression}; 0)"
+                    if_formulas += 1
+                else:
+                    plain_generation.append(generation.code)
+                generation.formula = expression
+                generation.is_fixed = False
+                formulas[generation.code] = ("renewable", expression)
+            else:
+                plain_generation.append(generation.code)
+                area = landuse[f"LU_{leaf}"]
+                generation.status_value = area.status_ha * yield_value / 1000
+                generation.target_value = area.target_ha * yield_value / 1000
+            renewables.append(generation)
+            generation_codes.setdefault(branch, []).append(generation.code)
+        for branch in (code for code in codes if "." not in code):
+            expression = " + ".join(generation_codes[branch]) + f" - VerbrauchData_{branch} * 0.01"
+            formulas[f"{branch}.9"] = ("renewable", expression)
+            renewables.append(RenewableData(
+                category=f"Branch {branch}", code=f"{branch}.9", name=f"Net generation {branch}", unit="GWh/a",
+                formula=expression, is_fixed=False, parent_code=branch,
+            ))
+        # Real renewable codes read by bilanz and the WS diagram: a share of a few
+        # generation rows (without IF, which may stay empty in a full recalc)
+        generated = {row.code for row in renewables}
+        generation_rows = plain_generation or [
+            code for branch_codes in generation_codes.values() for code in branch_codes
+        ]
+        for code in dict.fromkeys(BILANZ_RENEWABLE_CODES + WS_RENEWABLE_CODES):
+            if code in generated:
+                continue
+            sources = rng.sample(generation_rows, min(3, len(generation_rows)))
+            expression = f"({' + '.join(sources)}) * {rng.uniform(0.1, 0.5):.3f}"
+            formulas[code] = ("renewable", expression)
+            renewables.append(RenewableData(
+                category="Real codes", code=code, name=f"Real code {code}", unit="GWh/a",
+                formula=expression, is_fixed=False,
+            ))
+        RenewableData.objects.bulk_create(renewables)
+
+        verbrauch = []
+        cross_formulas = 0
+        for code in codes:
+            row = VerbrauchData(code=code, category=f"Use {code}", unit="GWh/a")
+            if code in children:
+                row.is_calculated = True
+                formulas[f"V_{code}"] = ("verbrauch", " + ".join(f"Verbrauch_{kid}" for kid in children[code]))
+            elif rng.random() < cross_share:
+                row.is_calculated = True
+                formulas[f"V_{code}"] = ("verbrauch", f"Renewable_{code}.2 * 0.5 + LandUse_{code} / 1000")
+                cross_formulas += 1
+            else:
+                row.status = rng.uniform(10, 1000)
+                row.ziel = row.status * rng.uniform(0.5, 1.1)
+            verbrauch.append(row)
+        # Real Verbrauch codes read by bilanz and the WS diagram
+        for code in dict.fromkeys(BILANZ_VERBRAUCH_CODES + WS_VERBRAUCH_CODES):
+            if code not in codes:
+                status = rng.uniform(10, 100)
+                verbrauch.append(VerbrauchData(
+                    code=code, category=f"Real code {code}", unit="GWh/a", status=status,
+                    ziel=status * rng.uniform(0.5, 1.1),
+                ))
+        VerbrauchData.objects.bulk_create(verbrauch)
+        ws_days = [] if WSData.objects.exists() else WSData.objects.bulk_create(_ws_days(rng))
+
+        Formula.objects.filter(key__in=formulas).delete()
+        Formula.objects.bulk_create(
+            Formula(key=key, category=category, expression=expression, description="Synthetic formula")
+            for key, (category, expression) in formulas.items()
+        )
+        # bulk_create() sends no post_save signals
+        bump_data_version("synthetic_dataset")
+
+    return {
+        "landuse": len(landuse),
+        "verbrauch": len(verbrauch),
+        "renewable": len(renewables),
+        "ws": len(ws_days),
+        "formulas": len(formulas),
+        "if_formulas": if_formulas,
+        "cross_formulas": cross_formulas,
+        "formula_keys": sorted(formulas),
+    }
@@ -27,8 +27,12 @@ urlpatterns = [
     # path('usecase-diagram/', views.usecase_diagram, name='usecase_diagram'),  # Disabled - view not implemented
     
     # API Endpoints
-    path('api/update-user-percent/', views.update_user_percent, name='update_user_percent'),
+    path('api/update-user-percent/', views.update_user_percent_json, name='update_user_percent'),
     path('api/update/<str:code>/', views.update_user_percent, name='update_user_percent_code'),
     path('api/save-all-inputs/', views.save_all_user_inputs, name='save_all_inputs'),
     path('api/run-full-recalc/', views.run_full_recalc_view, name='run_full_recalc'),
+    path('api/batch-edit/', views.batch_edit_view, name='batch_edit'),
+    path('api/jobs/<int:job_id>/', views.job_status_view, name='job_status'),
+    path('api/data-version/', views.data_version_view, name='data_version'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
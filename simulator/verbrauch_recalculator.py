@@ -1,9 +1,11 @@
 import logging
 from collections import defaultdict
-from typing import Optional, List
+from typing import Dict, List, Optional, Tuple
 
 from django.db import transaction
 
+from simulator.cascade_trace import trace_step
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,12 +17,20 @@ def _hierarchy_depth(code: str) -> int:
 ALWAYS_RECALC_CODES = {"1"}  # top-level rollups that should be recalculated even if not flagged
 
 
-def recalc_all_verbrauch(trigger_code: Optional[str] = None) -> List[str]:
+def recalc_all_verbrauch(
+    trigger_code: Optional[str] = None,
+    propagate_renewables: bool = True,
+    values: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+) -> List[str]:
     """
     Recalculate all calculated VerbrauchData rows in dependency-safe order.
 
     - Processes deeper hierarchy items first so parents see fresh child values.
     - Saves only when values change.
+    - Propagates to RenewableData dependents unless propagate_renewables is
+      False (callers that recalculate renewables themselves, e.g. batch edits).
+    - Fills ``values`` (when given) with {code: (status, ziel)} of every row
+      as computed by this pass, before the renewable propagation.
     - Returns list of codes that were updated.
     """
     # Local import to avoid circular dependency
@@ -41,42 +51,48 @@ def recalc_all_verbrauch(trigger_code: Optional[str] = None) -> List[str]:
             ):
                 continue
 
-            new_status = item.status
-            new_ziel = item.ziel
-
-            try:
-                if item.status_calculated or item.is_calculated or item.code in ALWAYS_RECALC_CODES:
-                    new_status = item.calculate_value()
-                if item.ziel_calculated or item.is_calculated or item.code in ALWAYS_RECALC_CODES:
-                    new_ziel = item.calculate_ziel_value()
-            except Exception as exc:  # pragma: no cover - defensive logging
-                logger.warning(
-                    "Verbrauch recalculation failed",
-                    extra={
-                        "eventType": "validation",
-                        "context": {
-                            "code": item.code,
-                            "trigger_code": trigger_code,
+            with trace_step(item.code, trigger_code or "recalc_all_verbrauch", item.status, item.ziel) as step:
+                new_status = item.status
+                new_ziel = item.ziel
+
+                try:
+                    if item.status_calculated or item.is_calculated or item.code in ALWAYS_RECALC_CODES:
+                        new_status = item.calculate_value()
+                    if item.ziel_calculated or item.is_calculated or item.code in ALWAYS_RECALC_CODES:
+                        new_ziel = item.calculate_ziel_value()
+                    step.evaluated(new_status, new_ziel)
+                except Exception as exc:  # pragma: no cover - defensive logging
+                    logger.warning(
+                        "Verbrauch recalculation failed",
+                        extra={
+                            "eventType": "validation",
+                            "context": {
+                                "code": item.code,
+                                "trigger_code": trigger_code,
+                            },
                         },
-                    },
-                    exc_info=exc,
-                )
-                continue
-
-            changed = False
-            if new_status is not None and new_status != item.status:
-                item.status = new_status
-                changed = True
-            if new_ziel is not None and new_ziel != item.ziel:
-                item.ziel = new_ziel
-                changed = True
-
-            if changed:
-                item.save(skip_cascade=True, skip_recalc=True)
-                updated_codes.append(item.code)
+                        exc_info=exc,
+                    )
+                    continue
+
+                changed = False
+                if new_status is not None and new_status != item.status:
+                    item.status = new_status
+                    changed = True
+                if new_ziel is not None and new_ziel != item.ziel:
+                    item.ziel = new_ziel
+                    changed = True
+
+                if changed:
+                    step.wrote()
+                    item.save(skip_cascade=True, skip_recalc=True)
+                    updated_codes.append(item.code)
+
+        if values is not None:
+            values.update((item.code, (item.status, item.ziel)) for item in items)
 
         # After status/ziel updates, propagate to any RenewableData dependents once
-        for code in updated_codes:
+        for code in updated_codes if propagate_renewables else ():
             try:
                 item = VerbrauchData.objects.get(code=code)
                 item._recalculate_renewable_dependents()
@@ -1,21 +1,31 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 import json
-import pandas as pd
 import os
-from .models import LandUse, RenewableData, VerbrauchData, CalculationRun
+from .models import LandUse, RenewableData, VerbrauchData, CalculationJob, CalculationRun
 from .calculations import SolarCalculationService, SolarTargetCalculationService
-from .recalc_service import run_full_recalc, recalc_all_renewables_full
 from simulator.verbrauch_recalculator import recalc_all_verbrauch
-from simulator.ws_models import WSData
-from simulator.goal_seek import goal_seek
-from simulator.signals import compute_ws_diagram_reference, recalculate_ws_data
+from simulator.balancing import BALANCE_DRIVERS
+from simulator.batch_edit import EDITABLE_FIELDS, apply_batch_edit
+from simulator.cascade_trace import persisted_trace
+from simulator.data_version import (
+    etag_for_request,
+    get_data_version,
+    last_modified_for_request,
+)
+from simulator.jobs import enqueue_job, job_status
+from simulator.metrics import render as render_metrics
+from simulator.recalc_queue import recalc_queue
+from simulator.snapshots import load_snapshot, verbrauch_display_rows
+from calculation_engine.annual_electricity import calculate_annual_electricity
 from calculation_engine.bilanz_engine import calculate_bilanz_data, get_renewable_value
 
 # =============================================================================
@@ -142,7 +152,7 @@ def calculate_percentages(landuse):
 def landuse_list(request):
     """Display all land use data with calculations done in web app"""
     landuses = LandUse.objects.all().order_by('code')
-    latest_run = CalculationRun.objects.first()
+    latest_run = CalculationRun.objects.filter(snapshot__isnull=False).first()
     
     # Add calculations for each record (web app layer, not database)
     landuse_data = []
@@ -183,12 +193,13 @@ def natural_sort_key(code):
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', str(code))]
 
 @login_required
+@condition(etag_func=etag_for_request, last_modified_func=last_modified_for_request)
 def renewable_list(request):
     """Display all renewable energy data with hierarchical structure - using dynamic calculations"""
     
     # Get all renewables from database
     renewables = list(RenewableData.objects.all())
-    latest_run = CalculationRun.objects.first()
+    latest_run = CalculationRun.objects.filter(snapshot__isnull=False).first()
     run_id = request.GET.get("run_id")
     # Sort using natural sorting to get proper order: 1, 2, 3, ... 9, 10, 10.1
     renewables.sort(key=lambda x: natural_sort_key(x.code))
@@ -287,159 +298,19 @@ def renewable_list(request):
     return render(request, 'simulator/renewable_list.html', context)
 
 @login_required
+@condition(etag_func=etag_for_request, last_modified_func=last_modified_for_request)
 def annual_electricity_view(request):
     """Annual electricity section with dynamic renewable data"""
-    
-    # Prefer TARGET (Ziel) values for the diagram; fall back to status when target is missing/zero
-    def get_renewable_status_or_target(code):
-        try:
-            renewable = RenewableData.objects.get(code=code)
-            status_val = renewable.status_value
-            target_val = renewable.target_value
-            
-            if target_val not in (None, 0, 0.0):
-                return float(target_val)
-            if status_val is not None:
-                return float(status_val)
-            return 0
-        except RenewableData.DoesNotExist:
-            return 0
-    
-    # Backward compatibility helper: target fallback
-    def get_renewable_target(code):
-        return get_renewable_status_or_target(code)
-    
-    # ==================================================================================
-    # STEP 1: Calculate base renewable values (K, J, L, S, M)
-    # ==================================================================================
-    # Calculate PV (K) = 1.1.2.1.2 + 1.2.1.2
-    pv_value = get_renewable_target('1.1.2.1.2') + get_renewable_target('1.2.1.2')
-    
-    # Calculate Wind (J) = 2.1.1.2.2 + 2.2.1.2
-    wind_value = get_renewable_target('2.1.1.2.2') + get_renewable_target('2.2.1.2')
-    
-    # Biomass (S) = 4.4.1
-    bio_value = get_renewable_target('4.4.1')
-    
-    # Hydro + Geothermal (L) = 3.1.1.2
-    hydro_value = get_renewable_target('3.1.1.2')
-    
-    # Calculate M total (PV + Wind + Hydro ONLY, Bio is separate)
-    m_total = pv_value + wind_value + hydro_value
-    
-    # ==================================================================================
-    # STEP 2: Calculate flows from M
-    # ==================================================================================
-    # Elektrolyse "nach Angebot" (branch from M) = 9.2.1.5.2
-    ely_branch_value = get_renewable_target('9.2.1.5.2')
-    
-    # Gasspeicher Direktverbr = 9.2.1.5.2 * 65% (hydrogen production efficiency)
-    gasspeicher_direkt = ely_branch_value * 0.65
-    
-    # N value = M - Elektrolyse Power to Gas
-    n_value = m_total - ely_branch_value
-    
-    # ==================================================================================
-    # STEP 3: Calculate flows from N (using renewable data as base)
-    # ==================================================================================
-    # Q (Abregelung) = 9.3.4
-    n_input_branch = get_renewable_status_or_target('9.3.4')
-    q_abregelung = n_input_branch
-    
-    # Elektrolyse Stromspeicher (Überschuss) = 9.3.1
-    n_output_branch = get_renewable_status_or_target('9.3.1')
-    
-    # U (Gasspeicher Strom) = Elektrolyse Stromspeicher * 65%
-    gas_storage = n_output_branch * 0.65
-    
-    # T value = U - 160 (storage offset)
-    t_value = gas_storage - 160
-    
-    # T output (Rückverstromung) = T * 58.5% (reconversion efficiency)
-    t_output = t_value * 0.585
-    
-    # O value = N - Q - Elektrolyse Stromspeicher
-    n_to_right = n_value - q_abregelung - n_output_branch
-    
-    # ==================================================================================
-    # STEP 4: Override with WS row 366 balanced values if available
-    # ==================================================================================
-    try:
-        ws_row_366 = WSData.objects.get(tag_im_jahr=366)
-        
-        # If WS row 366 has balanced values, use them
-        if ws_row_366.abregelung_z is not None and ws_row_366.abregelung_z > 0:
-            q_abregelung = ws_row_366.abregelung_z
-            n_input_branch = q_abregelung
-        
-        if ws_row_366.einspeich is not None and ws_row_366.einspeich > 0:
-            # ElektrolyseStromspeicher (Überschuss) = Einspeich / 65%
-            n_output_branch = ws_row_366.einspeich / 0.65
-            # U (Gasspeicher Strom) = Einspeich (already at 65%)
-            gas_storage = ws_row_366.einspeich
-            # T value = U - 160
-            t_value = gas_storage - 160
-        
-        if ws_row_366.ausspeich_rueckverstr is not None and ws_row_366.ausspeich_rueckverstr > 0:
-            # T output comes from WS daily balance (Ausspeich. Rückverstr. * 58.5%)
-            t_output = ws_row_366.ausspeich_rueckverstr * 0.585
-        
-        # Recalculate O with updated values
-        n_to_right = n_value - q_abregelung - n_output_branch
-        
-    except WSData.DoesNotExist:
-        pass
-    
-    # ==================================================================================
-    # STEP 5: Calculate final output
-    # ==================================================================================
-    # Final Stromnetz zum Endverbrauch = T_output + O + S(Bio)
-    final_stromnetz = t_output + n_to_right + bio_value
-    
-    # Calculate H2 values
-    h2_offer = ely_branch_value * 0.65  # H2 from "nach Angebot"
-    h2_surplus = n_output_branch * 0.65  # H2 from "Überschuss"
-    
+    # Render from the latest (or selected) CalculationRun snapshot; live calculation only without one
+    run, snapshot = load_snapshot(request.GET.get("run_id"))
+    flows = snapshot["annual_electricity"] if snapshot else calculate_annual_electricity()
+
     context = {
         'current_section': 'annual_electricity', 
         'title': 'Annual Electricity Analysis',
-        # Generation sources
-        'bio': round(bio_value, 2),
-        'pv': round(pv_value, 2),
-        'wind': round(wind_value, 2),
-        'hydro': round(hydro_value, 2),
-        # M node
-        'm_total': round(m_total, 2),
-        # Elektrolyse branch from M (9.2.1.5.2)
-        'ely_branch_value': round(ely_branch_value, 2),
-        'ely_offer': round(ely_branch_value, 2),  # Same as ely_branch_value
-        # Gasspeicher Direktverbr
-        'gasspeicher_direkt': round(gasspeicher_direkt, 2),
-        # N node value
-        'n_value': round(n_value, 2),
-        # N node branches
-        'q_abregelung': round(q_abregelung, 2),
-        'n_input_branch': round(n_input_branch, 2),
-        'n_output_branch': round(n_output_branch, 2),
-        'ely_surplus': round(n_output_branch, 2),  # Elektrolyse Stromspeicher
-        # O value (flow to right)
-        'n_to_right': round(n_to_right, 2),
-        # H2 values
-        'h2_offer': round(h2_offer, 2),  # H2 from nach Angebot
-        'h2_surplus': round(h2_surplus, 2),  # H2 from Überschuss
-        # Storage values
-        'gas_storage': round(gas_storage, 2),  # U (Gasspeicher Strom)
-        't_value': round(t_value, 2),  # T (before reconversion)
-        't_output': round(t_output, 2),  # T output (after 58.5% reconversion)
-        # Final output
-        'final_stromnetz': round(final_stromnetz, 2),  # Stromnetz zum Endverbrauch
-        # Legacy/compatibility values
-        'n_input': round(n_input_branch, 2),
-        'n_output': round(n_output_branch, 2),
-        'h2_to_reconv': round(t_value, 2),
-        'reconversion': round(t_output, 2),
-        'final_consumption': round(final_stromnetz, 2),
+        'snapshot_run': run,
     }
+    context.update(flows)
     return render(request, 'simulator/annual_electricity.html', context)
 
 
@@ -706,21 +577,17 @@ def annual_electricity_view(request):
     }
     return render(request, 'simulator/renewable_list.html', context)
 
-@login_required 
+@login_required
+@condition(etag_func=etag_for_request, last_modified_func=last_modified_for_request)
 def cockpit_view(request):
     """
     Cockpit dashboard with dynamic bar charts showing energy balance by sector.
     All data comes from bilanz_engine calculation module.
     """
-    # Import the bilanz calculation engine
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from calculation_engine.bilanz_engine import calculate_bilanz_data
-    
     try:
-        # Get all bilanz data from the calculation engine (fully dynamic)
-        bilanz_data = calculate_bilanz_data()
+        # Bilanz data from the latest (or selected) run snapshot; live calculation only without one
+        run, snapshot = load_snapshot(request.GET.get("run_id"))
+        bilanz_data = snapshot["bilanz"] if snapshot else calculate_bilanz_data()
         
         # Helper function to safely get nested values
         def safe_get(data, *keys, default=0):
@@ -736,6 +603,7 @@ def cockpit_view(request):
         # Extract and flatten data for template
         context = {
             'current_section': 'cockpit',
+            'snapshot_run': run,
             
             # STATUS VALUES (current)
             # Total consumption by sector
@@ -951,11 +819,10 @@ def cockpit_view_old(request):
     }
     return render(request, 'simulator/cockpit.html', context)
 
-@login_required
 @login_required
 @require_http_methods(["POST"])
-def update_user_percent(request):
-    """API endpoint to save user percentage input for land use data"""
+def update_user_percent_json(request):
+    """API endpoint to save user percentage input for land use data (JSON body with code)"""
     try:
         data = json.loads(request.body)
         code = data.get('code')
@@ -976,7 +843,8 @@ def update_user_percent(request):
             except (ValueError, TypeError):
                 return JsonResponse({'success': False, 'error': 'Invalid percentage value'})
         
-        landuse.save()
+        with persisted_trace("update_user_percent", triggered_by=request.user.get_username()):
+            landuse.save()
         
         return JsonResponse({
             'success': True, 
@@ -1000,27 +868,13 @@ def save_all_user_inputs(request):
         data = json.loads(request.body)
         user_inputs = data.get('user_inputs', {})
         
-        saved_count = 0
-        errors = []
-        
-        for code, percent in user_inputs.items():
-            try:
-                landuse = LandUse.objects.get(code=code)
-                
-                if percent == '' or percent is None:
-                    landuse.user_percent = None
-                else:
-                    landuse.user_percent = float(percent)
-                
-                landuse.save()
-                saved_count += 1
-                
-            except LandUse.DoesNotExist:
-                errors.append(f'Code {code} not found')
-            except (ValueError, TypeError):
-                errors.append(f'Invalid value for {code}: {percent}')
-            except Exception as e:
-                errors.append(f'Error saving {code}: {str(e)}')
+        # One batch edit = one recalculation for all inputs (no per-row save cascades)
+        with persisted_trace("save_all_user_inputs", triggered_by=request.user.get_username()):
+            result = apply_batch_edit(
+                {'landuse': {code: {'user_percent': percent} for code, percent in user_inputs.items()}}
+            )
+        saved_count = result['saved']['landuse']
+        errors = result['errors']
         
         return JsonResponse({
             'success': True,
@@ -1035,54 +889,6 @@ def save_all_user_inputs(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
-# PROPER RECURSIVE CASCADE LOGIC - EXACT IMPLEMENTATION
-def update_downwards(node, new_percent, total_area):
-    """Recursive downward update: parent drives children proportionally"""
-    node.user_percent = new_percent
-    node.user_ha = total_area * (new_percent / 100)
-    node.save()
-    
-    print(f"📊 Updated {node.code}: {new_percent}% = {node.user_ha:.2f}ha")
-
-    children = node.children.all()
-    if not children:
-        return
-
-    total_target = sum(child.target_ha for child in children)
-    for child in children:
-        ratio = child.target_ha / total_target if total_target > 0 else 0
-        child_percent = (node.user_ha * ratio / total_area) * 100
-        print(f"🔄 Cascading to {child.code}: ratio={ratio:.3f}, new_percent={child_percent:.2f}%")
-        update_downwards(child, child_percent, total_area)
-
-
-def update_upwards(node, total_area):
-    """Recursive upward update: children drive parent by summing"""
-    parent = node.parent
-    if not parent:
-        return
-    
-    parent.user_ha = sum(c.user_ha for c in parent.children.all())
-    parent.user_percent = (parent.user_ha / total_area) * 100
-    parent.save()
-    
-    print(f"⬆️ Updated parent {parent.code}: {parent.user_percent:.2f}% = {parent.user_ha:.2f}ha (sum of children)")
-
-    update_upwards(parent, total_area)  # climb upwards
-
-
-# MASTER UPDATE FUNCTION - EXACT IMPLEMENTATION
-def update_node(node, new_percent, total_area):
-    """Master function: determines update direction based on node type"""
-    if node.children.exists():  # parent node changed
-        update_downwards(node, new_percent, total_area)
-    else:  # leaf node changed
-        node.user_percent = new_percent
-        node.user_ha = total_area * (new_percent / 100)
-        node.save()
-        update_upwards(node, total_area)
-
-
 @csrf_exempt  
 @require_http_methods(["POST"])
 def update_user_percent(request, code):
@@ -1091,16 +897,12 @@ def update_user_percent(request, code):
         node = get_object_or_404(LandUse, code=code)
         new_percent = float(request.POST.get("user_percent", 0))
         
-        # Get total area from root node
-        root_node = LandUse.objects.get(code="0")
-        total_area = root_node.status_ha
-        
         print(f"\n{'='*50}")
         print(f"🚀 API CALL: Updating {code} = {new_percent}%")
-        print(f"📍 Total area: {total_area:.2f}ha")
         
-        # Use master update function
-        update_node(node, new_percent, total_area)
+        # Queue the slider edit; the batch plans the hierarchy cascade (parent
+        # -> children by target, leaf -> ancestors by sum) on all merged edits
+        pending = recalc_queue.submit({'landuse': {code: {'user_percent': new_percent}}}, cascade=[code])
         
         # Determine message based on node type
         if node.children.exists():
@@ -1115,7 +917,10 @@ def update_user_percent(request, code):
             'success': True, 
             'message': message,
             'code': code,
-            'user_percent': new_percent
+            'user_percent': new_percent,
+            'queued': True,
+            'pending': pending,
+            'data_version': get_data_version()[0],
         })
         
     except LandUse.DoesNotExist:
@@ -1126,45 +931,29 @@ def update_user_percent(request, code):
         print(f"❌ Error updating {code}: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)})
 
+@condition(etag_func=etag_for_request, last_modified_func=last_modified_for_request)
 def verbrauch_view(request):
     """Energy Consumption Data (Verbrauch) - Load from database"""
-    from .models import VerbrauchData
+    from django.utils.safestring import mark_safe
     
-    # Get all verbrauch data from database
-    verbrauch_data = VerbrauchData.objects.all()
+    # Display rows (calculated values evaluated) from the latest (or selected) run snapshot;
+    # only computed from live rows when no snapshot exists
+    run, snapshot = load_snapshot(request.GET.get("run_id"))
+    rows = snapshot["verbrauch_rows"] if snapshot else verbrauch_display_rows()
     
     # Convert to list of dictionaries with natural sorting
     temp_data = []
-    for item in verbrauch_data:
-        # Only show calculated values in webapp, not database values
-        if item.is_calculated:
-            # For calculated items, use separate calculations for status and ziel
-            calculated_status = item.calculate_value()  # Uses status fields
-            calculated_ziel = item.calculate_ziel_value()  # Uses ziel fields
-            display_status = calculated_status
-            display_ziel = calculated_ziel
-        else:
-            # For fixed items, show database values
-            display_status = item.status
-            display_ziel = item.ziel
+    for row in rows:
+        item = dict(row)
         
         # Special case: FC-Traktion alternative entries show "Aktiv" or "(Passiv)" based on user_percent
-        if "Alternativ zur" in item.category and "Brennstoffzellen (FC)" in item.category:
-            from django.utils.safestring import mark_safe
-            if item.user_percent == 100.0:
-                display_ziel = mark_safe('<span style="color: blue; font-weight: bold;">Aktiv</span>')
+        if "Alternativ zur" in (item['category'] or '') and "Brennstoffzellen (FC)" in item['category']:
+            if item['user_percent'] == 100.0:
+                item['ziel'] = mark_safe('<span style="color: blue; font-weight: bold;">Aktiv</span>')
             else:
-                display_ziel = mark_safe('<span style="color: green; font-weight: bold;">(Passiv)</span>')
+                item['ziel'] = mark_safe('<span style="color: green; font-weight: bold;">(Passiv)</span>')
         
-        temp_data.append({
-            'code': item.code,
-            'category': item.category,
-            'unit': item.unit,
-            'status': display_status,
-            'ziel': display_ziel,
-            'user_percent': item.user_percent,
-            'is_calculated': item.is_calculated,
-        })
+        temp_data.append(item)
     
     # Apply natural sorting (same as renewable energy)
     def natural_sort_key(item):
@@ -1216,7 +1005,7 @@ def verbrauch_view(request):
         item['is_section_header'] = False
         data.append(item)
     
-    return render(request, 'simulator/verbrauch.html', {"data": data})
+    return render(request, 'simulator/verbrauch.html', {"data": data, "snapshot_run": run})
 
 
 def gebaeudewaerme_view(request):
@@ -1271,105 +1060,52 @@ def gebaeudewaerme_view(request):
 
 def smard_solar_wind(request):
     """SMARD data visualization for solar and wind energy"""
-    # 1️⃣ Find your CSV file
-    file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'Actual_generation_202302010000_202401010000_Hour.csv')
-
-    # 2️⃣ Read the CSV (SMARD format)
-    df = pd.read_csv(file_path, sep=';', decimal=',')
-
-    # 3️⃣ Clean and select energy sources
-    df = df.replace('-', 0)
-    
-    # Convert German number format to float
-    def convert_to_float(value):
-        if value == 0 or value == '0':  # Already replaced '-' with 0
-            return 0.0
-        if isinstance(value, str):
-            # German format: 1.721,00 -> English format: 1721.00
-            # Remove thousand separators (dots) and replace decimal comma with dot
-            value = value.replace('.', '').replace(',', '.')
-            return float(value)
-        return float(value)
-    
-    # Convert all energy columns to float
-    energy_columns = [
-        'Photovoltaics [MWh] Calculated resolutions',
-        'Wind onshore [MWh] Calculated resolutions', 
-        'Wind offshore [MWh] Calculated resolutions',
-        'Hydropower [MWh] Calculated resolutions',
-        'Biomass [MWh] Calculated resolutions',
-        'Nuclear [MWh] Calculated resolutions',
-        'Lignite [MWh] Calculated resolutions',
-        'Hard coal [MWh] Calculated resolutions',
-        'Fossil gas [MWh] Calculated resolutions'
-    ]
-    
-    for col in energy_columns:
-        df[col] = df[col].apply(convert_to_float)
-
-    # Calculate combined values
-    df['wind_total_MWh'] = df['Wind onshore [MWh] Calculated resolutions'] + df['Wind offshore [MWh] Calculated resolutions']
-    df['total_demand_MWh'] = (df['Photovoltaics [MWh] Calculated resolutions'] + 
-                              df['wind_total_MWh'] + 
-                              df['Hydropower [MWh] Calculated resolutions'] +
-                              df['Biomass [MWh] Calculated resolutions'] +
-                              df['Nuclear [MWh] Calculated resolutions'] +
-                              df['Lignite [MWh] Calculated resolutions'] +
-                              df['Hard coal [MWh] Calculated resolutions'] +
-                              df['Fossil gas [MWh] Calculated resolutions'])
-
-    # 4️⃣ Group by day and sum hourly values to get daily totals (MWh/day)
-    df['Date'] = pd.to_datetime(df['Start date'])
-    df['day'] = df['Date'].dt.date
-    
-    daily = df.groupby('day').agg({
-        'Photovoltaics [MWh] Calculated resolutions': 'sum',
-        'wind_total_MWh': 'sum',
-        'Hydropower [MWh] Calculated resolutions': 'sum',
-        'Biomass [MWh] Calculated resolutions': 'sum',
-        'total_demand_MWh': 'sum'
-    }).reset_index()
-
-    # 5️⃣ Rename columns with proper units and SMARD designation
-    daily = daily.rename(columns={
-        'day': 'date',
-        'Photovoltaics [MWh] Calculated resolutions': 'solar_smard_MWh',
-        'wind_total_MWh': 'wind_smard_MWh',
-        'Hydropower [MWh] Calculated resolutions': 'hydro_MWh',
-        'Biomass [MWh] Calculated resolutions': 'bio_MWh',
-        'total_demand_MWh': 'demand_MWh'
+    # numpy/pandas and the curve engines are only needed here; importing them
+    # lazily keeps them out of worker and management command startup
+    import numpy as np
+    import pandas as pd
+    from calculation_engine.duration_curve import build_scenario_batch, compute_duration_curves, summarize
+    from calculation_engine.load_profiles import daily_demand_shapes
+    from calculation_engine.smard_profiles import load_smard_profiles, normalized_shape
+
+    # 1️⃣ Load the SMARD profiles (parsed once per process, daily sums in MWh)
+    profiles = load_smard_profiles()
+    smard_daily = profiles['daily']
+
+    daily = pd.DataFrame({
+        'date': profiles['dates'],
+        'solar_smard_MWh': smard_daily['solar'],
+        'wind_smard_MWh': smard_daily['wind'],
+        'hydro_MWh': smard_daily['hydro'],
+        'bio_MWh': smard_daily['bio'],
+        'demand_MWh': smard_daily['total'],
     })
     
     # PART A — Build the scenario generation curve from SMARD + totals
-    # 1) Data is already aggregated to daily
-    
     # 2) Create the shape (normalize) - per-unit curves
     # Using sum (not max) to keep energy-weighted shape
-    solar_total = daily['solar_smard_MWh'].sum()
-    wind_total = daily['wind_smard_MWh'].sum()
-    hydro_total = daily['hydro_MWh'].sum()
-    bio_total = daily['bio_MWh'].sum()
-    demand_total = daily['demand_MWh'].sum()
-    
-    # Create normalized per-unit curves
-    daily['solar_pu'] = daily['solar_smard_MWh'] / solar_total if solar_total > 0 else 0
-    daily['wind_pu'] = daily['wind_smard_MWh'] / wind_total if wind_total > 0 else 0
-    daily['hydro_pu'] = daily['hydro_MWh'] / hydro_total if hydro_total > 0 else 0
-    daily['bio_pu'] = daily['bio_MWh'] / bio_total if bio_total > 0 else 0
-    daily['demand_pu'] = daily['demand_MWh'] / demand_total if demand_total > 0 else 0
+    shapes = {
+        'solar': normalized_shape(smard_daily['solar']),
+        'wind': normalized_shape(smard_daily['wind']),
+        'hydro': np.full(len(daily), 1.0 / 365),  # Constant daily
+        'bio': normalized_shape(smard_daily['bio']),  # Follow historical pattern
+    }
+    daily['solar_pu'] = shapes['solar']
+    daily['wind_pu'] = shapes['wind']
+    daily['hydro_pu'] = normalized_shape(smard_daily['hydro'])
+    daily['bio_pu'] = shapes['bio']
+    daily['demand_pu'] = normalized_shape(smard_daily['total'])
     
     # Add totals for reference
-    daily['solar_total_GWh'] = solar_total / 1000  # Convert to GWh
-    daily['wind_total_GWh'] = wind_total / 1000
-    daily['hydro_total_GWh'] = hydro_total / 1000
-    daily['bio_total_GWh'] = bio_total / 1000
-    daily['demand_total_GWh'] = demand_total / 1000
+    daily['solar_total_GWh'] = smard_daily['solar'].sum() / 1000  # Convert to GWh
+    daily['wind_total_GWh'] = smard_daily['wind'].sum() / 1000
+    daily['hydro_total_GWh'] = smard_daily['hydro'].sum() / 1000
+    daily['bio_total_GWh'] = smard_daily['bio'].sum() / 1000
+    daily['demand_total_GWh'] = smard_daily['total'].sum() / 1000
     
     # 3) Scale each shape to scenario annual totals (from Renewable data)
     # Get target values from your Renewable data model
     try:
-        from .models import RenewableData
-        
         # Get scenario targets - looking for specific renewable codes
         pv_target_record = RenewableData.objects.filter(code__icontains='solar').first() or \
                           RenewableData.objects.filter(code__icontains='photovoltaic').first() or \
@@ -1398,26 +1134,26 @@ def smard_solar_wind(request):
         Bio_target_GWh = 30.0    # Example target
     
     # Convert annual targets from GWh/a to MWh/a
-    PV_target_MWh = PV_target_GWh * 1000
-    Wind_target_MWh = Wind_target_GWh * 1000  
-    Hydro_target_MWh = Hydro_target_GWh * 1000
-    Bio_target_MWh = Bio_target_GWh * 1000
+    scenario_totals_MWh = {
+        'solar': PV_target_GWh * 1000,
+        'wind': Wind_target_GWh * 1000,
+        'hydro': Hydro_target_GWh * 1000,
+        'bio': Bio_target_GWh * 1000,
+    }
     
     # Distribute targets over the year using the normalized shapes
-    daily['solar_scenario_MWh_day'] = daily['solar_pu'] * PV_target_MWh
-    daily['wind_scenario_MWh_day'] = daily['wind_pu'] * Wind_target_MWh
-    daily['hydro_scenario_MWh_day'] = Hydro_target_MWh / 365  # Constant daily
-    daily['bio_scenario_MWh_day'] = daily['bio_pu'] * Bio_target_MWh  # Follow historical pattern
+    daily['solar_scenario_MWh_day'] = shapes['solar'] * scenario_totals_MWh['solar']
+    daily['wind_scenario_MWh_day'] = shapes['wind'] * scenario_totals_MWh['wind']
+    daily['hydro_scenario_MWh_day'] = shapes['hydro'] * scenario_totals_MWh['hydro']
+    daily['bio_scenario_MWh_day'] = shapes['bio'] * scenario_totals_MWh['bio']
     
     # 4) Sum to total renewable scenario (per day)
-    daily['ren_total_MWh_day'] = (daily['solar_scenario_MWh_day'] + 
-                                  daily['wind_scenario_MWh_day'] + 
-                                  daily['hydro_scenario_MWh_day'] + 
-                                  daily['bio_scenario_MWh_day'])
+    ren_total = build_scenario_batch(shapes, [scenario_totals_MWh])[0]
+    daily['ren_total_MWh_day'] = ren_total
     
     # Quick check: sum(ren_total_MWh_day) ≈ (PV + Wind + Hydro + Bio) targets (in MWh)
-    calculated_total_MWh = daily['ren_total_MWh_day'].sum()
-    expected_total_MWh = PV_target_MWh + Wind_target_MWh + Hydro_target_MWh + Bio_target_MWh
+    calculated_total_MWh = ren_total.sum()
+    expected_total_MWh = sum(scenario_totals_MWh.values())
     daily['calculated_total_GWh'] = calculated_total_MWh / 1000
     daily['expected_total_GWh'] = expected_total_MWh / 1000
     daily['total_check_diff_percent'] = ((calculated_total_MWh - expected_total_MWh) / expected_total_MWh * 100) if expected_total_MWh > 0 else 0
@@ -1428,18 +1164,11 @@ def smard_solar_wind(request):
     daily['Hydro_target_GWh'] = Hydro_target_GWh
     daily['Bio_target_GWh'] = Bio_target_GWh
     
-    # PART B — Create WS.2a "segmentiert" curve (Excel's trick)
-    # 5) Make the segmentiert ordering
-    # Excel WS.2a sorts days by renewable total (highest → lowest)
-    # Create two equally sorted arrays: both sorted descending
-    
-    # Sort renewable generation by descending order (highest first)
-    ren_sorted = daily['ren_total_MWh_day'].sort_values(ascending=False).reset_index(drop=True)
-    
     # Use YOUR ACTUAL DEMAND from VerbrauchData instead of SMARD historical demand
     # Get total electricity consumption from VerbrauchData (Code 5)
+    verbrauch_status_GWh = 0
+    verbrauch_ziel_GWh = 0
     try:
-        from .models import VerbrauchData
         electricity_total_entry = VerbrauchData.objects.filter(code='5').first()  # Total electricity consumption
         
         if electricity_total_entry:
@@ -1451,97 +1180,96 @@ def smard_solar_wind(request):
                 verbrauch_status_GWh = electricity_total_entry.status
                 verbrauch_ziel_GWh = electricity_total_entry.ziel
             
-            # Convert to MWh/a
-            verbrauch_status_MWh_per_year = verbrauch_status_GWh * 1000
-            verbrauch_ziel_MWh_per_year = verbrauch_ziel_GWh * 1000
-            
             print(f"🔌 Using YOUR VERBRAUCH DATA for demand:")
-            print(f"   Status: {verbrauch_status_GWh:.0f} GWh/a = {verbrauch_status_MWh_per_year:.0f} MWh/a")
-            print(f"   Ziel: {verbrauch_ziel_GWh:.0f} GWh/a = {verbrauch_ziel_MWh_per_year:.0f} MWh/a")
-            
-            # Use STATUS demand for current analysis (you can switch to ZIEL if needed)
-            annual_demand_MWh = verbrauch_status_MWh_per_year
-            daily_average_demand_MWh = annual_demand_MWh / 365
+            print(f"   Status: {verbrauch_status_GWh:.0f} GWh/a = {verbrauch_status_GWh * 1000:.0f} MWh/a")
+            print(f"   Ziel: {verbrauch_ziel_GWh:.0f} GWh/a = {verbrauch_ziel_GWh * 1000:.0f} MWh/a")
             
+            # Convert to MWh/a
+            annual_demand_MWh = (verbrauch_status_GWh or 0) * 1000
+            annual_demand_ziel_MWh = (verbrauch_ziel_GWh or 0) * 1000
         else:
             print("⚠️ Could not find VerbrauchData Code 5, using fallback")
-            annual_demand_MWh = 400000 * 1000  # 400 GWh/a fallback
-            daily_average_demand_MWh = annual_demand_MWh / 365
+            annual_demand_MWh = annual_demand_ziel_MWh = 400000 * 1000  # 400 GWh/a fallback
             
     except Exception as e:
         print(f"⚠️ Error getting VerbrauchData: {e}, using fallback")
-        annual_demand_MWh = 400000 * 1000  # 400 GWh/a fallback  
-        daily_average_demand_MWh = annual_demand_MWh / 365
-    
-    # Create demand curve using the historical SMARD demand SHAPE but scaled to YOUR total
-    # This gives us a realistic daily variation pattern scaled to your actual consumption
-    if daily['demand_MWh'].sum() > 0:
-        # Use SMARD shape but scale to your total demand
-        smard_demand_shape = daily['demand_MWh'] / daily['demand_MWh'].sum()  # Normalize SMARD shape
-        daily['verbrauch_demand_MWh'] = smard_demand_shape * annual_demand_MWh  # Scale to your annual total
+        annual_demand_MWh = annual_demand_ziel_MWh = 400000 * 1000  # 400 GWh/a fallback
+    
+    # Create demand curves with the daily shape of the synthesized sector load profiles
+    # (KLIK, Gebäudewärme, Prozesswärme, Mobile from VerbrauchData) on the SMARD days,
+    # scaled to YOUR totals; SMARD total generation shape without sector totals,
+    # constant daily demand if there is no SMARD data either
+    smard_days = np.array(profiles['dates'], dtype='datetime64[D]')
+    smard_year = int(str(smard_days[0])[:4]) if len(smard_days) else None
+    if smard_year is not None:
+        day_index = (smard_days - np.datetime64(f'{smard_year}-01-01')).astype(int)
+        sector_shapes = daily_demand_shapes(year=smard_year, days=day_index)
+        sector_shapes = [sector_shapes['status'], sector_shapes['ziel']]
     else:
-        # Fallback to constant daily demand if no SMARD data
-        daily['verbrauch_demand_MWh'] = daily_average_demand_MWh
-    
-    # Sort YOUR ACTUAL DEMAND by descending order (highest first) - independent of renewables
-    dmd_sorted = daily['verbrauch_demand_MWh'].sort_values(ascending=False).reset_index(drop=True)
+        sector_shapes = [None, None]
+    if smard_daily['total'].sum() > 0:
+        fallback_shape = normalized_shape(smard_daily['total'])
+    else:
+        fallback_shape = np.full(len(daily), 1.0 / len(daily))
+    demand_batch = np.vstack([
+        annual * (shape if shape is not None else fallback_shape)
+        for annual, shape in zip([annual_demand_MWh, annual_demand_ziel_MWh], sector_shapes)
+    ])
+    daily['verbrauch_demand_MWh'] = demand_batch[0]
+    daily['verbrauch_demand_ziel_MWh'] = demand_batch[1]
     
     # Add VerbrauchData totals for reference
-    daily['verbrauch_status_GWh'] = verbrauch_status_GWh if 'verbrauch_status_GWh' in locals() else 0
-    daily['verbrauch_ziel_GWh'] = verbrauch_ziel_GWh if 'verbrauch_ziel_GWh' in locals() else 0
-    daily['annual_demand_check_GWh'] = annual_demand_MWh / 1000 if 'annual_demand_MWh' in locals() else 0
-    
-    # Create segmentiert dataset (chronology removed, sorted pairs)
-    segmentiert_data = pd.DataFrame({
-        'day_rank': range(1, len(ren_sorted) + 1),  # 1 to 365 (or number of days)
-        'ren_sorted_MWh': ren_sorted,
-        'dmd_sorted_MWh': dmd_sorted
-    })
-    
-    # PART C — Compute surplus/deficit & storage flows
-    # 6) Daily surplus in the segmentiert space
-    surplus_sorted = ren_sorted - dmd_sorted
-    
-    # 7) Stromaufnahme (Überschussphasen) — Sum only the positive parts
-    surplus_positive = surplus_sorted[surplus_sorted > 0]  # Filter only positive surplus
-    stromaufnahme_MWh = surplus_positive.sum()  # Sum positive surplus in MWh
-    stromaufnahme_GWh = stromaufnahme_MWh / 1000  # Convert to GWh
+    daily['verbrauch_status_GWh'] = verbrauch_status_GWh
+    daily['verbrauch_ziel_GWh'] = verbrauch_ziel_GWh
+    daily['annual_demand_check_GWh'] = annual_demand_MWh / 1000
+    
+    # PART B/C — WS.2a "segmentiert" curves (Excel's trick) for status and ziel in one call:
+    # generation and demand sorted independently (highest → lowest), surplus per rank,
+    # Stromaufnahme = sum of the positive surplus
+    curves = compute_duration_curves(ren_total, demand_batch, hours_per_step=24.0)
+    summary = summarize(curves, ['status', 'ziel'])
+    status = summary['status']
+    stromaufnahme_MWh = status['surplus_energy']
+    stromaufnahme_GWh = stromaufnahme_MWh / 1000
     
     print(f"📊 STROMAUFNAHME CALCULATION:")
-    print(f"   Positive surplus days: {len(surplus_positive)} out of {len(surplus_sorted)} days")
+    print(f"   Positive surplus days: {status['surplus_steps']} out of {len(daily)} days")
     print(f"   Total surplus energy: {stromaufnahme_MWh:.0f} MWh = {stromaufnahme_GWh:.1f} GWh")
     print(f"🔋 FINAL STROMAUFNAHME VALUE: {stromaufnahme_GWh:.1f} GWh/a")
     
     # Add segmentiert data to daily for template access
     daily['day_rank'] = range(1, len(daily) + 1)
-    daily['ren_sorted_MWh'] = ren_sorted
-    daily['dmd_sorted_MWh'] = dmd_sorted  # This now uses YOUR VerbrauchData
-    daily['surplus_sorted_MWh'] = surplus_sorted
+    daily['ren_sorted_MWh'] = curves['gen_sorted'][0]
+    daily['dmd_sorted_MWh'] = curves['dmd_sorted'][0]  # This now uses YOUR VerbrauchData
+    daily['surplus_sorted_MWh'] = curves['surplus_sorted'][0]
+    daily['dmd_sorted_ziel_MWh'] = curves['dmd_sorted'][1]
+    daily['surplus_sorted_ziel_MWh'] = curves['surplus_sorted'][1]
     
     # Add Stromaufnahme values for template access
     daily['stromaufnahme_MWh'] = stromaufnahme_MWh
     daily['stromaufnahme_GWh'] = stromaufnahme_GWh
-    daily['surplus_days_count'] = len(surplus_positive)
-    daily['total_days_count'] = len(surplus_sorted)
-    daily['surplus_days_percent'] = (len(surplus_positive) / len(surplus_sorted) * 100) if len(surplus_sorted) > 0 else 0
+    daily['surplus_days_count'] = status['surplus_steps']
+    daily['total_days_count'] = len(daily)
+    daily['surplus_days_percent'] = status['surplus_share'] * 100
+    daily['deficit_days_count'] = status['deficit_steps']
+    daily['deficit_GWh'] = status['deficit_energy'] / 1000
+    daily['stromaufnahme_ziel_GWh'] = summary['ziel']['surplus_energy'] / 1000
+    daily['surplus_days_ziel_count'] = summary['ziel']['surplus_steps']
+    daily['deficit_ziel_GWh'] = summary['ziel']['deficit_energy'] / 1000
     
     # Quick verification: total demand should match your VerbrauchData
-    total_demand_check_MWh = daily['verbrauch_demand_MWh'].sum()
+    total_demand_check_MWh = status['demand_total']
     daily['demand_verification_GWh'] = total_demand_check_MWh / 1000
-    daily['demand_difference_percent'] = ((total_demand_check_MWh - annual_demand_MWh) / annual_demand_MWh * 100) if 'annual_demand_MWh' in locals() else 0
+    daily['demand_difference_percent'] = ((total_demand_check_MWh - annual_demand_MWh) / annual_demand_MWh * 100) if annual_demand_MWh else 0
 
     # 6️⃣ Send data to the web page
     data = daily.to_dict(orient='records')
-    
-    # Convert datetime objects to strings for JavaScript
-    for record in data:
-        if 'date' in record:
-            record['date'] = record['date'].strftime('%Y-%m-%d')
 
     return render(request, 'simulator/smard_solar_wind.html', {'data': data})
 
 
 @login_required
+@condition(etag_func=etag_for_request, last_modified_func=last_modified_for_request)
 def bilanz_view(request):
     """
     Bilanz (Balance Sheet) View
@@ -1552,15 +1280,15 @@ def bilanz_view(request):
     using the bilanz_engine calculation module.
     """
     
-    # Import the bilanz calculation engine
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from calculation_engine.bilanz_engine import calculate_bilanz_data
-    
-    # Get all bilanz data from the calculation engine (fully dynamic)
-    bilanz_data = calculate_bilanz_data()
-    bilanz_data['latest_run'] = CalculationRun.objects.first()
+    # Render from the latest (or selected) run snapshot; live calculation only without one
+    run, snapshot = load_snapshot(request.GET.get("run_id"))
+    if snapshot:
+        bilanz_data = dict(snapshot["bilanz"])
+        bilanz_data['latest_run'] = run
+    else:
+        bilanz_data = calculate_bilanz_data()
+        bilanz_data['latest_run'] = CalculationRun.objects.filter(snapshot__isnull=False).first()
+    bilanz_data['snapshot_run'] = run
     
     # Add current section to context
     bilanz_data['current_section'] = 'bilanz'
@@ -1611,20 +1339,22 @@ def update_landuse_percent(request, pk):
                 "message": "Cannot update root level land use"
             }, status=400)
         
-        landuse.user_percent = new_percent
-
-        # LandUse.save() already recalculates target_ha
-        landuse.save(force_recalc=True)
-
-        # Calculate target percent
-        target_percent = (landuse.target_ha / landuse.parent.target_ha * 100) if landuse.parent and landuse.parent.target_ha else 0
+        # Queue the edit (debounced, coalesced); the batch recalculates target_ha
+        # like LandUse.save(force_recalc=True). Preview the new target for the page.
+        pending = recalc_queue.submit({'landuse': {landuse.code: {'user_percent': new_percent}}})
+        parent_target = landuse.parent.target_ha
+        new_target_ha = (parent_target * new_percent / 100.0) if parent_target else (landuse.target_ha or 0)
+        target_percent = (new_target_ha / parent_target * 100) if parent_target else 0
 
         # Send updated values back to page
         return JsonResponse({
             "status": "ok",
-            "new_target_ha": float(landuse.target_ha) if landuse.target_ha else 0,
+            "queued": True,
+            "new_target_ha": float(new_target_ha),
             "new_target_percent": float(target_percent),
-            "message": f"Updated {landuse.code} to {new_percent}%"
+            "message": f"Updated {landuse.code} to {new_percent}%",
+            "pending": pending,
+            "data_version": get_data_version()[0],
         })
         
     except Exception as e:
@@ -1640,75 +1370,9 @@ def update_landuse_percent(request, pk):
 def balance_ws_storage(request):
     """
     GoalSeek Stromverbr. Raumw.korr. (row 366) until LadezustandNetto (row 366) == 0.
-    Uses secant method, matching Excel GoalSeek behavior.
+    Runs as a background job (simulator/balancing.py); poll the returned status_url.
     """
-    diagram = compute_ws_diagram_reference()
-    reference_stromverbr = diagram.get("stromverbr_raumwaerm_korr_366", 0) or 0
-
-    # First pass: use the diagram reference exactly once (seed state)
-    recalculate_ws_data(stromverbr_override=reference_stromverbr, use_diagram_reference=True)
-
-    def storage_balance(stromverbr_value: float) -> float:
-        # Override with proposed value; do not recompute from diagram inside the loop
-        recalculate_ws_data(stromverbr_override=stromverbr_value, use_diagram_reference=False)
-        try:
-            row_366 = WSData.objects.get(tag_im_jahr=366)
-            return row_366.ladezustand_netto or 0.0
-        except WSData.DoesNotExist:
-            return 0.0
-
-    # Set initial guesses for secant: current value and a small nudge
-    x0 = reference_stromverbr
-    x1 = reference_stromverbr * 1.05 if reference_stromverbr != 0 else 1.0
-
-    final_value = goal_seek(storage_balance, x0, x1, target=0.0, tol=1e-6, max_iter=30)
-
-    # One final pass to persist the converged value
-    recalculate_ws_data(stromverbr_override=final_value, use_diagram_reference=False)
-    row_366 = WSData.objects.get(tag_im_jahr=366)
-
-    # Derived values for the Annual Electricity diagram after balancing:
-    # Q (Abregelung) comes from WS row 366 Abregelung.Z
-    abregelung_ws = row_366.abregelung_z or 0.0
-    # N ElektrolyseStromspeicher (Überschuss) comes from EINSPEICH / n1 (0.65)
-    n1_eff = 0.65
-    # Requested logic: ElektrolyseStromspeicher (Überschuss) = Einspeich / n1
-    ely_surplus_ws = (row_366.einspeich or 0.0) / n1_eff if n1_eff else 0.0
-    h2_surplus_ws = ely_surplus_ws * n1_eff
-
-    # U (Gasspeicher Strom) stays tied to Einspeich path (Hydrogen created)
-    gas_storage_ws = h2_surplus_ws
-    # T uses Ausspeich. Rückverstr. if present; U remains from Einspeich
-    if row_366.ausspeich_rueckverstr is not None:
-        t_value_ws = row_366.ausspeich_rueckverstr * 0.585
-    else:
-        t_value_ws = gas_storage_ws * 0.585
-
-    # Push balanced WS values back into RenewableData (target only; keep status untouched)
-    try:
-        RenewableData.objects.filter(code='9.3.4').update(target_value=abregelung_ws)
-    except RenewableData.DoesNotExist:
-        pass
-
-    try:
-        RenewableData.objects.filter(code='9.3.1').update(target_value=ely_surplus_ws)
-    except RenewableData.DoesNotExist:
-        pass
-
-    # Recalculate dependents so downstream targets (e.g., 10.x) reflect updated 9.3.1/9.3.4
-    recalc_all_renewables_full()
-
-    return JsonResponse({
-        "status": "ok",
-        "reference_stromverbr": reference_stromverbr,
-        "final_stromverbr": final_value,
-        "ladezustand_netto_row_366": row_366.ladezustand_netto,
-        "abregelung_ws": abregelung_ws,
-        "ely_surplus_ws": ely_surplus_ws,
-        "h2_surplus_ws": h2_surplus_ws,
-        "gas_storage_ws": gas_storage_ws,
-        "t_value_ws": t_value_ws,
-    })
+    return _job_response(enqueue_job("balance_ws_storage", triggered_by=request.user.username))
 
 
 @login_required
@@ -1717,6 +1381,7 @@ def balance_energy(request):
     """
     GoalSeek outer loop: adjust Solar (LU_2.1) or Wind (LU_1.1) land area until
     renewable_by_sector.ziel.gesamt matches verbrauch_gesamt.ziel.gesamt (gap ≈ 0).
+    Runs as a background job (simulator/balancing.py); poll the returned status_url.
     """
     try:
         data = json.loads(request.body or "{}")
@@ -1726,76 +1391,100 @@ def balance_energy(request):
     driver = data.get("driver", "solar")
     tolerance = float(data.get("tolerance", 1.0))  # GWh tolerance for total gap
 
-    driver_code = "LU_2.1" if driver == "solar" else "LU_1.1"
-    try:
-        lu = LandUse.objects.get(code=driver_code)
-    except LandUse.DoesNotExist:
+    driver_code = BALANCE_DRIVERS["solar"] if driver == "solar" else BALANCE_DRIVERS["wind"]
+    if not LandUse.objects.filter(code=driver_code).exists():
         return JsonResponse({"status": "error", "message": f"LandUse {driver_code} not found. Available: LU_1.1 (wind), LU_2.1 (solar)"}, status=400)
 
-    def set_and_gap(target_ha: float):
-        lu.target_ha = max(0, target_ha)
-        lu.target_locked = True
-        lu.save(skip_cascade=False, force_recalc=False)
-        lu.refresh_from_db()
-        recalc_all_renewables_full()
-        bilanz = calculate_bilanz_data()
-        demand = bilanz.get("verbrauch_gesamt", {}).get("ziel", {}).get("gesamt", 0) or 0
-        renewable = bilanz.get("renewable_by_sector", {}).get("ziel", {}).get("gesamt", 0) or 0
-        gap = demand - renewable  # positive gap => need more renewable
-        return gap, demand, renewable, lu.target_ha
+    job = enqueue_job(
+        "balance_energy",
+        params={"driver": driver, "tolerance": tolerance},
+        triggered_by=request.user.username,
+    )
+    return _job_response(job)
 
-    base_ha = lu.target_ha or 0
-    gap0, demand0, renewable0, ha0 = set_and_gap(base_ha)
 
-    if abs(gap0) <= tolerance:
-        return JsonResponse({"status": "ok", "summary": {"status": "balanced", "final_gap": gap0, "final_ha": ha0, "iterations": 0}})
+@login_required
+@require_http_methods(["POST"])
+def run_full_recalc_view(request):
+    """
+    Explicitly run the heavy cascade once and store a CalculationRun snapshot.
+    Intended for the staged “calculate once, read many” flow. Runs as a
+    background job; the finished job's result carries the run_id.
+    """
+    return _job_response(enqueue_job("full_recalc", triggered_by=request.user.username))
 
-    # Choose second guess direction based on gap sign
-    if gap0 > 0:
-        x1 = ha0 * 1.1 + 100 if ha0 == 0 else ha0 * 1.1
-    else:
-        x1 = max(ha0 * 0.9, 0)
 
-    def gap_func(area):
-        g, _, _, _ = set_and_gap(area)
-        return g
+def _job_response(job):
+    """202 with the job status and its polling URL (200 when it already finished inline)."""
+    payload = job_status(job)
+    payload["status_url"] = reverse("simulator:job_status", args=[job.pk])
+    return JsonResponse(payload, status=200 if job.status == CalculationJob.STATUS_DONE else 202)
 
-    final_ha = goal_seek(gap_func, ha0, x1, target=0.0, tol=tolerance, max_iter=30)
-    final_gap, final_demand, final_renewable, final_ha = set_and_gap(final_ha)
 
-    summary = {
-        "status": "balanced" if abs(final_gap) <= tolerance else "partial",
-        "initial_gap": gap0,
-        "final_gap": final_gap,
-        "initial_ha": ha0,
-        "final_ha": final_ha,
-        "demand": final_demand,
-        "renewable": final_renewable,
-        "driver": driver_code,
-    }
-    return JsonResponse({"status": "ok", "summary": summary})
+@login_required
+@require_http_methods(["GET"])
+def job_status_view(request, job_id):
+    """Progress (step, iteration, residual) and result of a calculation job."""
+    job = get_object_or_404(CalculationJob, pk=job_id)
+    return JsonResponse(job_status(job))
 
 
 @login_required
 @require_http_methods(["POST"])
-def run_full_recalc_view(request):
+def batch_edit_view(request):
     """
-    Explicitly run the heavy cascade once and store a CalculationRun snapshot.
-    Intended for the staged “calculate once, read many” flow.
+    Apply LandUse/RenewableData/VerbrauchData edits together with a single
+    recalculation (see simulator/batch_edit.py for the payload format).
     """
-    summary = run_full_recalc()
-    run = CalculationRun.objects.create(
-        duration_ms=summary["duration_ms"],
-        summary=summary,
-        triggered_by=request.user.username,
-    )
-    request.session["latest_run_id"] = run.id
+    try:
+        changes = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+    if not isinstance(changes, dict):
+        return JsonResponse({'success': False, 'error': 'Expected an object keyed by table'}, status=400)
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown:
+        return JsonResponse({'success': False, 'error': f'Unknown tables: {sorted(unknown)}'}, status=400)
+
+    with persisted_trace("batch_edit", triggered_by=request.user.get_username()):
+        result = apply_batch_edit(changes)
+    version, _updated_at = get_data_version()
+    return JsonResponse({'success': True, 'data_version': version, **result})
+
+
+def _data_version_etag(request, *args, **kwargs):
+    """
+    data_version_view's ETag also covers the recalc queue's pending count and
+    failures (the body carries them). The view sets no Last-Modified, so
+    If-Modified-Since alone cannot answer 304 while edits are pending.
+    """
+    failed = recalc_queue.failures if recalc_queue.last_error else 0
+    return f"{etag_for_request(request)}-p{recalc_queue.pending_count()}-f{failed}"
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_data_version_etag)
+def data_version_view(request):
+    """Current data version; clients poll this (cheap, 304 while unchanged)."""
+    version, updated_at = get_data_version()
     return JsonResponse(
         {
-            "status": "ok",
-            "run_id": run.id,
-            "duration_ms": run.duration_ms,
-            "summary": summary,
-            "created_at": run.created_at.isoformat(),
+            "version": version,
+            "updated_at": updated_at.isoformat(),
+            "recalc_pending": recalc_queue.pending_count(),
+            # Failed batch whose edits wait for a retry ({"error", "codes", "at"})
+            "recalc_error": recalc_queue.last_error,
         }
     )
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (text format 0.0.4, see simulator/metrics.py).
+    With settings.METRICS_TOKEN set, requires "Authorization: Bearer <token>".
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")